@@ -1,37 +1,24 @@
 from langchain_core.tools import tool
 from typing import Optional, List, Dict, Any
 from db.crud import get_crud
+from db.search import get_entity_search_service
 
 @tool
-def search_entities(query: Optional[str] = None, entity_type: Optional[str] = None) -> List[Dict[str, Any]]:
+def search_entities(query: Optional[str] = None, entity_type: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Search for entities (providers, products, processes, items) in the system.
     
     Args:
-        query: Optional text to filter by name.
+        query: Optional text to match against names (word prefixes or any part of the name).
         entity_type: Optional type filter: 'provider', 'product', 'process', 'item'.
+        limit: Maximum number of results, best matches first. Defaults to 25 for a query and to every entity without one.
     """
-    crud = get_crud()
-    results = []
-    
-    if not entity_type or entity_type == 'provider':
-        # get_all_providers returns tuples: (id, name, ...)
-        results.extend([{'type': 'provider', 'id': p[0], 'name': p[1]} for p in crud.get_all_providers()])
-    if not entity_type or entity_type == 'product':
-        # get_all_products returns tuples: (id, name, ...)
-        results.extend([{'type': 'product', 'id': p[0], 'name': p[1]} for p in crud.get_all_products()])
-    if not entity_type or entity_type == 'process':
-        # get_all_processes returns DICTS
-        results.extend([{'type': 'process', 'id': p['process_id'], 'name': p['process_name']} for p in crud.get_all_processes()])
-    if not entity_type or entity_type == 'item':
-        # get_all_items returns tuples: (id, name, ...)
-        results.extend([{'type': 'item', 'id': p[0], 'name': p[1]} for p in crud.get_all_items()])
-        
-    if query:
-        q = query.lower()
-        results = [r for r in results if q in r['name'].lower()]
-        
-    return results
+    if limit is None and query and query.strip():
+        limit = 25
+    try:
+        return get_entity_search_service().search(query, entity_type=entity_type, limit=limit)
+    except ValueError as e:
+        return [{'error': str(e)}]
 
 @tool
 def get_contract_details(contract_id: int) -> str:
@@ -44,8 +31,7 @@ def get_contract_details(contract_id: int) -> str:
     if not contract:
         return f"Error: Contract with ID {contract_id} not found."
     
-    tiers = crud.get_contract_tiers_for_contract(contract_id)
-    tiers.sort(key=lambda x: x['tier_number'])
+    tiers = sorted(crud.get_contract_tiers_for_contract(contract_id), key=lambda x: x['tier_number'])
     
     lookup = crud.get_contract_lookup(contract_id)
     lookup_info = "Default (Sum Actuals 1mo)"
@@ -129,48 +115,21 @@ def get_provider_allocations(provider_id: int) -> str:
     Useful for understanding volume drivers for a provider.
     """
     crud = get_crud()
-    # allocations structure: {provider_id: {item_id: {total: val, products: [...]}}} 
-    # but crud.get_all_allocations is aggregated.
-    # We need to scan products to be precise.
-    
-    products = crud.get_all_products()
     found = []
-    
-    for prod in products:
-        # We need to fetch details to see allocations
-        # This might be slow if many products, but ok for a tool
-        pid = prod[0] # product_id (tuple index 0)
-        prod_name = prod[1] # name (tuple index 1)
-        
-        allocs = crud.get_allocations_for_product(pid)
-        
-        # Check if provider is in allocs
-        # allocs structure: {item_id: {mode: 'percentage', providers: [{provider_id, value}]}}
-        # or collective: {mode: 'percentage', providers: [...]}
-        
-        relevant = False
-        share_info = []
-        
-        if 'providers' in allocs: # Collective
-            for p in allocs['providers']:
-                if p['provider_id'] == provider_id and p['value'] > 0:
-                    relevant = True
-                    share_info.append(f"{p['value']}{'%' if allocs['mode'] == 'percentage' else 'u'}")
-        else: # Per Item
-            for item_id, details in allocs.items():
-                for p in details['providers']:
-                    if p['provider_id'] == provider_id and p['value'] > 0:
-                        relevant = True
-                        share_info.append(f"Item {item_id}: {p['value']}{'%' if details['mode'] == 'percentage' else 'u'}")
-                        
-        if relevant:
-            unique_shares = list(set(share_info))
-            found.append(f"- {prod_name} (ID: {pid}): {', '.join(unique_shares)}")
-            
+
+    for product in crud.get_provider_allocations(provider_id):
+        if product['is_collective']:
+            shares = [f"{product['value']}{'%' if product['mode'] == 'percentage' else 'u'}"]
+        else:
+            shares = [f"Item {item['item_id']}: {item['value']}{'%' if item['mode'] == 'percentage' else 'u'}"
+                      for item in product['items']]
+        found.append(f"- {product['product_name']} (ID: {product['product_id']}): {', '.join(shares)}")
+
     if not found:
         return f"No products found with active allocations for Provider ID {provider_id}."
         
     return f"Products allocated to Provider ID {provider_id}:\n" + "\n".join(found)
+
 @tool
 def get_historical_volume(entity_id: int, entity_type: str = 'product', year: Optional[int] = None) -> str:
     """
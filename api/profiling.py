@@ -0,0 +1,143 @@
+"""
+Request Profiling - On-demand sampling profiles of single requests
+
+A request carrying the profiling token (`X-Pareto-Profile` header or
+`__profile` query parameter, matching PARETO_PROFILE_TOKEN) is run while a
+background thread samples the stack of the thread serving it every
+PARETO_PROFILE_INTERVAL_MS. Endpoints run on the event loop thread, so the
+samples cover SQL, dict building and JSON encoding alike.
+
+The profile is returned instead of the response, either as speedscope JSON
+(default, open it at https://www.speedscope.app) or as collapsed stacks for
+flamegraph.pl (`X-Pareto-Profile-Format` / `__profile_format` = `collapsed`),
+and written to PARETO_PROFILE_DIR, which keeps the newest
+PARETO_PROFILE_RETENTION files. Profiling is disabled while no token is set.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_TOKEN = os.environ.get("PARETO_PROFILE_TOKEN")
+PROFILE_DIR = os.environ.get("PARETO_PROFILE_DIR", os.path.join(ROOT_DIR, "profiles"))
+PROFILE_RETENTION = int(os.environ.get("PARETO_PROFILE_RETENTION", "50"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PARETO_PROFILE_INTERVAL_MS", "2"))
+
+PROFILE_FORMATS = ("speedscope", "collapsed")
+
+Frame = Tuple[str, str, int]  # function name, file, first line
+
+
+def profile_request_format(headers, query_params) -> Optional[str]:
+    """Requested profile format if the request carries a valid token, else None"""
+    token = headers.get("x-pareto-profile") or query_params.get("__profile")
+    if not PROFILE_TOKEN or token != PROFILE_TOKEN:
+        return None
+    profile_format = headers.get("x-pareto-profile-format") or query_params.get("__profile_format") or "speedscope"
+    return profile_format if profile_format in PROFILE_FORMATS else "speedscope"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a background thread"""
+
+    def __init__(self, thread_id: int, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.samples: List[Tuple[Tuple[Frame, ...], float]] = []  # (stack outermost first, weight in ms)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pareto-profiler", daemon=True)
+        self.started = self.stopped = 0.0
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.samples.append((tuple(reversed(stack)), (now - last) * 1000))
+            last = now
+
+    @staticmethod
+    def _label(frame: Frame) -> str:
+        name, filename, line = frame
+        path = os.path.relpath(filename, ROOT_DIR) if filename.startswith(ROOT_DIR) else os.path.basename(filename)
+        return f"{name} ({path}:{line})"
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format: 'outer;inner weight' per line, weights in microseconds"""
+        weights: Dict[str, float] = {}
+        for stack, weight in self.samples:
+            key = ";".join(self._label(frame).replace(";", ",") for frame in stack)
+            weights[key] = weights.get(key, 0.0) + weight
+        return "".join(f"{stack} {round(weight * 1000)}\n" for stack, weight in weights.items())
+
+    def speedscope(self, name: str) -> dict:
+        """Sampled profile in the speedscope file format"""
+        frames: List[dict] = []
+        index: Dict[Frame, int] = {}
+        samples = []
+        for stack, _ in self.samples:
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            samples.append([index[frame] for frame in stack])
+        weights = [round(weight, 3) for _, weight in self.samples]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "pareto",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": samples,
+                "weights": weights
+            }]
+        }
+
+
+def save_profile(profiler: SamplingProfiler, name: str, profile_format: str) -> Tuple[str, str]:
+    """Write the profile under PROFILE_DIR, prune old ones; returns (file name, content)"""
+    if profile_format == "collapsed":
+        content, extension = profiler.collapsed(), "folded"
+    else:
+        content, extension = json.dumps(profiler.speedscope(name)), "speedscope.json"
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = "".join(c if c.isalnum() else "_" for c in name).strip("_")[:80]
+    file_name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{slug}.{extension}"
+    with open(os.path.join(PROFILE_DIR, file_name), "w") as f:
+        f.write(content)
+
+    profiles = sorted(
+        (os.path.join(PROFILE_DIR, p) for p in os.listdir(PROFILE_DIR)),
+        key=os.path.getmtime, reverse=True
+    )
+    for stale in profiles[PROFILE_RETENTION:]:
+        os.remove(stale)
+    return file_name, content
@@ -9,6 +9,8 @@ import sys
 # Add parent directory to path to import db module
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
 from db.crud import get_crud
+from db.calculation import get_calculation_service
+from api.static_assets import static_url
 
 router = APIRouter()
 
@@ -19,6 +21,7 @@ FRONTEND_DIR = os.path.join(
 
 # Initialize templates
 templates = Jinja2Templates(directory=FRONTEND_DIR)
+templates.env.globals["static_url"] = static_url
 
 
 # Pydantic models for request/response
@@ -121,6 +124,14 @@ async def get_provider(provider_id: int):
     return JSONResponse(content=provider)
 
 
+@router.get("/api/providers/{provider_id}/allocations")
+async def get_provider_allocations(provider_id: int):
+    """Get the products and items allocated to a provider."""
+    crud = get_crud()
+    allocations = crud.get_provider_allocations(provider_id)
+    return JSONResponse(content=allocations)
+
+
 @router.put("/api/providers/{provider_id}")
 async def update_provider(provider_id: int, provider: ProviderUpdate):
     """Update a provider."""
@@ -151,7 +162,8 @@ async def get_offers(
     """Get offers, optionally filtered by item and/or provider."""
     crud = get_crud()
     if item_id is not None or provider_id is not None:
-        offers = crud.get_offers_filtered(item_id=item_id, provider_id=provider_id)
+        # Copied: memoized reads are shared, and the loop below reorders keys
+        offers = [dict(offer) for offer in crud.get_offers_filtered(item_id=item_id, provider_id=provider_id)]
     else:
         offers = crud.get_all_offers()
 
@@ -740,6 +752,16 @@ async def delete_contract(contract_id: int):
     return JSONResponse(content={"message": "Contract deleted successfully"})
 
 
+@router.get("/api/contracts/{contract_id}/cost-curve")
+async def get_contract_cost_curve(contract_id: int, volume: Optional[float] = Query(None)):
+    """Get the tier breakpoints and blended unit prices of a contract, optionally evaluated at a volume."""
+    crud = get_crud()
+    if not crud.get_contract(contract_id):
+        raise HTTPException(status_code=404, detail=f"Contract with ID {contract_id} not found")
+    curve = get_calculation_service().get_contract_cost_curve(contract_id)
+    return JSONResponse(content=curve.to_dict(volume))
+
+
 # Contract Tier endpoints
 @router.get("/api/contract-tiers/{contract_id}")
 async def get_contract_tiers(contract_id: int):
@@ -1,19 +1,20 @@
 from fastapi import APIRouter, Request, HTTPException, Query
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import Dict, Optional, List, Any
+import asyncio
+import json
 import os
 import sys
 
 from db.crud import get_crud
+from api.static_assets import static_url
 from db.calculation import get_calculation_service
-
-# Agent imports
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-# We import invoke_agent lazily or inside the route if possible to avoid circular dep issues during startup if any
-# But here it should be fine as ai depends on db, and api depends on db and ai.
-from ai.pareto_agent import invoke_agent
+from db.optimization import get_optimization_service
+from db.simulation import ERROR_MODELS, get_simulation_service
+from db.jobs import FINAL_STATUSES, JOB_KINDS, get_job_manager
+from db.search import ENTITY_TYPES, get_entity_search_service
 
 router = APIRouter()
 
@@ -22,6 +23,7 @@ FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__fi
 
 # Initialize templates
 templates = Jinja2Templates(directory=FRONTEND_DIR)
+templates.env.globals["static_url"] = static_url
 
 
 @router.get("/", response_class=HTMLResponse)
@@ -30,6 +32,15 @@ async def home_page(request: Request):
     return templates.TemplateResponse("home/index.html", {"request": request})
 
 
+@router.get("/api/search")
+async def search_entities(q: str = "", type: Optional[str] = None, limit: int = Query(20, ge=1, le=200)):
+    """Typeahead search over provider, product, process and item names."""
+    if type is not None and type not in ENTITY_TYPES:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(ENTITY_TYPES)}")
+    results = get_entity_search_service().search(q, entity_type=type, limit=limit)
+    return JSONResponse(content={"results": results})
+
+
 @router.get("/api/optimization/calculate")
 async def calculate_optimization(
     item_id: int = Query(..., description="The item ID to optimize pricing for"),
@@ -59,8 +70,7 @@ async def calculate_optimization(
             }
         )
 
-    for i, offer in enumerate(offers):
-        offer["is_optimal"] = (i == 0)
+    offers = [{**offer, "is_optimal": i == 0} for i, offer in enumerate(offers)]
 
     total_costs = [offer["total_cost"] for offer in offers]
     best_cost = min(total_costs)
@@ -94,6 +104,17 @@ class OptimizationRequest(BaseModel):
     product_quantities: Dict[int, int]
     use_manual_tiers: bool = False
     tier_volume_overrides: Optional[Dict[int, float]] = None
+    # Look tiers up from this month's contract volumes pooled across all products
+    year: Optional[int] = None
+    month: Optional[int] = None
+    use_forecasts: bool = False
+
+
+def pooled_tier_volumes(calc, request) -> Optional[Dict[int, float]]:
+    """Pooled contract volumes for the request's month, if it names one"""
+    if request.year is None or request.month is None:
+        return None
+    return calc.get_pooled_tier_volumes(request.year, request.month, request.use_forecasts)
 
 
 @router.get("/api/optimization/products")
@@ -110,7 +131,8 @@ async def calculate_current_cost(request: OptimizationRequest):
     calc = get_calculation_service()
     result = calc.calculate_current_cost(
         request.product_quantities, 
-        use_manual_tiers=request.use_manual_tiers
+        use_manual_tiers=request.use_manual_tiers,
+        contract_volume_overrides=pooled_tier_volumes(calc, request)
     )
     return JSONResponse(content=result)
 
@@ -128,6 +150,9 @@ class CompareRequest(BaseModel):
     optimized_allocations: Dict
     use_manual_tiers: bool = False
     tier_volume_overrides: Optional[Dict[int, float]] = None
+    year: Optional[int] = None
+    month: Optional[int] = None
+    use_forecasts: bool = False
 
 
 @router.post("/api/optimization/compare")
@@ -135,18 +160,21 @@ async def compare_allocations(request: CompareRequest):
     """Compare current vs optimized allocations."""
     calc = get_calculation_service()
 
+    contract_volumes = pooled_tier_volumes(calc, request)
     current_allocations = calc.get_current_allocations(request.product_quantities)
     current_result = calc.calculate_cost_with_allocations(
         request.product_quantities,
         current_allocations,
-        use_manual_tiers=request.use_manual_tiers
+        use_manual_tiers=request.use_manual_tiers,
+        contract_volume_overrides=contract_volumes
     )
 
     optimized_result = calc.calculate_cost_with_allocations(
         request.product_quantities,
         request.optimized_allocations,
         use_manual_tiers=request.use_manual_tiers,
-        tier_volume_overrides=request.tier_volume_overrides
+        tier_volume_overrides=request.tier_volume_overrides,
+        contract_volume_overrides=contract_volumes
     )
 
     delta_amount = optimized_result['total_cost'] - current_result['total_cost']
@@ -161,6 +189,217 @@ async def compare_allocations(request: CompareRequest):
         }
     })
 
+class HorizonRequest(BaseModel):
+    start_year: Optional[int] = None
+    start_month: Optional[int] = None
+    months: int = 12
+    product_ids: Optional[List[int]] = None
+    use_manual_tiers: bool = False
+    share_step: float = 0.1
+    max_sweeps: int = 20
+
+
+def validate_horizon_request(request: HorizonRequest):
+    if not 1 <= request.months <= 36:
+        raise HTTPException(status_code=400, detail="months must be between 1 and 36")
+    if request.start_month is not None and not 1 <= request.start_month <= 12:
+        raise HTTPException(status_code=400, detail="start_month must be between 1 and 12")
+    if not 0 < request.share_step <= 1:
+        raise HTTPException(status_code=400, detail="share_step must be in (0, 1]")
+
+
+# Solves take seconds of CPU and DuckDB time; plain def runs them in the threadpool, off the event loop
+@router.post("/api/optimization/horizon")
+def optimize_horizon(request: HorizonRequest):
+    """Plan monthly allocations minimizing total cost over a forecast horizon."""
+    validate_horizon_request(request)
+
+    optimizer = get_optimization_service()
+    result = optimizer.optimize_horizon(
+        start_year=request.start_year,
+        start_month=request.start_month,
+        months=request.months,
+        product_ids=request.product_ids,
+        use_manual_tiers=request.use_manual_tiers,
+        share_step=request.share_step,
+        max_sweeps=request.max_sweeps
+    )
+    return JSONResponse(content=result)
+
+class FrontierRequest(BaseModel):
+    product_quantities: Dict[int, int]
+    use_manual_tiers: bool = False
+    max_providers: Optional[int] = None
+    share_caps: Optional[List[float]] = None
+
+
+def validate_frontier_request(request: FrontierRequest):
+    if request.share_caps is not None and not all(0 < cap <= 1 for cap in request.share_caps):
+        raise HTTPException(status_code=400, detail="share_caps must be fractions in (0, 1]")
+
+
+@router.post("/api/optimization/frontier")
+def compute_frontier(request: FrontierRequest):
+    """Pareto frontier of allocations over total cost, max provider share and provider count."""
+    validate_frontier_request(request)
+
+    optimizer = get_optimization_service()
+    result = optimizer.compute_frontier(
+        request.product_quantities,
+        use_manual_tiers=request.use_manual_tiers,
+        max_providers=request.max_providers,
+        share_caps=request.share_caps
+    )
+    return JSONResponse(content=result)
+
+class SensitivityRequest(BaseModel):
+    product_quantities: Dict[int, int]
+    use_manual_tiers: bool = False
+    step: float = 1.0
+
+
+def validate_sensitivity_request(request: SensitivityRequest):
+    if not 0 < request.step <= 100:
+        raise HTTPException(status_code=400, detail="step must be in (0, 100]")
+
+
+@router.post("/api/optimization/sensitivity")
+def compute_sensitivity(request: SensitivityRequest):
+    """Cost delta of shifting a percentage point between every pair of providers per product."""
+    validate_sensitivity_request(request)
+
+    optimizer = get_optimization_service()
+    result = optimizer.compute_sensitivity(
+        request.product_quantities,
+        use_manual_tiers=request.use_manual_tiers,
+        step=request.step
+    )
+    return JSONResponse(content=result)
+
+
+class CostRiskRequest(BaseModel):
+    start_year: Optional[int] = None
+    start_month: Optional[int] = None
+    months: int = 12
+    product_ids: Optional[List[int]] = None
+    paths: int = 1000
+    error_model: str = "lognormal"
+    sigma: float = 0.15
+    correlation: float = 0.0
+    quantiles: Optional[List[float]] = None
+    seed: int = 0
+    use_manual_tiers: bool = False
+
+
+def validate_cost_risk_request(request: CostRiskRequest):
+    if not 1 <= request.months <= 36:
+        raise HTTPException(status_code=400, detail="months must be between 1 and 36")
+    if not 1 <= request.paths <= 20000:
+        raise HTTPException(status_code=400, detail="paths must be between 1 and 20000")
+    if request.quantiles is not None and not all(0 <= q <= 1 for q in request.quantiles):
+        raise HTTPException(status_code=400, detail="quantiles must be fractions in [0, 1]")
+    if request.sigma < 0 or not 0 <= request.correlation <= 1:
+        raise HTTPException(status_code=400, detail="sigma must be >= 0 and correlation in [0, 1]")
+    if request.error_model not in ERROR_MODELS:
+        raise HTTPException(status_code=400, detail=f"error_model must be one of {', '.join(ERROR_MODELS)}")
+
+
+@router.post("/api/optimization/risk")
+def simulate_cost_risk(request: CostRiskRequest):
+    """Monte Carlo cost quantiles per provider and month over forecast uncertainty."""
+    validate_cost_risk_request(request)
+
+    simulator = get_simulation_service()
+    try:
+        result = simulator.simulate_cost_risk(
+            start_year=request.start_year,
+            start_month=request.start_month,
+            months=request.months,
+            product_ids=request.product_ids,
+            paths=request.paths,
+            error_model=request.error_model,
+            sigma=request.sigma,
+            correlation=request.correlation,
+            quantiles=request.quantiles,
+            seed=request.seed,
+            use_manual_tiers=request.use_manual_tiers
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content=result)
+
+
+# Optimization jobs: the solves above, run in the background
+JOB_REQUESTS = {
+    "horizon": (HorizonRequest, validate_horizon_request),
+    "frontier": (FrontierRequest, validate_frontier_request),
+    "sensitivity": (SensitivityRequest, validate_sensitivity_request),
+    "risk": (CostRiskRequest, validate_cost_risk_request),
+}
+JOB_EVENT_INTERVAL = 0.25
+
+
+class JobRequest(BaseModel):
+    kind: str
+    params: Dict[str, Any] = {}
+
+
+@router.post("/api/optimization/jobs")
+async def submit_optimization_job(request: JobRequest):
+    """Queue a solve; identical inputs on unchanged data are answered from stored results."""
+    if request.kind not in JOB_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(JOB_KINDS)}")
+    model, validate = JOB_REQUESTS[request.kind]
+    try:
+        params = model(**request.params)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+    validate(params)
+
+    job = get_job_manager().submit(request.kind, params.model_dump())
+    return JSONResponse(content=job, status_code=200 if job["status"] == "completed" else 202)
+
+
+@router.get("/api/optimization/jobs/{job_id}")
+async def get_optimization_job(job_id: str):
+    """Status, progress and (once completed) result of a job."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=job)
+
+
+@router.get("/api/optimization/jobs/{job_id}/events")
+async def stream_optimization_job(job_id: str):
+    """Server-Sent Events: `progress` events, then one `completed`, `failed` or `cancelled` event."""
+    manager = get_job_manager()
+    if manager.get(job_id, include_result=False) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last = None
+        while True:
+            job = manager.get(job_id, include_result=False)
+            state = (job["status"], job["progress"], job.get("revision"), job.get("cancel_requested"))
+            if state != last:
+                last = state
+                if job["status"] in FINAL_STATUSES:
+                    yield f"event: {job['status']}\ndata: {json.dumps(manager.get(job_id))}\n\n"
+                    return
+                yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+            await asyncio.sleep(JOB_EVENT_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.post("/api/optimization/jobs/{job_id}/cancel")
+async def cancel_optimization_job(job_id: str):
+    """Cancel a queued or running job."""
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=job)
+
 # Agent API
 class AgentMessage(BaseModel):
     role: str
@@ -173,8 +412,14 @@ class AgentChatRequest(BaseModel):
     messages: List[AgentMessage]
 
 @router.post("/api/agent/chat")
-async def chat_agent(request: AgentChatRequest):
+def chat_agent(request: AgentChatRequest):
     """Interact with the Pareto Agent."""
+    # The agent stack (langchain, langgraph, ChatAnthropic) is imported on first use
+    # so workers start without paying its import cost or requiring credentials.
+    # Plain def: that import and the model call block, so they run in the threadpool.
+    from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+    from ai.pareto_agent import invoke_agent
+
     # Convert input messages to LangChain format
     lc_messages = []
     for msg in request.messages:
@@ -7,6 +7,8 @@ import os
 from datetime import datetime
 
 from db.crud import get_crud
+from db.pooling import get_volume_pooling_service
+from api.static_assets import static_url
 
 
 router = APIRouter()
@@ -18,6 +20,7 @@ FRONTEND_DIR = os.path.join(
 
 # Initialize templates
 templates = Jinja2Templates(directory=FRONTEND_DIR)
+templates.env.globals["static_url"] = static_url
 
 
 # Pydantic models
@@ -215,6 +218,89 @@ async def get_product_pricing_view(product_id: int, year: Optional[int] = None,
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/api/pricing/portfolio")
+async def get_portfolio_pricing(year: Optional[int] = None, month: Optional[int] = None, use_forecasts: bool = False, include_rows: bool = False):
+    """Monthly pricing for every active product, with product, process and provider totals."""
+    crud = get_crud()
+    data = crud.get_portfolio_pricing_data(year, month, use_forecasts, include_rows)
+    return JSONResponse(content=data)
+
+
+def _split_values(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+
+def _parse_ids(name: str, value: Optional[str]) -> Optional[List[int]]:
+    if value is None:
+        return None
+    try:
+        return [int(v) for v in _split_values(value)]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a comma-separated list of integers")
+
+
+def _parse_month(name: str, value: Optional[str]) -> Optional[tuple]:
+    if value is None:
+        return None
+    try:
+        parsed = datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be formatted YYYY-MM")
+    return parsed.year, parsed.month
+
+
+@router.get("/api/analytics/cost")
+async def get_cost_analytics(
+    group_by: Optional[str] = None,
+    measures: Optional[str] = None,
+    source: str = "actuals",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    provider_ids: Optional[str] = None,
+    process_ids: Optional[str] = None,
+    product_ids: Optional[str] = None,
+    item_ids: Optional[str] = None
+):
+    """
+    Aggregate monthly costs by any of provider, process, product, item, month, quarter, year and source.
+
+    Lists are comma-separated, months are YYYY-MM (inclusive), source=all spans actuals and forecasts.
+    Results are columnar: {"columns": [...], "data": {column: [values]}, "row_count": n}.
+    """
+    crud = get_crud()
+    try:
+        data = crud.get_cost_analytics(
+            _split_values(group_by), _split_values(measures) or None,
+            source=None if source == "all" else source,
+            start=_parse_month("start", start), end=_parse_month("end", end),
+            provider_ids=_parse_ids("provider_ids", provider_ids),
+            process_ids=_parse_ids("process_ids", process_ids),
+            product_ids=_parse_ids("product_ids", product_ids),
+            item_ids=_parse_ids("item_ids", item_ids)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content=data)
+
+
+@router.get("/api/pricing/contract-volumes")
+async def get_contract_volumes(year: Optional[int] = None, month: Optional[int] = None, use_forecasts: bool = False):
+    """Each contract's volume for a month pooled across all products, and the volume its lookup uses for tiers."""
+    now = datetime.now()
+    volumes = get_volume_pooling_service().tier_volumes(
+        year if year is not None else now.year, month if month is not None else now.month, use_forecasts
+    )
+    return JSONResponse(content=list(volumes.values()))
+
+
+@router.post("/api/pricing/cost-cube/refresh")
+async def refresh_cost_cube(full: bool = False):
+    """Recompute queued cost cube cells, or rebuild the whole cube with full=true."""
+    crud = get_crud()
+    cells = crud.update_cost_cube(full=full)
+    return JSONResponse(content={"cells_written": cells, "full": full})
+
+
 @router.get("/api/products/{product_id}/pricing_history")
 async def get_product_pricing_history(
     product_id: int, 
@@ -261,55 +347,5 @@ async def get_product_pricing_history(
                 # Data exists but only in the future. Show standard 12 month empty history context.
                 lookback = 12
 
-    history = []
-    
-    # Loop backwards (default 12 months)
-    for i in range(lookback):
-        # Simple manual date math
-        total_months = (current_year * 12 + current_month - 1) - i
-        y = total_months // 12
-        m = (total_months % 12) + 1
-        
-        try:
-            # 1. Get Actuals
-            data_act = crud.get_product_pricing_table_data(product_id, y, m, use_forecasts=False)
-            
-            breakdown_act = {}
-            total_act = 0
-            for process in data_act['processes']:
-                p_total = sum(row['total_cost'] for row in process['rows'])
-                # Use None if no data exists for this period
-                val = p_total if process.get('has_data', True) else None
-                breakdown_act[str(process['process_id'])] = val
-                if val is not None:
-                    total_act += val
-
-            # 2. Get Forecasts
-            data_fcst = crud.get_product_pricing_table_data(product_id, y, m, use_forecasts=True)
-            
-            breakdown_fcst = {}
-            total_fcst = 0
-            for process in data_fcst['processes']:
-                p_total = sum(row['total_cost'] for row in process['rows'])
-                # Use None if no data exists for this period
-                val = p_total if process.get('has_data', True) else None
-                breakdown_fcst[str(process['process_id'])] = val
-                if val is not None:
-                    total_fcst += val
-            
-            history.append({
-                "year": y,
-                "month": m,
-                "total_cost_actuals": total_act,
-                "breakdown_actuals": breakdown_act,
-                "units_actuals": data_act['units'],
-                "total_cost_forecasts": total_fcst,
-                "breakdown_forecasts": breakdown_fcst,
-                "units_forecasts": data_fcst['units']
-            })
-            
-        except Exception as e:
-            print(f"Error for {y}-{m}: {e}")
-            continue
-            
-    return JSONResponse(content={"history": history[::-1]}) # Reverse to chronological
\ No newline at end of file
+    history = crud.get_product_pricing_history(product_id, current_year, current_month, lookback)
+    return JSONResponse(content={"history": history})
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Static Assets - Precompressed, cache-friendly serving of the frontend directory
+
+Assets are compressed once (gzip + brotli) at startup or build time and the
+matching variant is picked per request from Accept-Encoding. Templates
+reference assets through `static_url`, which appends a content hash so the
+browser can cache them for a year and still pick up every change.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+import brotli
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, IdentityResponder
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend")
+
+COMPRESSIBLE_EXTENSIONS = (".js", ".css", ".svg", ".json")
+MIN_COMPRESS_SIZE = 1024
+
+# Hashed URLs never change content, unhashed ones must be revalidated
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preferred encoding first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _write_if_stale(source_path: str, target_path: str, compress) -> bool:
+    """Write a compressed copy of source_path unless an up-to-date one exists."""
+    if os.path.exists(target_path) and os.path.getmtime(target_path) >= os.path.getmtime(source_path):
+        return False
+    with open(source_path, "rb") as f:
+        data = f.read()
+    with open(target_path, "wb") as f:
+        f.write(compress(data))
+    return True
+
+
+def precompress_static_files(directory: str = FRONTEND_DIR) -> int:
+    """Generate .br and .gz siblings for every compressible asset, returns files written."""
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            if os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            written += _write_if_stale(path, path + ".br", lambda data: brotli.compress(data, quality=11))
+            written += _write_if_stale(path, path + ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))
+    return written
+
+
+@lru_cache(maxsize=512)
+def _content_hash(path: str, mtime_ns: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def static_url(asset_path: str) -> str:
+    """Return the content-hashed /static URL for a path relative to frontend/."""
+    full_path = os.path.join(FRONTEND_DIR, asset_path)
+    version = _content_hash(full_path, os.stat(full_path).st_mtime_ns)
+    return f"/static/{asset_path}?v={version}"
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Encodings of ENCODINGS an Accept-Encoding header allows; q=0 refuses one, '*' covers the unlisted."""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        token, *params = [piece.strip() for piece in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[token.lower()] = q
+    wildcard = qualities.get("*", 0.0)
+    return {encoding for encoding, _ in ENCODINGS if qualities.get(encoding, wildcard) > 0}
+
+
+class NegotiatedGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that honours q-values: Starlette gzips whenever 'gzip' appears in the header."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "gzip" not in accepted_encodings(Headers(scope=scope).get("accept-encoding", "")):
+            responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=self.exclude_content_types)
+            await responder(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class CompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves precompressed variants and sets cache headers."""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        hashed = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("v")
+        cache_control = IMMUTABLE_CACHE_CONTROL if hashed else REVALIDATE_CACHE_CONTROL
+        headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            variant_path = str(full_path) + suffix
+            if not os.path.exists(variant_path) or os.path.getmtime(variant_path) < stat_result.st_mtime:
+                continue
+            response = FileResponse(
+                variant_path,
+                status_code=status_code,
+                media_type=mimetypes.guess_type(str(full_path))[0],
+                headers={**headers, "Content-Encoding": encoding},
+                stat_result=os.stat(variant_path),
+            )
+            break
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    # Build-time entry point: python -m api.static_assets
+    print(f"Precompressed {precompress_static_files()} static files")
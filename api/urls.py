@@ -1,11 +1,19 @@
-from fastapi import APIRouter
-from fastapi.staticfiles import StaticFiles
+from fastapi import APIRouter, Depends
 import os
 
 from api.routers import home, contracts, products
+from db.crud import read_memo
+from api.static_assets import CompressedStaticFiles, precompress_static_files
+
+
+async def request_read_memo():
+    """Memoize CRUD reads for the lifetime of each request"""
+    with read_memo():
+        yield
+
 
 # Create main API router
-api_router = APIRouter()
+api_router = APIRouter(dependencies=[Depends(request_read_memo)])
 
 # Include all routers
 api_router.include_router(home.router, prefix="", tags=["home"])
@@ -18,6 +26,7 @@ def setup_static_files(app):
     # Get the absolute path to the frontend directory
     frontend_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend")
 
-    # Mount static files
+    # Mount static files, serving precompressed .br/.gz variants when available
     if os.path.exists(frontend_dir):
-        app.mount("/static", StaticFiles(directory=frontend_dir), name="static")
\ No newline at end of file
+        precompress_static_files(frontend_dir)
+        app.mount("/static", CompressedStaticFiles(directory=frontend_dir), name="static")
@@ -0,0 +1,319 @@
+"""
+Synthetic Dataset - Deterministic, seedable databases at benchmark scale
+
+Builds a complete Pareto database (every table from db/schemas.py except the
+optimization job store and the derived cost cube, which starts out fully
+pending) with DuckDB bulk `INSERT ... SELECT FROM range()` statements, so even
+the XL scale builds in well under a minute. All values come from
+`hash(seed, salt, i)`, so the same scale, seed and end month give the same
+database for a given DuckDB version.
+
+Shape of the data:
+- every process is contracted with `providers_per_process` providers, each
+  contract with `tiers` volume tiers, and every item of the process is
+  offered by all of them at every tier,
+- every product uses `items_per_product` items in each of
+  `processes_per_product` processes, split between two providers per item
+  (percentages, or unit weights for about one product in five),
+- monthly actuals cover all but the last `forecast_horizon` months of the
+  window, forecasts cover all of it.
+
+Usage:
+    python -m benchmarks.dataset --scale M [--seed 0] [--end 2026-12] [--output benchmarks/data/M.ddb]
+"""
+
+import argparse
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+from db.schemas import DatabaseSchema
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT_DIR, "benchmarks", "data")
+
+MEAN_UNITS = 2600  # mean monthly units per product and process (see monthly_units)
+PARAMETER = re.compile(r"\$(\w+)")
+
+
+@dataclass(frozen=True)
+class Scale:
+    providers: int
+    processes: int
+    providers_per_process: int
+    items: int
+    tiers: int
+    products: int
+    processes_per_product: int
+    items_per_product: int  # per process
+    months: int
+    forecast_horizon: int = 6
+
+    @property
+    def offers(self) -> int:
+        return self.items * self.providers_per_process * self.tiers
+
+    @property
+    def expected_contract_volume(self) -> int:
+        """Average monthly volume pooled on one contract, used to place tier thresholds"""
+        products_per_process = self.products * self.processes_per_product / self.processes
+        return round(products_per_process * self.items_per_product * MEAN_UNITS / self.providers_per_process)
+
+
+SCALES: Dict[str, Scale] = {
+    "S": Scale(providers=20, processes=5, providers_per_process=4, items=200, tiers=3,
+               products=50, processes_per_product=3, items_per_product=4, months=24),
+    "M": Scale(providers=100, processes=20, providers_per_process=8, items=2_000, tiers=4,
+               products=500, processes_per_product=3, items_per_product=4, months=36),
+    "L": Scale(providers=400, processes=80, providers_per_process=15, items=10_000, tiers=4,
+               products=2_000, processes_per_product=3, items_per_product=5, months=60),
+    "XL": Scale(providers=1_000, processes=200, providers_per_process=25, items=50_000, tiers=4,
+                products=5_000, processes_per_product=3, items_per_product=5, months=120),
+}
+
+# Tables in insertion order; each statement reads the parameters of `_parameters`
+STATEMENTS = {
+    "providers": """
+        INSERT INTO providers
+        SELECT r, printf('Provider %04d', r), 'Synthetic provider', 'active', $now, $now
+        FROM range(1, $providers + 1) t(r)
+    """,
+    "processes": """
+        INSERT INTO processes
+        SELECT r, printf('Process %03d', r), 'Synthetic process', process_provider(r, 0), '{}', 'active', $now, $now
+        FROM range(1, $processes + 1) t(r)
+    """,
+    "process_graph": """
+        INSERT INTO process_graph
+        SELECT r, r + 1 FROM range(1, $processes) t(r) WHERE r % 4 <> 0
+    """,
+    "process_providers": """
+        INSERT INTO process_providers
+        SELECT r // $per_process + 1, process_provider(r // $per_process + 1, r % $per_process), $now
+        FROM range($processes * $per_process) t(r)
+    """,
+    "contracts": """
+        INSERT INTO contracts
+        SELECT
+            r + 1, r // $per_process + 1, process_provider(r // $per_process + 1, r % $per_process),
+            printf('Process %03d / Provider %04d', r // $per_process + 1, process_provider(r // $per_process + 1, r % $per_process)),
+            'active', $now, $now
+        FROM range($processes * $per_process) t(r)
+    """,
+    "contract_tiers": """
+        INSERT INTO contract_tiers
+        SELECT
+            r + 1, r // $tiers + 1, r % $tiers + 1,
+            ceil($volume * 2.0 * (r % $tiers + 1) / $tiers * (0.7 + 0.6 * rnd(1, r // $tiers)))::INTEGER,
+            rnd(2, r // $tiers) < 0.05 AND r % $tiers = floor(rnd(3, r // $tiers) * $tiers),
+            $now, $now
+        FROM range($processes * $per_process * $tiers) t(r)
+    """,
+    "contract_lookups": """
+        INSERT INTO contract_lookups
+        SELECT
+            row_number() OVER (ORDER BY r), r + 1,
+            CASE WHEN rnd(5, r) < 0.25 THEN 'forecasts' ELSE 'actuals' END,
+            CASE WHEN rnd(6, r) < 0.5 THEN 'AVG' ELSE 'SUM' END,
+            floor(rnd(7, r) * 6)::INTEGER,
+            $now, $now
+        FROM range($processes * $per_process) t(r)
+        WHERE rnd(4, r) < 0.3
+    """,
+    "items": """
+        INSERT INTO items
+        SELECT r, printf('Item %05d', r), 'Synthetic item', 'active', $now, $now
+        FROM range(1, $items + 1) t(r)
+    """,
+    "process_items": """
+        INSERT INTO process_items
+        SELECT (r - 1) % $processes + 1, r, $now
+        FROM range(1, $items + 1) t(r)
+    """,
+    "offers": """
+        INSERT INTO offers (offer_id, item_id, provider_id, process_id, tier_number, price_per_unit, status, date_creation, date_last_update)
+        SELECT
+            r + 1, item_id, process_provider(process_id, k), process_id, tier,
+            round((5 + 195 * rnd(8, item_id)) * (0.8 + 0.4 * rnd(9, item_id * $per_process + k)) * (1 - 0.06 * (tier - 1)), 6),
+            'active', $now, $now
+        FROM (
+            SELECT
+                r,
+                r // ($per_process * $tiers) + 1 AS item_id,
+                r // ($per_process * $tiers) % $processes + 1 AS process_id,
+                r // $tiers % $per_process AS k,
+                r % $tiers + 1 AS tier
+            FROM range($items * $per_process * $tiers) t(r)
+        )
+    """,
+    "provider_items": """
+        INSERT INTO provider_items
+        SELECT provider_id, item_id, $now FROM offers WHERE tier_number = 1
+    """,
+    "products": """
+        INSERT INTO products
+        SELECT r, printf('Product %04d', r), 'Synthetic product', 'active', $now, $now
+        FROM range(1, $products + 1) t(r)
+    """,
+    "product_items": """
+        INSERT INTO product_items
+        SELECT product_id, process_id + $processes * ((product_id * $items_per_product + n) % ($items // $processes)), $now
+        FROM (
+            SELECT
+                r // ($per_product * $items_per_product) + 1 AS product_id,
+                (r // ($per_product * $items_per_product) + (r // $items_per_product % $per_product) * ($processes // $per_product)) % $processes + 1 AS process_id,
+                r % $items_per_product AS n
+            FROM range($products * $per_product * $items_per_product) t(r)
+        )
+    """,
+    "product_item_allocations": """
+        INSERT INTO product_item_allocations
+        WITH picks AS (
+            SELECT
+                product_id, item_id, (item_id - 1) % $processes + 1 AS process_id,
+                product_id * $items + item_id AS x,
+                floor(rnd(10, product_id * $items + item_id) * $per_process)::INTEGER AS k0,
+                rnd(12, product_id) < 0.2 AS by_units,
+                50 + floor(rnd(13, product_id * $items + item_id) * 41) AS share
+            FROM product_items
+        )
+        SELECT
+            product_id, item_id, process_provider(process_id, k0),
+            CASE WHEN by_units THEN 'units' ELSE 'percentage' END,
+            CASE WHEN by_units THEN share * 10 ELSE share END,
+            $now, $now
+        FROM picks
+        UNION ALL
+        SELECT
+            product_id, item_id, process_provider(process_id, (k0 + 1 + floor(rnd(11, x) * ($per_process - 1))::INTEGER) % $per_process),
+            CASE WHEN by_units THEN 'units' ELSE 'percentage' END,
+            CASE WHEN by_units THEN (100 - share) * 10 ELSE 100 - share END,
+            $now, $now
+        FROM picks
+    """,
+    "product_item_pricing": """
+        INSERT INTO product_item_pricing
+        SELECT product_id, item_id, round(0.85 + 0.35 * rnd(15, product_id * $items + item_id), 4), 'Synthetic multiplier', $now, $now
+        FROM product_items
+        WHERE rnd(14, product_id * $items + item_id) < 0.25
+    """,
+    "actuals": """
+        INSERT INTO actuals
+        SELECT r + 1, product_id, process_id, period // 12, period % 12 + 1, monthly_units(16, lane, m), $now, $now
+        FROM volume_lanes($months - $horizon)
+    """,
+    "forecasts": """
+        INSERT INTO forecasts
+        SELECT r + 1, product_id, process_id, period // 12, period % 12 + 1, monthly_units(17, lane, m), $now, $now
+        FROM volume_lanes($months)
+    """,
+}
+
+
+def _macros(seed: int, scale: Scale, first_period: int) -> str:
+    """Deterministic helpers shared by the statements (macros cannot take prepared parameters)"""
+    per_product = scale.processes_per_product
+    return f"""
+        CREATE OR REPLACE TEMP MACRO rnd(salt, i) AS (hash({seed}, salt, i) % 1000003) / 1000003.0;
+        CREATE OR REPLACE TEMP MACRO process_provider(p, k) AS ((p - 1) * {scale.providers_per_process} + k) % {scale.providers} + 1;
+        CREATE OR REPLACE TEMP MACRO monthly_units(salt, lane, m) AS greatest(0, round(
+            (200 + 4800 * rnd(18, lane))
+            * (1 + 0.02 * m / 12)
+            * (1 + 0.15 * sin(2 * pi() * (m + 12 * rnd(19, lane)) / 12))
+            * (0.85 + 0.3 * rnd(salt, lane * {scale.months} + m))
+        ))::INTEGER;
+        CREATE OR REPLACE TEMP MACRO volume_lanes(months) AS TABLE
+            SELECT
+                r, r // months AS lane, r % months AS m, {first_period} + r % months AS period,
+                r // months // {per_product} + 1 AS product_id,
+                (r // months // {per_product} + (r // months % {per_product}) * ({scale.processes} // {per_product})) % {scale.processes} + 1 AS process_id
+            FROM range({scale.products} * {per_product} * months) t(r);
+    """
+
+
+def _parameters(scale: Scale) -> Dict[str, int]:
+    return {
+        "providers": scale.providers,
+        "processes": scale.processes,
+        "per_process": scale.providers_per_process,
+        "items": scale.items,
+        "tiers": scale.tiers,
+        "volume": scale.expected_contract_volume,
+        "products": scale.products,
+        "per_product": scale.processes_per_product,
+        "items_per_product": scale.items_per_product,
+        "months": scale.months,
+        "horizon": scale.forecast_horizon,
+    }
+
+
+def generate(path: str, scale: str = "S", seed: int = 0, end: tuple = (2026, 12)) -> Dict[str, int]:
+    """
+    Build a synthetic database at `path`, replacing any existing file.
+
+    Args:
+        path: Database file to create
+        scale: Key of SCALES
+        seed: Seed for every generated value
+        end: Last (year, month) of the volume window
+
+    Returns {table: row count}
+    """
+    config = SCALES[scale]
+    if config.items % config.processes or config.processes < config.processes_per_product \
+            or config.items // config.processes < config.items_per_product or config.providers_per_process < 2:
+        raise ValueError(f"Inconsistent scale {scale}")
+
+    for stale in (path, f"{path}.wal"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    schema = DatabaseSchema(os.path.abspath(path))
+    schema.initialize_all()
+    conn = schema._get_connection()
+
+    end_period = end[0] * 12 + end[1] - 1
+    conn.execute(_macros(seed, config, end_period - config.months + 1))
+    parameters = _parameters(config)
+    now = f"{end[0]:04d}-{end[1]:02d}-01T00:00:00"
+
+    conn.execute("BEGIN TRANSACTION")
+    for table, statement in STATEMENTS.items():
+        values = {name: now if name == "now" else parameters[name] for name in set(PARAMETER.findall(statement))}
+        conn.execute(statement, values)
+    # The cube is derived from the tables above; every product starts out pending
+    conn.execute("INSERT INTO cost_cube_dirty SELECT product_id, NULL, NULL FROM products")
+    conn.execute("COMMIT")
+
+    schema._sync_sequences()
+    conn.execute("CHECKPOINT")
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in STATEMENTS}
+    schema.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Pareto database")
+    parser.add_argument("--scale", choices=list(SCALES), default="S")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end", default="2026-12", help="Last month of the volume window (YYYY-MM)")
+    parser.add_argument("--output", help="Database file (default: benchmarks/data/<scale>.ddb)")
+    args = parser.parse_args()
+
+    year, month = (int(part) for part in args.end.split("-"))
+    output = args.output or os.path.join(DATA_DIR, f"{args.scale}.ddb")
+
+    start = time.perf_counter()
+    counts = generate(output, args.scale, args.seed, (year, month))
+    elapsed = time.perf_counter() - start
+
+    for table, count in counts.items():
+        print(f"  {count:>10,}  {table}")
+    print(f"{args.scale} dataset (seed {args.seed}) written to {output} in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
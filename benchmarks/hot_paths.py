@@ -0,0 +1,310 @@
+"""
+Hot Path Benchmarks - Pricing, optimization and agent tool latency per dataset size
+
+Runs the calculation service, the pricing CRUD reads, the endpoints behind
+the product pages and the agent tools against synthetic databases from
+benchmarks/dataset.py (generated on first use, no network needed). Each
+scale runs in a fresh interpreter so global services start cold.
+
+Every benchmark is warmed up once and then timed for at least --min-rounds
+calls and --min-time seconds (capped at --max-rounds), pytest-benchmark
+style: min, mean, p50, p99, ops/sec and the number of SQL statements one
+call executes. Results are written to benchmarks/results/hot_paths.json; a
+p50 more than --threshold slower than the baseline, or any increase in the
+statement count, is reported as a regression.
+
+Usage:
+    python -m benchmarks.hot_paths [--scales S,M] [--seed 0] [--only pricing] [--update-baseline]
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.dataset import DATA_DIR, SCALES, generate
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+BASELINE_PATH = os.path.join(ROOT_DIR, "benchmarks", "baselines", "hot_paths.json")
+
+END = (2026, 12)  # last month of the generated volume window
+SAMPLE_PRODUCTS = 10  # products in the optimization scenario and in the cost cube
+
+
+@dataclass
+class Context:
+    """Dataset handles shared by the benchmarks of one scale"""
+    scale: str
+    crud: Any
+    calc: Any
+    client: Any
+    year: int
+    month: int
+    product_id: int
+    provider_id: int
+    contract_id: int
+    quantities: Dict[int, int]
+
+
+# name -> (group, factory); a factory takes the Context and returns the operation to time
+BENCHMARKS: Dict[str, Tuple[str, Callable[[Context], Callable[[], Any]]]] = {}
+
+
+def benchmark(name: str, group: str):
+    """Register a benchmark factory"""
+    def decorator(factory):
+        BENCHMARKS[name] = (group, factory)
+        return factory
+    return decorator
+
+
+def _get(client, url: str):
+    def call():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return response
+    return call
+
+
+@benchmark("calculate_cost_with_allocations", "optimization")
+def bench_calculate_cost(ctx: Context):
+    allocations = ctx.calc.get_current_allocations(ctx.quantities)
+    return lambda: ctx.calc.calculate_cost_with_allocations(ctx.quantities, allocations)
+
+
+@benchmark("get_current_allocations", "optimization")
+def bench_current_allocations(ctx: Context):
+    return lambda: ctx.calc.get_current_allocations(ctx.quantities)
+
+
+@benchmark("get_product_pricing_table_data", "pricing")
+def bench_pricing_table(ctx: Context):
+    return lambda: ctx.crud.get_product_pricing_table_data(ctx.product_id, ctx.year, ctx.month)
+
+
+@benchmark("GET /api/products/{product_id}/pricing_history", "pricing")
+def bench_pricing_history(ctx: Context):
+    return _get(ctx.client, f"/api/products/{ctx.product_id}/pricing_history?year={ctx.year}&month={ctx.month}&lookback=12")
+
+
+@benchmark("get_contracts_with_items", "contracts")
+def bench_contracts_with_items(ctx: Context):
+    return ctx.crud.get_contracts_with_items
+
+
+@benchmark("GET /api/products", "listing")
+def bench_products_listing(ctx: Context):
+    return _get(ctx.client, "/api/products")
+
+
+def _agent_tool(name: str, arguments: Callable[[Context], Dict[str, Any]]):
+    def factory(ctx: Context):
+        from ai import toolbox  # needs the agent stack (langchain)
+        tool = getattr(toolbox, name)
+        args = arguments(ctx)
+        return lambda: tool.invoke(args)
+    benchmark(f"agent: {name}", "agent")(factory)
+
+
+_agent_tool("search_entities", lambda ctx: {"query": "product 00"})
+_agent_tool("get_contract_details", lambda ctx: {"contract_id": ctx.contract_id})
+_agent_tool("get_product_simulation", lambda ctx: {"product_id": ctx.product_id, "year": ctx.year, "month": ctx.month})
+_agent_tool("get_provider_allocations", lambda ctx: {"provider_id": ctx.provider_id})
+_agent_tool("get_historical_volume", lambda ctx: {"entity_id": ctx.product_id, "year": ctx.year})
+
+
+def _server_timing_queries(response) -> int:
+    match = re.search(r'desc="(\d+) queries"', getattr(response, "headers", {}).get("server-timing", ""))
+    return int(match.group(1)) if match else 0
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(operation: Callable[[], Any], min_rounds: int, max_rounds: int, min_time: float) -> Dict[str, Any]:
+    """Time one operation after a warm-up call"""
+    from db.instrumentation import query_scope
+
+    with query_scope() as stats:
+        result = operation()
+    # Endpoints run in the test client's thread; their middleware reports the count
+    queries = stats.count or _server_timing_queries(result)
+
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_rounds and (len(timings) < min_rounds or time.perf_counter() - started < min_time):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        "rounds": len(timings),
+        "min_ms": timings[0] * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "ops_per_sec": len(timings) / sum(timings),
+        "queries": queries,
+    }
+
+
+def dataset_path(scale: str, seed: int) -> str:
+    path = os.path.join(DATA_DIR, f"{scale}-seed{seed}.ddb")
+    if not os.path.exists(path):
+        print(f"Generating {scale} dataset (seed {seed})...", file=sys.stderr)
+        generate(path, scale, seed, END)
+    return path
+
+
+def run_scale(args) -> Dict[str, Any]:
+    """Run the selected benchmarks against one dataset (in this interpreter)"""
+    import db.crud
+    from db.calculation import CalculationService
+
+    logging.getLogger("pareto.sql").setLevel(logging.ERROR)  # N+1 warnings would repeat every round
+
+    crud = db.crud.CRUDOperations(dataset_path(args.run_scale, args.seed))
+    crud.initialize_all()
+    db.crud._crud = crud  # endpoints and agent tools resolve it via get_crud()
+
+    # The cube is built for the sampled products only: a full build keeps every
+    # cell of every product in memory, which L and XL datasets do not fit
+    crud._get_connection().execute("DELETE FROM cost_cube_dirty WHERE product_id > ?", [SAMPLE_PRODUCTS])
+    start = time.perf_counter()
+    cube_cells = crud.update_cost_cube()
+    cube_seconds = time.perf_counter() - start
+
+    from fastapi.testclient import TestClient
+    import run_web
+
+    period = END[0] * 12 + END[1] - 1 - SCALES[args.run_scale].forecast_horizon
+    ctx = Context(
+        scale=args.run_scale,
+        crud=crud,
+        calc=CalculationService(crud),
+        client=TestClient(run_web.app),
+        year=period // 12,
+        month=period % 12 + 1,
+        product_id=1,
+        provider_id=1,
+        contract_id=1,
+        quantities={product_id: 1000 for product_id in range(1, SAMPLE_PRODUCTS + 1)},
+    )
+
+    results = {}
+    for name, (group, factory) in BENCHMARKS.items():
+        if args.only and not any(part in name or part == group for part in args.only.split(",")):
+            continue
+        try:
+            operation = factory(ctx)
+        except ImportError as e:
+            results[name] = {"group": group, "skipped": f"missing dependency: {e.name}"}
+            continue
+        results[name] = {"group": group, **measure(operation, args.min_rounds, args.max_rounds, args.min_time)}
+
+    return {"setup": {"cost_cube_cells": cube_cells, "cost_cube_seconds": cube_seconds}, "benchmarks": results}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Regressions of the current results against the baseline"""
+    regressions = []
+    for scale, scale_result in results.items():
+        for name, current in scale_result["benchmarks"].items():
+            reference = baseline.get(scale, {}).get(name)
+            if not reference or "skipped" in current:
+                continue
+            if current["p50_ms"] > reference["p50_ms"] * (1 + threshold):
+                regressions.append(f"{scale} {name}: p50 {current['p50_ms']:.2f} ms vs baseline {reference['p50_ms']:.2f} ms")
+            if current["queries"] > reference["queries"]:
+                regressions.append(f"{scale} {name}: {current['queries']} queries vs baseline {reference['queries']}")
+    return regressions
+
+
+def print_table(scale: str, scale_result: Dict[str, Any]):
+    setup = scale_result["setup"]
+    print(f"\n{scale}: cost cube {setup['cost_cube_cells']:,} cells in {setup['cost_cube_seconds']:.1f} s")
+    print(f"  {'name':<50} {'min ms':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'rounds':>6} {'queries':>7}")
+    for name, r in scale_result["benchmarks"].items():
+        if "skipped" in r:
+            print(f"  {name:<50} skipped ({r['skipped']})")
+            continue
+        print(f"  {name:<50} {r['min_ms']:9.2f} {r['mean_ms']:9.2f} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f} "
+              f"{r['ops_per_sec']:9.1f} {r['rounds']:6d} {r['queries']:7d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pricing and optimization hot paths")
+    parser.add_argument("--scales", default="S,M", help=f"Comma-separated dataset scales ({', '.join(SCALES)})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="Comma-separated name fragments or groups to run")
+    parser.add_argument("--min-rounds", type=int, default=5)
+    parser.add_argument("--max-rounds", type=int, default=200)
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds to keep timing each benchmark")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed p50 regression vs baseline (fraction)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--run-scale", help=argparse.SUPPRESS)  # internal: run one scale and print JSON
+    args = parser.parse_args()
+
+    if args.run_scale:
+        json.dump(run_scale(args), sys.stdout)
+        return
+
+    scales = [scale.strip() for scale in args.scales.split(",") if scale.strip()]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        parser.error(f"unknown scale(s): {', '.join(unknown)}")
+
+    results = {}
+    for scale in scales:
+        command = [sys.executable, "-m", "benchmarks.hot_paths", "--run-scale", scale, "--seed", str(args.seed),
+                   "--min-rounds", str(args.min_rounds), "--max-rounds", str(args.max_rounds), "--min-time", str(args.min_time)]
+        if args.only:
+            command += ["--only", args.only]
+        proc = subprocess.run(command, cwd=ROOT_DIR, stdout=subprocess.PIPE, text=True, check=True)
+        results[scale] = json.loads(proc.stdout)
+        print_table(scale, results[scale])
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, "hot_paths.json"), "w") as f:
+        json.dump({"seed": args.seed, "scales": results}, f, indent=2)
+
+    failures = []
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                baseline = json.load(f)
+        for scale, scale_result in results.items():
+            baseline.setdefault(scale, {}).update({
+                name: {"p50_ms": r["p50_ms"], "queries": r["queries"]}
+                for name, r in scale_result["benchmarks"].items() if "skipped" not in r
+            })
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nBaseline updated: {BASELINE_PATH}")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            failures = compare(results, json.load(f), args.threshold)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Load Test - Replays dashboard page loads with concurrent virtual users
+
+Single-endpoint benchmarks miss what a page load does to the server: the
+home dashboard and the product pages fan out into dozens of requests, part
+of them in parallel. Each virtual user here loads pages the way the
+frontend does, with up to BROWSER_CONNECTIONS requests in flight at once:
+
+- products: the products page, then one product's pricing view and
+  history (ProductsPage.js, ProductView.js)
+- allocation: the cost strategy tab for one process, including the
+  per-contract and per-product fetches (SimulationAllocation.js)
+- lookup_strategy: the lookup strategy tab for one process
+  (SimulationLookupStrategyForecast.js)
+
+A page-load recording exported from the browser's network panel (HAR) can
+be replayed instead with --har: its GET requests are replayed in recorded
+order, and requests that overlapped in the recording are sent concurrently.
+
+The target is a server started in this process on a generated dataset
+(--dataset, see benchmarks/dataset.py) or one already running (--url, e.g.
+`PARETO_WORKERS=4 uv run python run_web.py`). Throughput, latency
+percentiles and error rates per route and per page are printed and written
+to benchmarks/results/load_test.json.
+
+Usage:
+    python -m benchmarks.load_test [--users 8] [--duration 30] [--pages products,allocation] [--dataset S | --url http://localhost:5002] [--har page.har]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import re
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+
+BROWSER_CONNECTIONS = 6  # concurrent requests a browser sends to one host
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+class Recorder:
+    """Collects (route, status, seconds) samples from every virtual user"""
+
+    def __init__(self):
+        self.requests: List[Tuple[str, int, float]] = []
+        self.pages: List[Tuple[str, bool, float]] = []
+
+    def request(self, route: str, status: int, seconds: float):
+        self.requests.append((route, status, seconds))  # list.append is atomic
+
+    def page(self, name: str, ok: bool, seconds: float):
+        self.pages.append((name, ok, seconds))
+
+
+class Session:
+    """One virtual user: a browser tab with its own keep-alive connections"""
+
+    def __init__(self, base_url: str, recorder: Recorder, rng: random.Random):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.recorder = recorder
+        self.rng = rng
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=BROWSER_CONNECTIONS)
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        return conn
+
+    def get(self, path: str, route: str = None) -> Any:
+        """GET a path, record it under its route template and return the decoded JSON"""
+        route = route or ID_SEGMENT.sub("/{id}", path.split("?")[0])
+        start = time.perf_counter()
+        status = 0
+        try:
+            conn = self._connection()
+            conn.request("GET", path, headers={"Accept": "application/json"})
+            response = conn.getresponse()
+            body = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+            raise
+        finally:
+            self.recorder.request(route, status, time.perf_counter() - start)
+        if status >= 400:
+            raise RuntimeError(f"GET {path} returned {status}")
+        return json.loads(body) if body else None
+
+    def all(self, calls: List[Callable[[], Any]]) -> List[Any]:
+        """Run calls concurrently, like Promise.all over fetches"""
+        return list(self._pool.map(lambda call: call(), calls))
+
+    def close(self):
+        self._pool.shutdown()
+
+
+# =====================================
+# Page-load graphs (mirroring the frontend)
+# =====================================
+
+def products_page(session: Session):
+    products, _, _ = session.all([
+        lambda: session.get("/api/products"),
+        lambda: session.get("/api/contracts"),
+        lambda: session.get("/api/providers"),
+    ])
+    if not products:
+        return
+    product_id = session.rng.choice(products)["product_id"]
+    session.get(f"/api/products/{product_id}", "/api/products/{product_id}")
+    session.all([
+        lambda: session.get(f"/api/products/{product_id}/pricing_view?", "/api/products/{product_id}/pricing_view"),
+        lambda: session.get(f"/api/products/{product_id}/pricing_history?lookback=12&", "/api/products/{product_id}/pricing_history"),
+    ])
+
+
+def _process_contracts(session: Session) -> Tuple[Optional[int], list]:
+    processes = [p for p in session.get("/api/processes") if p["status"] == "active"]
+    if not processes:
+        return None, []
+    process_id = session.rng.choice(processes)["process_id"]
+    return process_id, session.get(f"/api/contracts/by-process/{process_id}", "/api/contracts/by-process/{process_id}")
+
+
+def allocation_page(session: Session):
+    process_id, contracts = _process_contracts(session)
+    if not contracts:
+        return
+    session.get("/api/products")
+    actuals = session.get("/api/actuals")
+    forecasts = session.get("/api/forecasts")
+
+    def contract_detail(contract):
+        session.get(f"/api/contract-lookups/{contract['contract_id']}", "/api/contract-lookups/{contract_id}")
+        session.get(f"/api/contract-tiers/{contract['contract_id']}", "/api/contract-tiers/{contract_id}")
+        session.get(f"/api/offers/provider/{contract['provider_id']}", "/api/offers/provider/{provider_id}")
+
+    session.all([lambda c=contract: contract_detail(c) for contract in contracts])
+    product_ids = sorted({row["product_id"] for row in actuals + forecasts if row["process_id"] == process_id})
+    session.all([lambda p=p: session.get(f"/api/products/{p}", "/api/products/{product_id}") for p in product_ids])
+
+
+def lookup_strategy_page(session: Session):
+    process_id, contracts = _process_contracts(session)
+    if not contracts:
+        return
+    forecasts, actuals = session.all([lambda: session.get("/api/forecasts"), lambda: session.get("/api/actuals")])
+
+    def contract_detail(contract):
+        session.get(f"/api/contract-lookups/{contract['contract_id']}", "/api/contract-lookups/{contract_id}")
+        session.get(f"/api/contract-tiers/{contract['contract_id']}", "/api/contract-tiers/{contract_id}")
+
+    session.all([lambda c=contract: contract_detail(c) for contract in contracts])
+    product_ids = sorted({row["product_id"] for row in actuals + forecasts if row["process_id"] == process_id})
+    session.all([lambda p=p: session.get(f"/api/products/{p}", "/api/products/{product_id}") for p in product_ids])
+
+
+PAGES: Dict[str, Callable[[Session], None]] = {
+    "products": products_page,
+    "allocation": allocation_page,
+    "lookup_strategy": lookup_strategy_page,
+}
+
+
+def har_page(path: str) -> Callable[[Session], None]:
+    """Page graph replaying the GET requests of a HAR recording in overlapping waves"""
+    with open(path) as f:
+        entries = json.load(f)["log"]["entries"]
+
+    requests = []
+    for entry in entries:
+        if entry["request"]["method"] != "GET":
+            continue
+        url = urlsplit(entry["request"]["url"])
+        if not url.path.startswith("/api/"):
+            continue
+        started = datetime.fromisoformat(entry["startedDateTime"].replace("Z", "+00:00")).timestamp()
+        requests.append((started, started + entry["time"] / 1000, url.path + (f"?{url.query}" if url.query else "")))
+    requests.sort()
+
+    waves: List[List[str]] = []
+    wave_end = -math.inf
+    for started, finished, target in requests:
+        if started >= wave_end:
+            waves.append([])
+        waves[-1].append(target)
+        wave_end = max(wave_end, finished)
+
+    def replay(session: Session):
+        for wave in waves:
+            session.all([lambda t=target: session.get(t) for target in wave])
+    return replay
+
+
+# =====================================
+# Runner
+# =====================================
+
+def virtual_user(index: int, args, pages: Dict[str, Callable], recorder: Recorder, deadline: float):
+    rng = random.Random(args.seed * 1000 + index)
+    time.sleep(args.ramp_up * index / max(args.users, 1))
+    session = Session(args.url, recorder, rng)
+    names = list(pages)
+    try:
+        while time.perf_counter() < deadline:
+            name = rng.choice(names)
+            start = time.perf_counter()
+            try:
+                pages[name](session)
+                ok = True
+            except Exception:
+                ok = False
+            recorder.page(name, ok, time.perf_counter() - start)
+            if args.think_time:
+                time.sleep(rng.expovariate(1 / args.think_time))
+    finally:
+        session.close()
+
+
+def start_local_server(scale: str, seed: int) -> str:
+    """Serve the app from a background thread on a generated dataset; returns its URL"""
+    import uvicorn
+
+    import db.crud
+    from benchmarks.hot_paths import dataset_path
+
+    logging.getLogger("pareto.sql").setLevel(logging.ERROR)  # N+1 warnings would repeat every page load
+    crud = db.crud.CRUDOperations(dataset_path(scale, seed))
+    crud.initialize_all()
+    db.crud._crud = crud
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config("run_web:app", host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="pareto-load-test-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    return sorted_values[max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+def summarize(samples: List[Tuple[str, bool, float]], elapsed: float) -> Dict[str, Dict[str, Any]]:
+    """Throughput, latency percentiles and error rate per name"""
+    grouped: Dict[str, List[Tuple[bool, float]]] = {}
+    for name, ok, seconds in samples:
+        grouped.setdefault(name, []).append((ok, seconds))
+
+    summary = {}
+    for name, rows in sorted(grouped.items()):
+        timings = sorted(seconds for _, seconds in rows)
+        errors = sum(1 for ok, _ in rows if not ok)
+        summary[name] = {
+            "count": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows),
+            "per_sec": len(rows) / elapsed,
+            "mean_ms": statistics.fmean(timings) * 1000,
+            "p50_ms": percentile(timings, 0.50) * 1000,
+            "p95_ms": percentile(timings, 0.95) * 1000,
+            "p99_ms": percentile(timings, 0.99) * 1000,
+            "max_ms": timings[-1] * 1000,
+        }
+    return summary
+
+
+def print_summary(title: str, summary: Dict[str, Dict[str, Any]]):
+    print(f"\n{title}")
+    print(f"  {'name':<50} {'count':>7} {'errors':>6} {'per s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, s in summary.items():
+        print(f"  {name:<50} {s['count']:7d} {s['errors']:6d} {s['per_sec']:7.1f} "
+              f"{s['p50_ms']:9.1f} {s['p95_ms']:9.1f} {s['p99_ms']:9.1f} {s['max_ms']:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay dashboard page loads with concurrent virtual users")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Seconds over which users start")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean pause between page loads (seconds)")
+    parser.add_argument("--pages", default=",".join(PAGES), help=f"Comma-separated page graphs ({', '.join(PAGES)})")
+    parser.add_argument("--har", help="Replay this HAR recording instead of the built-in pages")
+    parser.add_argument("--url", help="Base URL of a running server (default: serve --dataset in this process)")
+    parser.add_argument("--dataset", default="S", help="Synthetic dataset scale for the in-process server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.har:
+        pages = {os.path.basename(args.har): har_page(args.har)}
+    else:
+        unknown = [name for name in args.pages.split(",") if name not in PAGES]
+        if unknown:
+            parser.error(f"unknown page(s): {', '.join(unknown)}")
+        pages = {name: PAGES[name] for name in args.pages.split(",")}
+
+    if not args.url:
+        args.url = start_local_server(args.dataset, args.seed)
+    print(f"{args.users} users for {args.duration:.0f} s against {args.url} ({', '.join(pages)})", file=sys.stderr)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    users = [
+        threading.Thread(target=virtual_user, args=(i, args, pages, recorder, deadline), daemon=True)
+        for i in range(args.users)
+    ]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+
+    routes = summarize([(route, 0 < status < 400, seconds) for route, status, seconds in recorder.requests], elapsed)
+    page_loads = summarize(recorder.pages, elapsed)
+    total = len(recorder.requests)
+    errors = sum(s["errors"] for s in routes.values())
+    result = {
+        "url": args.url,
+        "users": args.users,
+        "duration_s": elapsed,
+        "requests": total,
+        "requests_per_sec": total / elapsed,
+        "error_rate": errors / total if total else 0.0,
+        "pages": page_loads,
+        "routes": routes,
+    }
+
+    print_summary("Page loads", page_loads)
+    print_summary("Routes", routes)
+    print(f"\n{total} requests in {elapsed:.1f} s: {result['requests_per_sec']:.1f} req/s, error rate {result['error_rate']:.2%}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, "load_test.json"), "w") as f:
+        json.dump(result, f, indent=2)
+
+    if result["error_rate"] > args.max_error_rate:
+        print(f"FAIL: error rate {result['error_rate']:.2%} exceeds {args.max_error_rate:.2%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Query Plans - Plan regression checks for hot SQL statements
+
+Each registered hot statement is a CRUD call; the harness runs it once on a
+synthetic dataset (benchmarks/dataset.py), captures the SQL it executes
+with its parameters, and asks DuckDB for the plan (`EXPLAIN`, or
+`EXPLAIN ANALYZE` with --analyze to add actual row counts). Plans are
+compared with the snapshot in benchmarks/baselines/query_plans.json:
+
+- a table is read by a weaker scan than before (index scan, then
+  sequential scan with pushed-down filters, then full sequential scan),
+- more cross products or nested-loop joins than in the snapshot,
+- an operator's row estimate grew more than --estimate-factor times,
+- the plan shape changed (only a warning when the snapshot was taken with
+  another DuckDB version, whose optimizer may legitimately differ).
+
+Any of these fails the run; review the new plan and accept it with
+--update-snapshot.
+
+Usage:
+    python -m benchmarks.query_plans [--scale M] [--analyze] [--only offers] [--update-snapshot]
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Callable, Dict, List, Tuple
+
+import duckdb
+
+from benchmarks.hot_paths import dataset_path
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+SNAPSHOT_PATH = os.path.join(ROOT_DIR, "benchmarks", "baselines", "query_plans.json")
+
+CROSS_OPERATORS = ("CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN", "POSITIONAL_SCAN")
+SCAN_RANK = {"index": 2, "filtered": 1, "full": 0}
+
+# name -> CRUD call; ids exist at every dataset scale (item 1 belongs to process 1, provider 1 serves it)
+HOT_STATEMENTS: Dict[str, Callable[[Any], Any]] = {
+    "get_contracts_with_items": lambda crud: crud.get_contracts_with_items(),
+    "get_contracts_with_items(process)": lambda crud: crud.get_contracts_with_items(process_id=1),
+    "get_product_contracts_with_selected_items": lambda crud: crud.get_product_contracts_with_selected_items(1),
+    "get_products_contracts_with_selected_items": lambda crud: crud.get_products_contracts_with_selected_items(list(range(1, 11))),
+    "get_offers_for_item_optimization": lambda crud: crud.get_offers_for_item_optimization(1, 3),
+    "get_offers_for_item_optimization(process)": lambda crud: crud.get_offers_for_item_optimization(1, 3, process_id=1),
+    "get_price_for_item_at_tier": lambda crud: crud.get_price_for_item_at_tier(1, 1, 1, 1),
+    "get_offer_prices_for_contracts": lambda crud: crud.get_offer_prices_for_contracts(list(range(1, 21))),
+    "get_pooled_contract_volumes": lambda crud: crud.get_pooled_contract_volumes("actuals", (2025, 1), (2025, 12)),
+}
+
+
+class CapturingConnection:
+    """Connection proxy recording the statements a CRUD call executes"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.statements: List[Tuple[str, Any]] = []
+
+    def execute(self, query, parameters=None):
+        self.statements.append((query, parameters))
+        return self._conn.execute(query, parameters)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def capture(crud, call: Callable[[Any], Any]) -> List[Tuple[str, Any]]:
+    """Run a CRUD call and return the (query, parameters) it executed"""
+    conn = crud._get_connection()
+    crud.conn = CapturingConnection(conn)
+    try:
+        call(crud)
+        return crud.conn.statements
+    finally:
+        crud.conn = conn
+
+
+def _estimate(extra_info: dict) -> int:
+    try:
+        return int(extra_info.get("Estimated Cardinality", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def flatten(node: dict, depth: int = 0) -> List[Dict[str, Any]]:
+    """Plan tree (EXPLAIN or EXPLAIN ANALYZE JSON) as a pre-order list of operator summaries"""
+    name = node.get("name") or node.get("operator_name") or ""
+    extra = node.get("extra_info") or {}
+    if name in ("", "EXPLAIN_ANALYZE"):  # profiler root and the EXPLAIN ANALYZE operator itself
+        return [row for child in node.get("children", []) for row in flatten(child, depth)]
+
+    summary: Dict[str, Any] = {"depth": depth, "operator": name.strip(), "estimate": _estimate(extra)}
+    if "Table" in extra:
+        summary["table"] = extra["Table"].split(".")[-1]
+        if name.strip() == "INDEX_SCAN" or "Index" in str(extra.get("Type", "")):
+            summary["scan"] = "index"
+        elif extra.get("Filters") or extra.get("Dynamic Filters"):
+            summary["scan"] = "filtered"
+        else:
+            summary["scan"] = "full"
+    if "Join Type" in extra:
+        summary["join"] = extra["Join Type"]
+    if "operator_cardinality" in node:
+        summary["actual"] = node["operator_cardinality"]
+
+    return [summary] + [row for child in node.get("children", []) for row in flatten(child, depth + 1)]
+
+
+def explain(conn, query: str, parameters, analyze: bool) -> List[Dict[str, Any]]:
+    options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+    plan = json.loads(conn.execute(f"EXPLAIN ({options}) {query}", parameters).fetchall()[0][1])
+    roots = plan if isinstance(plan, list) else [plan]
+    return [row for root in roots for row in flatten(root)]
+
+
+def shape(nodes: List[Dict[str, Any]]) -> List[str]:
+    return [f"{'  ' * n['depth']}{n['operator']}{' ' + n['table'] if 'table' in n else ''}" for n in nodes]
+
+
+def scans_by_table(nodes: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Weakest scan kind per table"""
+    scans: Dict[str, str] = {}
+    for node in nodes:
+        if "scan" in node:
+            current = scans.get(node["table"])
+            if current is None or SCAN_RANK[node["scan"]] < SCAN_RANK[current]:
+                scans[node["table"]] = node["scan"]
+    return scans
+
+
+def regressions(key: str, nodes: List[Dict[str, Any]], reference: Dict[str, Any], estimate_factor: float,
+                same_version: bool) -> Tuple[List[str], List[str]]:
+    """(failures, warnings) of a plan against its snapshot"""
+    failures, warnings = [], []
+    reference_nodes = reference["nodes"]
+
+    reference_scans = scans_by_table(reference_nodes)
+    for table, scan in scans_by_table(nodes).items():
+        was = reference_scans.get(table)
+        if was and SCAN_RANK[scan] < SCAN_RANK[was]:
+            failures.append(f"{key}: {table} read by a {scan} scan (was {was})")
+
+    for operator in CROSS_OPERATORS:
+        count = sum(1 for n in nodes if n["operator"] == operator)
+        was = sum(1 for n in reference_nodes if n["operator"] == operator)
+        if count > was:
+            failures.append(f"{key}: {count} {operator} operator(s) (was {was})")
+
+    if shape(nodes) != shape(reference_nodes):
+        message = f"{key}: plan shape changed\n    was: " + "\n         ".join(shape(reference_nodes)) + \
+                  "\n    now: " + "\n         ".join(shape(nodes))
+        (failures if same_version else warnings).append(message)
+    else:
+        for node, was in zip(nodes, reference_nodes):
+            if node["estimate"] > max(was["estimate"], 1) * estimate_factor:
+                failures.append(f"{key}: {node['operator']} estimate {node['estimate']:,} rows (was {was['estimate']:,})")
+
+    return failures, warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check query plans of hot SQL statements against a snapshot")
+    parser.add_argument("--scale", default="M", help="Synthetic dataset scale")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--analyze", action="store_true", help="Run EXPLAIN ANALYZE to add actual row counts")
+    parser.add_argument("--only", help="Comma-separated name fragments to check")
+    parser.add_argument("--estimate-factor", type=float, default=10.0, help="Allowed row estimate growth vs snapshot")
+    parser.add_argument("--update-snapshot", action="store_true")
+    args = parser.parse_args()
+
+    from db.crud import CRUDOperations
+
+    crud = CRUDOperations(dataset_path(args.scale, args.seed))
+    crud.initialize_all()
+    conn = crud._get_connection()
+
+    plans: Dict[str, List[Dict[str, Any]]] = {}
+    for name, call in HOT_STATEMENTS.items():
+        if args.only and not any(part in name for part in args.only.split(",")):
+            continue
+        for i, (query, parameters) in enumerate(capture(crud, call)):
+            plans[f"{name}#{i}"] = explain(conn, query, parameters, args.analyze)
+
+    for key, nodes in plans.items():
+        print(f"\n{key}")
+        for node, line in zip(nodes, shape(nodes)):
+            detail = f"~{node['estimate']:,}" + (f" actual {node['actual']:,}" if "actual" in node else "")
+            scan = f" [{node['scan']}]" if "scan" in node else ""
+            print(f"  {line:<60} {detail}{scan}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, "query_plans.json"), "w") as f:
+        json.dump({"scale": args.scale, "seed": args.seed, "duckdb": duckdb.__version__, "plans": plans}, f, indent=2)
+
+    snapshot = {}
+    if os.path.exists(SNAPSHOT_PATH):
+        with open(SNAPSHOT_PATH) as f:
+            snapshot = json.load(f)
+
+    if args.update_snapshot:
+        stored = {key: {"shape": shape(nodes), "nodes": [{k: v for k, v in n.items() if k != "actual"} for n in nodes]}
+                  for key, nodes in plans.items()}
+        snapshot = {
+            "scale": args.scale,
+            "seed": args.seed,
+            "duckdb": duckdb.__version__,
+            "plans": {**snapshot.get("plans", {}), **stored} if snapshot.get("scale") == args.scale else stored,
+        }
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH), exist_ok=True)
+        with open(SNAPSHOT_PATH, "w") as f:
+            json.dump(snapshot, f, indent=2)
+        print(f"\nSnapshot updated: {SNAPSHOT_PATH}")
+        return
+
+    failures, warnings = [], []
+    if snapshot and snapshot["scale"] != args.scale:
+        warnings.append(f"snapshot was taken at scale {snapshot['scale']}, not compared")
+    elif snapshot:
+        same_version = snapshot["duckdb"] == duckdb.__version__
+        for key, nodes in plans.items():
+            reference = snapshot["plans"].get(key)
+            if reference is None:
+                warnings.append(f"{key}: no snapshot")
+                continue
+            plan_failures, plan_warnings = regressions(key, nodes, reference, args.estimate_factor, same_version)
+            failures += plan_failures
+            warnings += plan_warnings
+
+    # A cross product is a regression even without a snapshot to compare with
+    for key, nodes in plans.items():
+        if key not in snapshot.get("plans", {}) and any(n["operator"] == "CROSS_PRODUCT" for n in nodes):
+            failures.append(f"{key}: CROSS_PRODUCT in plan")
+
+    for warning in warnings:
+        print(f"WARN: {warning}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
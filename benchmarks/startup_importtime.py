@@ -0,0 +1,105 @@
+"""
+Startup Benchmark - Cold import time of the web application
+
+Runs `python -X importtime -c "import run_web"` in fresh interpreters and
+reports the cumulative import time of the app, the slowest modules, and
+whether the agent stack (langchain/langgraph) leaked into startup.
+
+Usage:
+    python -m benchmarks.startup_importtime [--runs 5] [--budget-ms 1000] [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+BASELINE_PATH = os.path.join(ROOT_DIR, "benchmarks", "baselines", "startup_importtime.json")
+
+# Modules that must stay out of the non-AI startup path
+LAZY_PREFIXES = ("langchain", "langgraph", "anthropic", "ai.pareto_agent")
+
+
+def parse_importtime(stderr: str) -> list:
+    """Parse -X importtime output into (module, self_us, cumulative_us) tuples."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure_once(target: str) -> dict:
+    """Import target in a fresh interpreter and collect import timings."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    rows = parse_importtime(proc.stderr)
+    total_us = next(cumulative for module, _, cumulative in rows if module == target)
+    return {
+        "total_ms": total_us / 1000,
+        "slowest": sorted(rows, key=lambda r: r[1], reverse=True)[:15],
+        "lazy_leaks": sorted({module for module, _, _ in rows if module.startswith(LAZY_PREFIXES)}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the web app")
+    parser.add_argument("--target", default="run_web")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed regression vs baseline (fraction)")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    runs = [measure_once(args.target) for _ in range(args.runs)]
+    totals = [r["total_ms"] for r in runs]
+    result = {
+        "target": args.target,
+        "runs": args.runs,
+        "median_ms": statistics.median(totals),
+        "min_ms": min(totals),
+        "max_ms": max(totals),
+        "slowest_self_us": [{"module": m, "self_us": s, "cumulative_us": c} for m, s, c in runs[-1]["slowest"]],
+        "lazy_leaks": runs[-1]["lazy_leaks"],
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, "startup_importtime.json"), "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"import {args.target}: median {result['median_ms']:.1f} ms (min {result['min_ms']:.1f}, max {result['max_ms']:.1f})")
+    for row in result["slowest_self_us"][:10]:
+        print(f"  {row['self_us'] / 1000:8.1f} ms  {row['module']}")
+
+    failures = []
+    if result["lazy_leaks"]:
+        failures.append(f"agent modules imported at startup: {', '.join(result['lazy_leaks'])}")
+    if result["median_ms"] > args.budget_ms:
+        failures.append(f"median {result['median_ms']:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"median_ms": result["median_ms"]}, f, indent=2)
+        print(f"Baseline updated: {BASELINE_PATH}")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline_ms = json.load(f)["median_ms"]
+        if result["median_ms"] > baseline_ms * (1 + args.threshold):
+            failures.append(f"median {result['median_ms']:.1f} ms regressed vs baseline {baseline_ms:.1f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
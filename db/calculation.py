@@ -4,15 +4,239 @@ Calculation Services - Business logic for cost calculations and optimization
 This module provides cost calculation and allocation optimization services.
 """
 
+from bisect import bisect_right
+from dataclasses import dataclass, field
 from typing import Dict, List, Any, Optional
 from db.crud import get_crud
+from db.metrics import timed
+from db.pooling import VolumePoolingService
+
+
+@dataclass
+class ContractCostCurve:
+    """
+    Cost of one contract as a function of pooled volume.
+
+    Breakpoints come from contract_tiers.threshold_units (sorted ascending):
+    a tier applies while volume < its threshold, and volume at or above the
+    last threshold stays in the last tier. Pricing is all-units, so cost is
+    linear inside a tier (slope = the tier's price for the item mix) and
+    jumps at each breakpoint. Every lookup is a bisect, O(log tiers).
+    """
+    contract_id: int
+    thresholds: List[int]
+    tier_numbers: List[int]
+    unit_prices: List[float]  # Blended price of the item mix, per tier (threshold order)
+    item_prices: Dict[int, List[Optional[float]]] = field(default_factory=dict)  # item_id -> price per tier, None where not offered
+    selected_tier: Optional[int] = None
+
+    @classmethod
+    def build(cls, contract_id: int, tiers: List[Dict[str, Any]], offer_prices: Dict[int, Dict[int, float]],
+              item_weights: Optional[Dict[int, float]] = None) -> "ContractCostCurve":
+        """
+        Args:
+            tiers: Contract tier rows
+            offer_prices: item_id -> {tier_number: price}
+            item_weights: item_id -> share of the volume (normalized here). Defaults
+                to an equal mix of every item priced on the contract.
+        """
+        tiers = sorted(tiers, key=lambda t: t['threshold_units'])
+        tier_numbers = [t['tier_number'] for t in tiers] or [1]
+        item_prices = {
+            item_id: [prices.get(tier_number) for tier_number in tier_numbers]
+            for item_id, prices in offer_prices.items()
+        }
+
+        # Each tier blends the items priced at it; an item without an offer there is left out, not free
+        weights = item_weights or {item_id: 1.0 for item_id in item_prices}
+        unit_prices = []
+        for i in range(len(tier_numbers)):
+            priced = [(w, item_prices[item_id][i]) for item_id, w in weights.items()
+                      if item_id in item_prices and item_prices[item_id][i] is not None]
+            total_weight = sum(w for w, _ in priced)
+            unit_prices.append(sum(w * price for w, price in priced) / total_weight if total_weight > 0 else 0.0)
+
+        return cls(
+            contract_id=contract_id,
+            thresholds=[t['threshold_units'] for t in tiers],
+            tier_numbers=tier_numbers,
+            unit_prices=unit_prices,
+            item_prices=item_prices,
+            selected_tier=next((t['tier_number'] for t in tiers if t['is_selected']), None)
+        )
+
+    def tier_index(self, volume: float, use_manual_tiers: bool = False) -> int:
+        if use_manual_tiers and self.selected_tier is not None:
+            return self.tier_numbers.index(self.selected_tier)
+        return min(bisect_right(self.thresholds, volume), len(self.tier_numbers) - 1)
+
+    def tier_for_volume(self, volume: float, use_manual_tiers: bool = False) -> int:
+        return self.tier_numbers[self.tier_index(volume, use_manual_tiers)]
+
+    def unit_price(self, volume: float, item_id: Optional[int] = None, use_manual_tiers: bool = False) -> Optional[float]:
+        """Price per unit at this volume, blended over the item mix or for one item (None if it has no offer there)"""
+        idx = self.tier_index(volume, use_manual_tiers)
+        if item_id is None:
+            return self.unit_prices[idx]
+        prices = self.item_prices.get(item_id)
+        return prices[idx] if prices else None
+
+    def price_at_tier(self, tier_number: int, item_id: int) -> Optional[float]:
+        """Item price at a tier, None when the item has no offer at it (like get_price_for_item_at_tier)"""
+        prices = self.item_prices.get(item_id)
+        return prices[self.tier_numbers.index(tier_number)] if prices and tier_number in self.tier_numbers else None
+
+    def cost(self, volume: float, use_manual_tiers: bool = False) -> float:
+        return volume * self.unit_price(volume, use_manual_tiers=use_manual_tiers)
+
+    def marginal_cost(self, volume: float, use_manual_tiers: bool = False) -> float:
+        """Slope of the cost curve inside the active tier (excludes the jump at the next breakpoint)"""
+        return self.unit_price(volume, use_manual_tiers=use_manual_tiers)
+
+    def volume_to_next_breakpoint(self, volume: float) -> Optional[float]:
+        """Units to add before the tier changes, None once in the last tier"""
+        idx = bisect_right(self.thresholds, volume)
+        return self.thresholds[idx] - volume if idx < len(self.thresholds) - 1 else None
+
+    def to_dict(self, volume: Optional[float] = None) -> Dict[str, Any]:
+        data = {
+            'contract_id': self.contract_id,
+            'selected_tier': self.selected_tier,
+            'breakpoints': [
+                {
+                    'tier_number': tier_number,
+                    'lower_bound': self.thresholds[i - 1] if i > 0 else 0,
+                    'upper_bound': self.thresholds[i] if i < len(self.tier_numbers) - 1 else None,
+                    'unit_price': self.unit_prices[i]
+                }
+                for i, tier_number in enumerate(self.tier_numbers)
+            ]
+        }
+        if volume is not None:
+            data['at_volume'] = {
+                'volume': volume,
+                'tier_number': self.tier_for_volume(volume),
+                'cost': self.cost(volume),
+                'marginal_cost': self.marginal_cost(volume),
+                'volume_to_next_breakpoint': self.volume_to_next_breakpoint(volume)
+            }
+        return data
+
+
+class AllocationCostModel:
+    """
+    Single-period cost of many candidate allocations for one set of product quantities.
+
+    Prepared once (lanes, prices, cost curves) so each candidate is priced
+    without touching the database. Follows calculate_cost_with_allocations:
+    a contract's tier comes from its summed volume, all units are billed at
+    that tier's price.
+
+    Candidates are lists aligned with `lanes` of {provider_id: share of the
+    lane volume}.
+    """
+
+    def __init__(self, lanes: List[Dict[str, Any]], curves: Dict[int, ContractCostCurve],
+                 product_quantities: Dict[int, int], use_manual_tiers: bool = False):
+        self.lanes = [lane for lane in lanes if product_quantities.get(lane['product_id'], 0) > 0]
+        self.volumes = [float(product_quantities[lane['product_id']]) for lane in self.lanes]
+        self.curves = curves
+        self.use_manual_tiers = use_manual_tiers
+        self.total_volume = sum(v * sum(lane['current_shares'].values()) for v, lane in zip(self.volumes, self.lanes))
+
+    def current_shares(self) -> List[Dict[int, float]]:
+        return [dict(lane['current_shares']) for lane in self.lanes]
+
+    def contract_volumes(self, shares: List[Dict[int, float]]) -> Dict[int, float]:
+        volumes = {}
+        for lane, volume, lane_shares in zip(self.lanes, self.volumes, shares):
+            for provider_id, share in lane_shares.items():
+                contract_id = lane['options'][provider_id][0]
+                volumes[contract_id] = volumes.get(contract_id, 0.0) + volume * share
+        return volumes
+
+    def evaluate(self, shares: List[Dict[int, float]]) -> Dict[str, Any]:
+        """Total cost, per-provider volume and cost, and active tier index per contract"""
+        tier_indexes = {
+            contract_id: self.curves[contract_id].tier_index(volume, self.use_manual_tiers)
+            for contract_id, volume in self.contract_volumes(shares).items()
+        }
+        total_cost = 0.0
+        provider_volumes = {}
+        provider_costs = {}
+        for lane, volume, lane_shares in zip(self.lanes, self.volumes, shares):
+            for provider_id, share in lane_shares.items():
+                contract_id, prices = lane['options'][provider_id]
+                units = volume * share
+                cost = units * prices[tier_indexes[contract_id]]
+                total_cost += cost
+                provider_volumes[provider_id] = provider_volumes.get(provider_id, 0.0) + units
+                provider_costs[provider_id] = provider_costs.get(provider_id, 0.0) + cost
+        return {
+            'total_cost': total_cost,
+            'provider_volumes': provider_volumes,
+            'provider_costs': provider_costs,
+            'tier_indexes': tier_indexes
+        }
+
+    @timed()
+    def evaluate_batch(self, candidates: List[List[Dict[int, float]]]) -> List[Dict[str, Any]]:
+        return [self.evaluate(shares) for shares in candidates]
+
+    def contract_state(self, shares: List[Dict[int, float]]) -> Dict[int, tuple]:
+        """contract_id -> (volume, cost of that volume at every tier) for one allocation"""
+        state = {}
+        for lane, volume, lane_shares in zip(self.lanes, self.volumes, shares):
+            for provider_id, share in lane_shares.items():
+                contract_id, prices = lane['options'][provider_id]
+                units = volume * share
+                contract_volume, priced = state.setdefault(contract_id, (0.0, [0.0] * len(prices)))
+                state[contract_id] = (contract_volume + units, [p + units * price for p, price in zip(priced, prices)])
+        return state
+
+    def shift_delta(self, state: Dict[int, tuple], changes: Dict[int, tuple]) -> tuple:
+        """
+        Cost change of a small reallocation without re-pricing the allocation.
+
+        Args:
+            state: Output of contract_state for the allocation being perturbed
+            changes: contract_id -> (volume change, cost change at every tier)
+
+        Returns (cost delta, contract_ids whose tier changes).
+        """
+        delta = 0.0
+        crossings = []
+        for contract_id, (volume_change, priced_change) in changes.items():
+            curve = self.curves[contract_id]
+            volume, priced = state.get(contract_id, (0.0, [0.0] * len(priced_change)))
+            old_tier = curve.tier_index(volume, self.use_manual_tiers)
+            new_tier = curve.tier_index(volume + volume_change, self.use_manual_tiers)
+            delta += priced[new_tier] + priced_change[new_tier] - priced[old_tier]
+            if new_tier != old_tier:
+                crossings.append(contract_id)
+        return delta, crossings
+
+    def to_allocations(self, shares: List[Dict[int, float]]) -> Dict[int, Any]:
+        """Per-item percentages in the nested product structure accepted by calculate_cost_with_allocations"""
+        allocations = {}
+        for lane, lane_shares in zip(self.lanes, shares):
+            product = allocations.setdefault(lane['product_id'], {'product_name': lane['product_name'], 'items': {}})
+            product['items'][lane['item_id']] = {
+                'mode': 'percentage',
+                'allocations': [
+                    {'provider_id': provider_id, 'value': round(share * 100, 2)}
+                    for provider_id, share in sorted(lane_shares.items()) if share > 1e-9
+                ]
+            }
+        return allocations
 
 
 class CalculationService:
     """Service for optimization calculations and scenarios"""
 
-    def __init__(self):
-        self.crud = get_crud()
+    def __init__(self, crud=None):
+        self.crud = crud or get_crud()
+        self.pooling = VolumePoolingService(self.crud)
 
     def _get_contract_for_offer(self, provider_id: int, process_id: int) -> Optional[Dict[str, Any]]:
         """Find the active contract for a provider and process."""
@@ -25,7 +249,101 @@ class CalculationService:
                 return contract
         return None
 
-    def calculate_current_cost(self, product_quantities: Dict[Any, int], use_manual_tiers: bool = False) -> Dict[str, Any]:
+    @timed()
+    def build_contract_cost_curves(self, contract_ids: List[int],
+                                   item_weights: Optional[Dict[int, Dict[int, float]]] = None) -> Dict[int, ContractCostCurve]:
+        """
+        Build cost curves for many contracts with two queries (tiers + offers).
+
+        Args:
+            contract_ids: Contracts to build
+            item_weights: Optional contract_id -> {item_id: weight} item mix per contract
+        """
+        contract_ids = list(dict.fromkeys(contract_ids))
+        item_weights = item_weights or {}
+        tiers = self.crud.get_contract_tiers_for_contracts(contract_ids)
+        prices = self.crud.get_offer_prices_for_contracts(contract_ids)
+        return {
+            contract_id: ContractCostCurve.build(contract_id, tiers[contract_id], prices[contract_id], item_weights.get(contract_id))
+            for contract_id in contract_ids
+        }
+
+    def get_contract_cost_curve(self, contract_id: int, item_weights: Optional[Dict[int, float]] = None) -> ContractCostCurve:
+        """Build the cost curve for one contract and item mix."""
+        return self.build_contract_cost_curves([contract_id], {contract_id: item_weights} if item_weights else None)[contract_id]
+
+    @timed()
+    def build_allocation_lanes(self, product_ids: List[int]) -> tuple:
+        """
+        Collect every product item with the contracts able to serve it.
+
+        Returns (lanes, curves). Each lane carries 'options' (provider_id ->
+        (contract_id, price per tier incl. the product multiplier)) and
+        'current_shares' (provider_id -> share of the item volume) from the
+        saved allocation. Percentages are kept as-is, unit allocations act as
+        weights, and items without an allocation start on their cheapest provider.
+        """
+        raw_lanes = []
+        for product_id in product_ids:
+            product = self.crud.get_product(product_id)
+            if not product:
+                continue
+            multipliers = self.crud.get_price_multipliers_for_product(product_id)
+            allocations = self.crud.get_allocations_for_product(product_id)
+            is_collective = 'mode' in allocations and 'providers' in allocations
+
+            for process in self.crud.get_product_contracts_with_selected_items(product_id):
+                for item in process['items']:
+                    raw_lanes.append({
+                        'product_id': product_id,
+                        'product_name': product['name'],
+                        'process_id': process['process_id'],
+                        'item_id': item['item_id'],
+                        'item_name': item['item_name'],
+                        'multiplier': multipliers.get(item['item_id'], {}).get('multiplier', 1.0),
+                        'providers': item['providers'],
+                        'allocation': allocations if is_collective else allocations.get(item['item_id'])
+                    })
+
+        curves = self.build_contract_cost_curves([p['contract_id'] for lane in raw_lanes for p in lane['providers']])
+
+        lanes = []
+        for lane in raw_lanes:
+            options = {}
+            for p in lane['providers']:
+                prices = curves[p['contract_id']].item_prices.get(lane['item_id'])
+                # A contract that does not price the item at every tier is not an option for it
+                if prices and None not in prices:
+                    options[p['provider_id']] = (p['contract_id'], [price * lane['multiplier'] for price in prices])
+            if not options:
+                continue
+
+            alloc = lane.pop('allocation') or {'mode': 'percentage', 'providers': []}
+            entries = [p for p in alloc['providers'] if p['provider_id'] in options and p['value'] > 0]
+            if alloc['mode'] == 'percentage':
+                shares = {p['provider_id']: p['value'] / 100.0 for p in entries}
+            else:
+                total = sum(p['value'] for p in entries)
+                shares = {p['provider_id']: p['value'] / total for p in entries} if total > 0 else {}
+            if not shares:
+                shares = {min(options, key=lambda pid: options[pid][1][0]): 1.0}
+
+            lanes.append({**lane, 'options': options, 'current_shares': shares})
+        return lanes, curves
+
+    def build_cost_model(self, product_quantities: Dict[Any, int], use_manual_tiers: bool = False) -> AllocationCostModel:
+        """Prepare an AllocationCostModel for batched evaluation of candidate allocations."""
+        quantities = {int(k): int(v) for k, v in product_quantities.items()}
+        lanes, curves = self.build_allocation_lanes(list(quantities.keys()))
+        return AllocationCostModel(lanes, curves, quantities, use_manual_tiers)
+
+    def get_pooled_tier_volumes(self, year: int, month: int, use_forecasts: bool = False) -> Dict[int, float]:
+        """Tier lookup volume per contract for a month, pooled across all products."""
+        volumes = self.pooling.tier_volumes(year, month, use_forecasts)
+        return {contract_id: v['effective_volume'] for contract_id, v in volumes.items()}
+
+    def calculate_current_cost(self, product_quantities: Dict[Any, int], use_manual_tiers: bool = False,
+                               contract_volume_overrides: Optional[Dict[int, float]] = None) -> Dict[str, Any]:
         """Calculate current cost based on product quantities using tier-based pricing."""
         # Ensure keys are integers
         quantities = {int(k): int(v) for k, v in product_quantities.items()}
@@ -33,14 +351,19 @@ class CalculationService:
         # Get current allocations (default)
         allocations = self.get_current_allocations(quantities)
         
-        return self.calculate_cost_with_allocations(quantities, allocations, use_manual_tiers=use_manual_tiers)
+        return self.calculate_cost_with_allocations(
+            quantities, allocations, use_manual_tiers=use_manual_tiers,
+            contract_volume_overrides=contract_volume_overrides
+        )
 
+    @timed()
     def calculate_cost_with_allocations(
         self,
         product_quantities: Dict[Any, int],
         allocations: Dict[Any, Any],
         use_manual_tiers: bool = False,
-        tier_volume_overrides: Optional[Dict[int, float]] = None
+        tier_volume_overrides: Optional[Dict[int, float]] = None,
+        contract_volume_overrides: Optional[Dict[int, float]] = None
     ) -> Dict[str, Any]:
         """
         Calculate cost using specific item-provider allocations.
@@ -50,11 +373,14 @@ class CalculationService:
             allocations: Dict of allocation definitions
             use_manual_tiers: If True, use manually selected tiers instead of calculated ones
             tier_volume_overrides: Optional Dict of provider_id -> volume to use for Tier Lookup
+            contract_volume_overrides: Optional Dict of contract_id -> volume to use for Tier Lookup,
+                e.g. pooled volumes from get_pooled_tier_volumes (provider overrides take precedence)
         """
         
         # Normalize inputs
         quantities = {int(k): int(v) for k, v in product_quantities.items()}
         tier_volume_overrides = tier_volume_overrides or {}
+        contract_volume_overrides = contract_volume_overrides or {}
         
         # Normalize allocations to be accessible by item_id
         # If it's the nested structure from SimulationAllocation (product -> items -> item -> allocations)
@@ -179,8 +505,9 @@ class CalculationService:
                         'multiplier': multipliers.get(item_id, {}).get('multiplier', 1.0)
                     })
 
-        # 2. Determine Tiers
+        # 2. Determine Tiers (one cost curve per contract, built in two queries)
         contract_active_tiers = {} # contract_id -> tier_number
+        curves = self.build_contract_cost_curves(list(contract_volumes.keys()))
         
         # Helper to find contract provider
         contract_providers = {} # contract_id -> provider_id
@@ -189,37 +516,19 @@ class CalculationService:
 
         for contract_id, total_vol in contract_volumes.items():
             # Determine lookup volume
-            lookup_vol = total_vol
+            lookup_vol = contract_volume_overrides.get(contract_id, total_vol)
             provider_id = contract_providers.get(contract_id)
             
             if provider_id and provider_id in tier_volume_overrides:
                 lookup_vol = tier_volume_overrides[provider_id]
             
-            tiers = self.crud.get_contract_tiers_for_contract(contract_id)
-            # Sort by threshold
-            tiers.sort(key=lambda x: x['threshold_units'])
-            
-            active_tier = 1
-            found = False
-            
-            # Find the highest tier where volume < threshold
-            for t in tiers:
-                if t['threshold_units'] > lookup_vol:
-                    active_tier = t['tier_number']
-                    found = True
-                    break
-            
-            if not found and tiers:
-                # Exceeds all thresholds, use highest tier
-                active_tier = tiers[-1]['tier_number']
+            curve = curves[contract_id]
+            active_tier = curve.tier_for_volume(lookup_vol)
             
             tier_source = 'calculated'
-            if use_manual_tiers:
-                # Check for manual selection
-                selected = next((t for t in tiers if t['is_selected']), None)
-                if selected:
-                    active_tier = selected['tier_number']
-                    tier_source = 'manual'
+            if use_manual_tiers and curve.selected_tier is not None:
+                active_tier = curve.selected_tier
+                tier_source = 'manual'
                 
             contract_active_tiers[contract_id] = {'tier': active_tier, 'source': tier_source, 'lookup_volume': lookup_vol}
 
@@ -236,7 +545,11 @@ class CalculationService:
             
             # Get Price
             price = 0.0
-            if detail['process_id']:
+            if contract_id:
+                price = curves[contract_id].price_at_tier(tier, detail['item_id'])
+                if price is None:
+                    continue  # no offer for the item at this tier
+            elif detail['process_id']:
                 price = self.crud.get_price_for_item_at_tier(
                     detail['provider_id'], 
                     detail['item_id'], 
@@ -323,6 +636,7 @@ class CalculationService:
             'allocation_details': allocation_details_out
         }
 
+    @timed()
     def get_current_allocations(self, product_quantities: Dict[int, int]) -> Dict[int, Any]:
         """Get current item-provider allocations from product configurations."""
         allocations = {}
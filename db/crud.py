@@ -5,17 +5,271 @@ This module provides a unified interface for all database operations.
 """
 
 import duckdb
+import functools
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
 from typing import List, Optional, Dict, Any
+from db.instrumentation import crud_method
+from db.metrics import READ_MEMO_LOOKUPS
 from db.schemas import DatabaseSchema
 
-
+# Methods with these prefixes mutate data; everything else is a pure read
+WRITE_METHOD_PREFIXES = ("create_", "update_", "delete_", "set_", "add_", "remove_")
+
+# Reads of state that background jobs change while a request is open; never memoized
+UNMEMOIZED_READS = ("get_optimization_job", "get_completed_optimization_job", "get_write_generation")
+
+# Bulk list reads; copying their results around costs more than querying again, so never memoized
+BULK_READ_PREFIXES = ("get_all_",)
+
+# Job bookkeeping writes; not calculation data, so they leave the read memo and write generation alone
+BOOKKEEPING_WRITES = ("create_optimization_job", "update_optimization_job")
+
+# Products whose cost_cube cells depend on an entity, for invalidation on writes
+COST_CUBE_DEPENDENTS = {
+    "product": "SELECT product_id FROM products WHERE product_id = $entity_id",
+    # Products on a contract the product uses; their pooled tier volumes include its units
+    "pool": """
+        SELECT $entity_id::INTEGER AS product_id
+        UNION
+        SELECT shared.product_id FROM product_items own
+        JOIN offers o ON o.item_id = own.item_id
+        JOIN offers so ON so.provider_id = o.provider_id AND so.process_id = o.process_id
+        JOIN product_items shared ON shared.item_id = so.item_id
+        WHERE own.product_id = $entity_id
+    """,
+    "item": """
+        SELECT product_id FROM product_items WHERE item_id = $entity_id
+        UNION
+        SELECT pi.product_id FROM offers o
+        JOIN offers so ON so.provider_id = o.provider_id AND so.process_id = o.process_id
+        JOIN product_items pi ON pi.item_id = so.item_id
+        WHERE o.item_id = $entity_id
+    """,
+    "provider": """
+        SELECT pi.product_id FROM product_items pi JOIN offers o ON o.item_id = pi.item_id
+        WHERE o.provider_id = $entity_id
+    """,
+    "process": """
+        SELECT pi.product_id FROM product_items pi JOIN offers o ON o.item_id = pi.item_id
+        WHERE o.process_id = $entity_id
+    """,
+    "offer": """
+        SELECT pi.product_id FROM offers o
+        JOIN offers so ON so.provider_id = o.provider_id AND so.process_id = o.process_id
+        JOIN product_items pi ON pi.item_id = so.item_id
+        WHERE o.offer_id = $entity_id
+    """,
+    "contract": """
+        SELECT pi.product_id FROM contracts c
+        JOIN offers o ON o.provider_id = c.provider_id AND o.process_id = c.process_id
+        JOIN product_items pi ON pi.item_id = o.item_id
+        WHERE c.contract_id = $entity_id
+    """,
+    "contract_tier": """
+        SELECT pi.product_id FROM contract_tiers ct
+        JOIN contracts c ON c.contract_id = ct.contract_id
+        JOIN offers o ON o.provider_id = c.provider_id AND o.process_id = c.process_id
+        JOIN product_items pi ON pi.item_id = o.item_id
+        WHERE ct.contract_tier_id = $entity_id
+    """,
+}
+
+# Products recomputed per transaction when queued cost_cube cells are refreshed in the background
+COST_CUBE_REFRESH_BATCH = int(os.environ.get("PARETO_COST_CUBE_BATCH", "2"))
+
+# Analytics dimensions over cost_cube (alias c): output columns -> SQL, plus the join they need
+COST_DIMENSIONS = {
+    "provider": ({"provider_id": "c.provider_id", "provider_name": "pv.company_name"},
+                 "JOIN providers pv ON pv.provider_id = c.provider_id"),
+    "process": ({"process_id": "c.process_id", "process_name": "pr.process_name"},
+                "JOIN processes pr ON pr.process_id = c.process_id"),
+    "product": ({"product_id": "c.product_id", "product_name": "pd.name"},
+                "JOIN products pd ON pd.product_id = c.product_id"),
+    "item": ({"item_id": "c.item_id", "item_name": "i.item_name"},
+             "JOIN items i ON i.item_id = c.item_id"),
+    "year": ({"year": "c.year"}, None),
+    "quarter": ({"quarter": "printf('%d-Q%d', c.year, (c.month + 2) // 3)"}, None),
+    "month": ({"month": "printf('%d-%02d', c.year, c.month)"}, None),
+    "source": ({"source": "c.source"}, None),
+}
+COST_MEASURES = {
+    "total_cost": "SUM(c.total_cost)",
+    "allocated_units": "SUM(c.allocated_units)",
+    "unit_cost": "SUM(c.total_cost) / NULLIF(SUM(c.allocated_units), 0)",
+    "cells": "COUNT(*)",
+}
+
+# Tables whose contents feed calculations; their fingerprint is the data version
+DATA_TABLES = (
+    "providers", "items", "products", "offers", "processes", "product_items",
+    "product_item_allocations", "product_item_pricing", "contracts",
+    "contract_tiers", "contract_lookups", "forecasts", "actuals",
+)
+
+# Results of get_* calls for the current request; None outside a read_memo() scope
+_read_memo: ContextVar[Optional[dict]] = ContextVar("read_memo", default=None)
+
+# Number of CRUD writes made in this process; in-memory caches rebuild when it moves
+_write_generation = 0
+
+# Serializes cost_cube recomputes in this process, so two cursors never rewrite the same cells
+_cost_cube_lock = threading.Lock()
+
+logger = logging.getLogger("pareto.crud")
+
+
+@contextmanager
+def read_memo():
+    """
+    Memoize CRUD reads for the enclosed scope (one API request).
+
+    Inside the scope, public get_* methods return the result of an earlier
+    call with the same instance and arguments instead of querying again.
+    Results are shared, not copied: callers must treat them as read-only and
+    copy anything they change. Any write empties the memo, and reads made
+    during a write always go to the database.
+    """
+    token = _read_memo.set({})
+    try:
+        yield
+    finally:
+        _read_memo.reset(token)
+
+
+def clear_read_memo():
+    memo = _read_memo.get()
+    if memo is not None:
+        memo.clear()
+
+
+def _memoized_read(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    def read(self, *args, **kwargs):
+        memo = _read_memo.get()
+        if memo is None:
+            with crud_method(name):
+                return method(self, *args, **kwargs)
+        key = (id(self), name, repr(args), repr(sorted(kwargs.items())))
+        if key in memo:
+            READ_MEMO_LOOKUPS.inc(("hit",))
+        else:
+            READ_MEMO_LOOKUPS.inc(("miss",))
+            with crud_method(name):
+                memo[key] = method(self, *args, **kwargs)
+        return memo[key]
+    return read
+
+
+def _write_bypassing_memo(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    def write(self, *args, **kwargs):
+        global _write_generation
+        token = _read_memo.set(None)
+        try:
+            with crud_method(name):
+                result = method(self, *args, **kwargs)
+            if not self._in_transaction:
+                self._refresh_invalidated_cost_cube()
+            return result
+        finally:
+            _read_memo.reset(token)
+            clear_read_memo()
+            _write_generation += 1
+    return write
+
+
+def _labelled(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        with crud_method(name):
+            return method(self, *args, **kwargs)
+    return call
+
+
+def _with_read_memo(cls):
+    """Route public reads through the request memo, let writes invalidate it, label their SQL metrics"""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not callable(attr):
+            continue
+        if name in BOOKKEEPING_WRITES:
+            setattr(cls, name, _labelled(attr))
+        elif name.startswith(WRITE_METHOD_PREFIXES):
+            setattr(cls, name, _write_bypassing_memo(attr))
+        elif name.startswith("get_") and name not in UNMEMOIZED_READS and not name.startswith(BULK_READ_PREFIXES):
+            setattr(cls, name, _memoized_read(attr))
+        elif name.startswith(BULK_READ_PREFIXES):
+            setattr(cls, name, _labelled(attr))
+    return cls
+
+
+@_with_read_memo
 class CRUDOperations(DatabaseSchema):
     """Unified CRUD operations for all entities"""
 
     def __init__(self, db_path: str = "database.ddb", conn=None):
         super().__init__(db_path, conn)
+        self._in_transaction = False
+        self._invalidated = set()  # products whose cost_cube cells the current write queued
+
+    def for_thread(self) -> "CRUDOperations":
+        """CRUD operations on a cursor of this connection, for use from another thread"""
+        return CRUDOperations(conn=self._get_connection().cursor())
+
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed statements as a single commit; nested use joins the outer transaction"""
+        conn = self._get_connection()
+        if self._in_transaction:
+            yield conn
+            return
+
+        conn.execute("BEGIN TRANSACTION")
+        self._in_transaction = True
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._in_transaction = False
+
+    def _insert_many(self, table: str, columns: List[str], rows: List[tuple]):
+        """Insert all rows with one INSERT ... SELECT over an unnested parameter list.
+
+        Rows travel as a single JSON parameter; binding thousands of scalar
+        parameters (executemany or a long VALUES list) is orders of magnitude
+        slower in DuckDB. Values are cast to the column types on insert.
+        """
+        if not rows:
+            return
+        conn = self._get_connection()
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        schema = json.dumps([{c: "VARCHAR" for c in columns}])
+        payload = json.dumps([dict(zip(columns, row)) for row in rows])
+        conn.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM (SELECT unnest(json_transform(?, ?), recursive := true))",
+            [payload, schema]
+        )
+
+    @staticmethod
+    def _id_list(ids) -> str:
+        """Encode ids for `IN (SELECT unnest(from_json(?, '["INTEGER"]')))`; DuckDB binds long Python lists slowly"""
+        return json.dumps([int(i) for i in ids])
 
     # Provider CRUD operations
     def create_provider(self, company_name: str, details: str = "", status: str = "active") -> Any:
@@ -101,6 +355,7 @@ class CRUDOperations(DatabaseSchema):
             "UPDATE providers SET company_name = ?, details = ?, status = ?, date_last_update = ? WHERE provider_id = ?",
             [company_name, details, status, now, provider_id]
         )
+        self._invalidate_cost_cube("provider", provider_id)
         conn.commit()
         return True
 
@@ -114,6 +369,7 @@ class CRUDOperations(DatabaseSchema):
         if item_count > 0:
             raise HTTPException(status_code=400, detail=f"Provider has {item_count} assigned items. Please remove item assignments first.")
 
+        self._invalidate_cost_cube("provider", provider_id)
         conn.execute("DELETE FROM offers WHERE provider_id = ?", [provider_id])
         conn.execute("DELETE FROM provider_items WHERE provider_id = ?", [provider_id])
         conn.execute("DELETE FROM contracts WHERE provider_id = ?", [provider_id])
@@ -165,11 +421,13 @@ class CRUDOperations(DatabaseSchema):
             "UPDATE items SET item_name = ?, description = ?, status = ?, date_last_update = ? WHERE item_id = ?",
             [item_name, description, status, now, item_id]
         )
+        self._invalidate_cost_cube("item", item_id)
         conn.commit()
         return True
 
     def delete_item(self, item_id: int) -> bool:
         conn = self._get_connection()
+        self._invalidate_cost_cube("item", item_id)
         conn.execute("DELETE FROM offers WHERE item_id = ?", [item_id])
         conn.execute("DELETE FROM provider_items WHERE item_id = ?", [item_id])
         result = conn.execute("DELETE FROM items WHERE item_id = ?", [item_id])
@@ -231,6 +489,7 @@ class CRUDOperations(DatabaseSchema):
 
     def delete_product(self, product_id: int) -> bool:
         conn = self._get_connection()
+        self._invalidate_cost_cube("pool", product_id)
         conn.execute("DELETE FROM product_item_pricing WHERE product_id = ?", [product_id])
         conn.execute("DELETE FROM product_item_allocations WHERE product_id = ?", [product_id])
         conn.execute("DELETE FROM product_items WHERE product_id = ?", [product_id])
@@ -251,6 +510,7 @@ class CRUDOperations(DatabaseSchema):
             "INSERT INTO offers (offer_id, item_id, provider_id, tier_number, price_per_unit, status, date_creation, date_last_update, process_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
             [offer_id, item_id, provider_id, tier_number, price_per_unit, status, now, now, process_id]
         )
+        self._invalidate_cost_cube("item", item_id)
 
         result = self.get_offer(offer_id)
         return result
@@ -382,22 +642,27 @@ class CRUDOperations(DatabaseSchema):
         price_per_unit = price_per_unit if price_per_unit is not None else current["price_per_unit"]
         status = status if status is not None else current["status"]
         process_id = process_id if process_id is not None else current["process_id"]
+        if process_id != current["process_id"]:
+            self._invalidate_cost_cube("offer", offer_id)  # products on the contract the offer leaves
 
         conn.execute(
             "UPDATE offers SET tier_number = ?, price_per_unit = ?, status = ?, process_id = ?, date_last_update = ? WHERE offer_id = ?",
             [tier_number, price_per_unit, status, process_id, now, offer_id]
         )
+        self._invalidate_cost_cube("offer", offer_id)
         conn.commit()
         return True
 
     def delete_offer(self, offer_id: int) -> bool:
         conn = self._get_connection()
+        self._invalidate_cost_cube("offer", offer_id)
         result = conn.execute("DELETE FROM offers WHERE offer_id = ?", [offer_id])
         return result.rowcount > 0
 
     def delete_offers_for_item(self, item_id: int) -> int:
         """Delete all offers for an item, returns count deleted"""
         conn = self._get_connection()
+        self._invalidate_cost_cube("item", item_id)
         result = conn.execute("DELETE FROM offers WHERE item_id = ?", [item_id])
         return result.rowcount
 
@@ -417,13 +682,13 @@ class CRUDOperations(DatabaseSchema):
         return [result[0] for result in results]
 
     def set_providers_for_item(self, item_id: int, provider_ids: List[int]):
-        conn = self._get_connection()
         now = datetime.now().isoformat()
-        conn.execute("DELETE FROM provider_items WHERE item_id = ?", [item_id])
-        for provider_id in provider_ids:
-            conn.execute(
-                "INSERT INTO provider_items (provider_id, item_id, date_creation) VALUES (?, ?, ?)",
-                [provider_id, item_id, now]
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM provider_items WHERE item_id = ?", [item_id])
+            self._insert_many(
+                "provider_items",
+                ["provider_id", "item_id", "date_creation"],
+                [(provider_id, item_id, now) for provider_id in dict.fromkeys(provider_ids)]
             )
 
     def remove_provider_item_relationship(self, provider_id: int, item_id: int) -> bool:
@@ -445,16 +710,20 @@ class CRUDOperations(DatabaseSchema):
             "INSERT OR IGNORE INTO product_items (product_id, item_id, date_creation) VALUES (?, ?, ?)",
             [product_id, item_id, now]
         )
+        self._invalidate_cost_cube("pool", product_id)
 
     def set_items_for_product(self, product_id: int, item_ids: List[int]):
-        conn = self._get_connection()
         now = datetime.now().isoformat()
-        conn.execute("DELETE FROM product_items WHERE product_id = ?", [product_id])
-        for item_id in item_ids:
-            conn.execute(
-                "INSERT INTO product_items (product_id, item_id, date_creation) VALUES (?, ?, ?)",
-                [product_id, item_id, now]
+        with self._transaction() as conn:
+            # Products sharing the old and the new contracts both see the pooled volume change
+            self._invalidate_cost_cube("pool", product_id)
+            conn.execute("DELETE FROM product_items WHERE product_id = ?", [product_id])
+            self._insert_many(
+                "product_items",
+                ["product_id", "item_id", "date_creation"],
+                [(product_id, item_id, now) for item_id in dict.fromkeys(item_ids)]
             )
+            self._invalidate_cost_cube("pool", product_id)
 
     def get_items_for_product(self, product_id: int) -> List[Any]:
         conn = self._get_connection()
@@ -475,30 +744,32 @@ class CRUDOperations(DatabaseSchema):
             product_id: The product ID
             contract_selections: Dict mapping contract_id to list of selected item_ids
         """
-        conn = self._get_connection()
         now = datetime.now().isoformat()
 
         all_item_ids = []
         for item_ids in contract_selections.values():
             all_item_ids.extend(item_ids)
 
-        conn.execute("DELETE FROM product_items WHERE product_id = ?", [product_id])
-
-        for item_id in all_item_ids:
-            conn.execute(
-                "INSERT INTO product_items (product_id, item_id, date_creation) VALUES (?, ?, ?)",
-                [product_id, item_id, now]
+        # The same item can be selected under several contracts
+        with self._transaction() as conn:
+            # Products sharing the old and the new contracts both see the pooled volume change
+            self._invalidate_cost_cube("pool", product_id)
+            conn.execute("DELETE FROM product_items WHERE product_id = ?", [product_id])
+            self._insert_many(
+                "product_items",
+                ["product_id", "item_id", "date_creation"],
+                [(product_id, item_id, now) for item_id in dict.fromkeys(all_item_ids)]
             )
+            self._invalidate_cost_cube("pool", product_id)
 
     def remove_item_from_product(self, product_id: int, item_id: int):
         conn = self._get_connection()
+        self._invalidate_cost_cube("pool", product_id)
         conn.execute("DELETE FROM product_items WHERE product_id = ? AND item_id = ?", [product_id, item_id])
 
     # Product-Item allocation operations
     def set_allocations_for_product(self, product_id: int, allocations_data: dict):
-        conn = self._get_connection()
         now = datetime.now().isoformat()
-        conn.execute("DELETE FROM product_item_allocations WHERE product_id = ?", [product_id])
 
         # Check if this is the new collective allocation format or legacy per-item format
         # New format: single allocation object (no item_id keys)
@@ -516,6 +787,7 @@ class CRUDOperations(DatabaseSchema):
                 # Can't parse as integer, so it's likely a field name (collective format)
                 is_legacy_format = False
 
+        rows = []
         if is_legacy_format:
             # Legacy per-item allocation format
             for item_id_str, allocation in allocations_data.items():
@@ -527,10 +799,7 @@ class CRUDOperations(DatabaseSchema):
                     value = provider.get('value', 0)
 
                     if value > 0:
-                        conn.execute(
-                            "INSERT INTO product_item_allocations (product_id, item_id, provider_id, allocation_mode, allocation_value, date_creation, date_last_update) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            [product_id, item_id, provider_id, mode, value, now, now]
-                        )
+                        rows.append((product_id, item_id, provider_id, mode, value, now, now))
         else:
             # New collective allocation format - apply same allocation to ALL items in product
             allocation = allocations_data
@@ -544,18 +813,29 @@ class CRUDOperations(DatabaseSchema):
                 value = provider.get('value', 0)
 
                 # Apply this allocation to ALL items in the product
-                for item_id in item_ids:
-                    if value > 0:
-                        conn.execute(
-                            "INSERT INTO product_item_allocations (product_id, item_id, provider_id, allocation_mode, allocation_value, date_creation, date_last_update) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            [product_id, item_id, provider_id, mode, value, now, now]
-                        )
+                if value > 0:
+                    rows.extend((product_id, item_id, provider_id, mode, value, now, now) for item_id in item_ids)
+
+        # Replace the product's allocations in a single commit
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM product_item_allocations WHERE product_id = ?", [product_id])
+            self._insert_many(
+                "product_item_allocations",
+                ["product_id", "item_id", "provider_id", "allocation_mode", "allocation_value", "date_creation", "date_last_update"],
+                rows
+            )
+            self._invalidate_cost_cube("pool", product_id)
 
     def get_allocations_for_product(self, product_id: int) -> dict:
+        return self.get_allocations_for_products([product_id])[product_id]
+
+    def get_allocations_for_products(self, product_ids: List[int]) -> Dict[int, dict]:
+        """Get allocations for many products in one query, keyed by product_id"""
         conn = self._get_connection()
         results = conn.execute(
             """
             SELECT
+                a.product_id,
                 a.item_id,
                 a.provider_id,
                 p.company_name,
@@ -563,12 +843,20 @@ class CRUDOperations(DatabaseSchema):
                 a.allocation_value
             FROM product_item_allocations a
             JOIN providers p ON a.provider_id = p.provider_id
-            WHERE a.product_id = ?
-            ORDER BY a.item_id, a.provider_id
+            WHERE a.product_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+            ORDER BY a.product_id, a.item_id, a.provider_id
             """,
-            [product_id]
+            [self._id_list(product_ids)]
         ).fetchall()
 
+        rows_by_product = {product_id: [] for product_id in product_ids}
+        for row in results:
+            rows_by_product[row[0]].append(row[1:])
+        return {product_id: self._group_allocations(rows) for product_id, rows in rows_by_product.items()}
+
+    @staticmethod
+    def _group_allocations(results: List[tuple]) -> dict:
+        """Collective format when every item shares one allocation, else per-item format"""
         # Group allocations by item_id
         item_allocations = {}
         for row in results:
@@ -669,6 +957,77 @@ class CRUDOperations(DatabaseSchema):
 
         return allocations
 
+    def get_provider_allocations(self, provider_id: int) -> List[Dict[str, Any]]:
+        """
+        Products allocating a share (value > 0) of their items to one provider, in one query.
+
+        A product is collective when every allocated item carries the same mode
+        and provider values, and its mode and value are then reported once at
+        product level. As in get_allocations_for_product, allocations to
+        deleted providers are ignored.
+        """
+        conn = self._get_connection()
+        results = conn.execute(
+            """
+            WITH provider_products AS (
+                SELECT DISTINCT a.product_id
+                FROM product_item_allocations a
+                JOIN providers pr ON a.provider_id = pr.provider_id
+                WHERE a.provider_id = ? AND a.allocation_value > 0
+            ),
+            item_signatures AS (
+                SELECT
+                    a.product_id,
+                    a.item_id,
+                    a.allocation_mode || ':' || string_agg(a.provider_id || '=' || a.allocation_value, ',' ORDER BY a.provider_id) AS signature
+                FROM product_item_allocations a
+                JOIN providers pr ON a.provider_id = pr.provider_id
+                JOIN provider_products pp ON a.product_id = pp.product_id
+                GROUP BY a.product_id, a.item_id, a.allocation_mode
+            ),
+            collective AS (
+                SELECT product_id, COUNT(DISTINCT signature) = 1 AS is_collective
+                FROM item_signatures
+                GROUP BY product_id
+            )
+            SELECT
+                a.product_id,
+                p.name,
+                c.is_collective,
+                a.item_id,
+                i.item_name,
+                a.allocation_mode,
+                a.allocation_value
+            FROM product_item_allocations a
+            JOIN products p ON a.product_id = p.product_id
+            JOIN items i ON a.item_id = i.item_id
+            JOIN collective c ON a.product_id = c.product_id
+            WHERE a.provider_id = ? AND a.allocation_value > 0
+            ORDER BY a.product_id, a.item_id
+            """,
+            [provider_id, provider_id]
+        ).fetchall()
+
+        products = {}
+        for product_id, product_name, is_collective, item_id, item_name, mode, value in results:
+            if product_id not in products:
+                products[product_id] = {
+                    'product_id': product_id,
+                    'product_name': product_name,
+                    'is_collective': is_collective,
+                    'mode': mode if is_collective else None,
+                    'value': float(value) if is_collective else None,
+                    'items': []
+                }
+            products[product_id]['items'].append({
+                'item_id': item_id,
+                'item_name': item_name,
+                'mode': mode,
+                'value': float(value)
+            })
+
+        return list(products.values())
+
     def get_contracts_with_items(self, process_id: int = None) -> List[Dict[str, Any]]:
         """Get all contracts with their items, grouped by process and items"""
         conn = self._get_connection()
@@ -757,6 +1116,10 @@ class CRUDOperations(DatabaseSchema):
 
     def get_product_contracts_with_selected_items(self, product_id: int) -> List[Dict[str, Any]]:
         """Get all contracts for a product with selected items, grouped by process and items"""
+        return self.get_products_contracts_with_selected_items([product_id])[product_id]
+
+    def get_products_contracts_with_selected_items(self, product_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Contracts with selected items for many products in one query, keyed by product_id"""
         conn = self._get_connection()
 
         results = conn.execute("""
@@ -769,7 +1132,8 @@ class CRUDOperations(DatabaseSchema):
                 pr.process_name,
                 i.item_id,
                 i.item_name,
-                i.description
+                i.description,
+                pi.product_id
             FROM contracts c
             JOIN providers p ON c.provider_id = p.provider_id
             JOIN processes pr ON c.process_id = pr.process_id
@@ -779,15 +1143,15 @@ class CRUDOperations(DatabaseSchema):
                 AND ct.tier_number = o.tier_number
             JOIN items i ON o.item_id = i.item_id
             JOIN product_items pi ON i.item_id = pi.item_id
-            WHERE pi.product_id = ?
+            WHERE pi.product_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
               AND c.status = 'active'
               AND p.status = 'active'
               AND pr.status = 'active'
               AND i.status = 'active'
-            ORDER BY pr.process_name, i.item_name, p.company_name
-        """, [product_id]).fetchall()
+            ORDER BY pi.product_id, pr.process_name, i.item_name, p.company_name
+        """, [self._id_list(product_ids)]).fetchall()
 
-        processes_dict = {}
+        processes_by_product = {product_id: {} for product_id in product_ids}
         for row in results:
             process_id = row[2]
             process_name = row[5]
@@ -798,6 +1162,7 @@ class CRUDOperations(DatabaseSchema):
             provider_name = row[4]
             contract_id = row[0]
             contract_name = row[1]
+            processes_dict = processes_by_product[row[9]]
 
             if process_id not in processes_dict:
                 processes_dict[process_id] = {
@@ -830,7 +1195,7 @@ class CRUDOperations(DatabaseSchema):
                     'provider_name': provider_name
                 })
 
-        return list(processes_dict.values())
+        return {product_id: list(processes.values()) for product_id, processes in processes_by_product.items()}
 
     def add_contract_items_to_product(self, product_id: int, contract_id: int, item_ids: List[int]):
         """Add multiple items from a contract to a product"""
@@ -842,10 +1207,12 @@ class CRUDOperations(DatabaseSchema):
                 "INSERT OR IGNORE INTO product_items (product_id, item_id, date_creation) VALUES (?, ?, ?)",
                 [product_id, item_id, now]
             )
+        self._invalidate_cost_cube("pool", product_id)
 
     def remove_contract_items_from_product(self, product_id: int, contract_id: int):
         """Remove all items from a specific contract in a product"""
         conn = self._get_connection()
+        self._invalidate_cost_cube("pool", product_id)
 
         conn.execute("""
             DELETE FROM product_items
@@ -898,10 +1265,9 @@ class CRUDOperations(DatabaseSchema):
 
     # Product-Item pricing operations
     def set_price_multipliers_for_product(self, product_id: int, multipliers_data: dict):
-        conn = self._get_connection()
         now = datetime.now().isoformat()
-        conn.execute("DELETE FROM product_item_pricing WHERE product_id = ?", [product_id])
 
+        rows = []
         for item_id_str, multiplier_info in multipliers_data.items():
             item_id = int(item_id_str)
 
@@ -913,24 +1279,37 @@ class CRUDOperations(DatabaseSchema):
                 notes = ''
 
             if multiplier != 1.0:
-                conn.execute(
-                    "INSERT INTO product_item_pricing (product_id, item_id, price_multiplier, notes, date_creation, date_last_update) VALUES (?, ?, ?, ?, ?, ?)",
-                    [product_id, item_id, multiplier, notes, now, now]
-                )
+                rows.append((product_id, item_id, multiplier, notes, now, now))
+
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM product_item_pricing WHERE product_id = ?", [product_id])
+            self._insert_many(
+                "product_item_pricing",
+                ["product_id", "item_id", "price_multiplier", "notes", "date_creation", "date_last_update"],
+                rows
+            )
+            self._invalidate_cost_cube("product", product_id)
 
     def get_price_multipliers_for_product(self, product_id: int) -> dict:
+        return self.get_price_multipliers_for_products([product_id])[product_id]
+
+    def get_price_multipliers_for_products(self, product_ids: List[int]) -> Dict[int, dict]:
+        """Get price multipliers for many products in one query, keyed by product_id"""
         conn = self._get_connection()
         results = conn.execute(
-            "SELECT item_id, price_multiplier, notes FROM product_item_pricing WHERE product_id = ?",
-            [product_id]
+            """
+            SELECT product_id, item_id, price_multiplier, notes
+            FROM product_item_pricing
+            WHERE product_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+            """,
+            [self._id_list(product_ids)]
         ).fetchall()
 
-        multipliers = {}
+        multipliers = {product_id: {} for product_id in product_ids}
         for row in results:
-            item_id = row[0]
-            multipliers[item_id] = {
-                'multiplier': float(row[1]),
-                'notes': row[2]
+            multipliers[row[0]][row[1]] = {
+                'multiplier': float(row[2]),
+                'notes': row[3]
             }
 
         return multipliers
@@ -1062,6 +1441,7 @@ class CRUDOperations(DatabaseSchema):
             "UPDATE processes SET process_name = ?, description = ?, provider_id = ?, tier_thresholds = ?, status = ?, date_last_update = ? WHERE process_id = ?",
             [process_name, description, provider_id, tier_thresholds, status, now, process_id]
         )
+        self._invalidate_cost_cube("process", process_id)
         conn.commit()
         return True
 
@@ -1080,6 +1460,7 @@ class CRUDOperations(DatabaseSchema):
         if contract_count > 0:
             raise HTTPException(status_code=400, detail=f"Process has {contract_count} assigned providers. Please remove provider assignments first.")
 
+        self._invalidate_cost_cube("process", process_id)
         conn.execute("DELETE FROM process_providers WHERE process_id = ?", [process_id])
         conn.execute("DELETE FROM contracts WHERE process_id = ?", [process_id])
         conn.execute("DELETE FROM process_items WHERE process_id = ?", [process_id])
@@ -1174,6 +1555,7 @@ class CRUDOperations(DatabaseSchema):
             "INSERT INTO forecasts (forecast_id, product_id, process_id, year, month, forecast_units, date_creation, date_last_update) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
             [forecast_id, product_id, process_id, year, month, forecast_units, now, now]
         )
+        self._invalidate_cost_cube_month(product_id, year, month)
         conn.commit()
         return self.get_forecast(forecast_id)
 
@@ -1240,6 +1622,151 @@ class CRUDOperations(DatabaseSchema):
             })
         return forecasts
 
+    def get_monthly_units(self, source: str, product_ids: List[int], first: tuple, last: tuple) -> Dict[tuple, int]:
+        """Get forecast or actual units for many products over a month range in one query.
+
+        Args:
+            source: 'forecasts' or 'actuals'
+            first, last: Inclusive (year, month) bounds
+
+        Returns {(product_id, process_id, year, month): units}
+        """
+        table, column = ("forecasts", "forecast_units") if source == "forecasts" else ("actuals", "actual_units")
+        conn = self._get_connection()
+        results = conn.execute(f"""
+            SELECT product_id, process_id, year, month, {column}
+            FROM {table}
+            WHERE product_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+              AND year * 12 + month BETWEEN ? AND ?
+        """, [self._id_list(product_ids), first[0] * 12 + first[1], last[0] * 12 + last[1]]).fetchall()
+        return {(row[0], row[1], row[2], row[3]): row[4] for row in results}
+
+    def get_pooled_contract_volumes(self, source: str, first: tuple, last: tuple, contract_ids: List[int] = None) -> Dict[tuple, int]:
+        """Monthly volume per contract pooled across all products, in one grouped query.
+
+        Each product's process units are split over the providers of every item
+        the way the pricing table does it: percentages of the units, or unit
+        allocations as weights, rounded to whole units per item by largest
+        remainder. Collective allocations apply to every item of the product.
+
+        Args:
+            source: 'forecasts' or 'actuals'
+            first, last: Inclusive (year, month) bounds
+            contract_ids: Restrict the result to these contracts
+
+        Returns {(contract_id, year, month): units}
+        """
+        table, column = ("forecasts", "forecast_units") if source == "forecasts" else ("actuals", "actual_units")
+        conn = self._get_connection()
+        results = conn.execute(f"""
+            WITH lanes AS (
+                SELECT DISTINCT pi.product_id, c.process_id, i.item_id, c.provider_id, c.contract_id, p.company_name
+                FROM contracts c
+                JOIN providers p ON c.provider_id = p.provider_id
+                JOIN processes pr ON c.process_id = pr.process_id
+                JOIN contract_tiers ct ON c.contract_id = ct.contract_id
+                JOIN offers o ON c.provider_id = o.provider_id
+                    AND c.process_id = o.process_id
+                    AND ct.tier_number = o.tier_number
+                JOIN items i ON o.item_id = i.item_id
+                JOIN product_items pi ON i.item_id = pi.item_id
+                WHERE c.status = 'active' AND p.status = 'active' AND pr.status = 'active' AND i.status = 'active'
+            ),
+            stored AS (
+                SELECT a.product_id, a.item_id, a.provider_id, a.allocation_mode AS mode, a.allocation_value::DOUBLE AS value
+                FROM product_item_allocations a
+                JOIN providers p ON a.provider_id = p.provider_id
+            ),
+            signatures AS (
+                SELECT product_id, item_id, string_agg(provider_id || ':' || value || ':' || mode, ',' ORDER BY provider_id) AS signature
+                FROM stored
+                GROUP BY ALL
+            ),
+            collective AS (
+                SELECT product_id, MIN(item_id) AS item_id
+                FROM signatures
+                GROUP BY product_id
+                HAVING COUNT(DISTINCT signature) = 1
+            ),
+            allocations AS (
+                SELECT s.product_id, pi.item_id, s.provider_id, s.mode, s.value
+                FROM stored s
+                JOIN collective co ON co.product_id = s.product_id AND co.item_id = s.item_id
+                JOIN product_items pi ON pi.product_id = s.product_id
+                UNION ALL
+                SELECT s.* FROM stored s
+                WHERE s.product_id NOT IN (SELECT product_id FROM collective)
+            ),
+            items AS (
+                SELECT product_id, item_id, arg_min(mode, provider_id) AS mode, SUM(value) AS total_weight
+                FROM allocations
+                GROUP BY ALL
+            ),
+            shares AS (
+                SELECT
+                    l.product_id, l.process_id, l.item_id, l.contract_id, l.provider_id, l.company_name,
+                    u.year, u.month,
+                    CASE WHEN it.mode = 'percentage' THEN u.units * (a.value / 100.0)
+                         WHEN it.total_weight > 0 THEN u.units * (a.value / it.total_weight)
+                         ELSE 0.0 END AS raw
+                FROM lanes l
+                JOIN allocations a ON a.product_id = l.product_id AND a.item_id = l.item_id AND a.provider_id = l.provider_id
+                JOIN items it ON it.product_id = l.product_id AND it.item_id = l.item_id
+                JOIN (
+                    SELECT product_id, process_id, year, month, {column} AS units
+                    FROM {table}
+                    WHERE year * 12 + month BETWEEN ? AND ?
+                ) u ON u.product_id = l.product_id AND u.process_id = l.process_id
+            ),
+            rounded AS (
+                SELECT
+                    *,
+                    floor(raw)::BIGINT AS floored,
+                    round_even(SUM(raw) OVER item_month, 0)::BIGINT - SUM(floor(raw)::BIGINT) OVER item_month AS remainder,
+                    row_number() OVER (
+                        PARTITION BY product_id, process_id, item_id, year, month
+                        ORDER BY raw - floor(raw) DESC, company_name, provider_id
+                    ) AS remainder_rank
+                FROM shares
+                WINDOW item_month AS (PARTITION BY product_id, process_id, item_id, year, month)
+            )
+            SELECT contract_id, year, month, SUM(floored + CASE WHEN remainder_rank <= remainder THEN 1 ELSE 0 END)
+            FROM rounded
+            WHERE ? IS NULL OR contract_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+            GROUP BY ALL
+        """, [
+            first[0] * 12 + first[1], last[0] * 12 + last[1],
+            None if contract_ids is None else 1, self._id_list(contract_ids or [])
+        ]).fetchall()
+        return {(row[0], row[1], row[2]): int(row[3]) for row in results}
+
+    @staticmethod
+    def _lookup_volume(volumes: Dict[tuple, int], contract_id: int, lookup: Optional[Dict[str, Any]], year: int, month: int) -> Optional[int]:
+        """Pooled volume a contract lookup sees for a month: SUM or AVG over its window, None without data"""
+        lookback = (lookup['lookback_months'] if lookup else 0) + 1
+        period = year * 12 + month - 1
+        window = [
+            volumes[(contract_id, p // 12, p % 12 + 1)]
+            for p in range(period - lookback + 1, period + 1)
+            if (contract_id, p // 12, p % 12 + 1) in volumes
+        ]
+        if not window:
+            return None
+        if lookup and lookup['method'] == 'AVG':
+            return int(sum(window) / len(window))
+        return sum(window)
+
+    def get_forecast_actual_pairs(self, product_ids: List[int]) -> List[tuple]:
+        """Get (product_id, process_id, year, month, forecast_units, actual_units) for months that have both"""
+        conn = self._get_connection()
+        return conn.execute("""
+            SELECT f.product_id, f.process_id, f.year, f.month, f.forecast_units, a.actual_units
+            FROM forecasts f
+            JOIN actuals a USING (product_id, process_id, year, month)
+            WHERE f.product_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+            ORDER BY f.product_id, f.process_id, f.year, f.month
+        """, [self._id_list(product_ids)]).fetchall()
+
     def update_forecast(self, forecast_id: int, forecast_units: int = None) -> bool:
         conn = self._get_connection()
         now = datetime.now().isoformat()
@@ -1253,11 +1780,15 @@ class CRUDOperations(DatabaseSchema):
             "UPDATE forecasts SET forecast_units = ?, date_last_update = ? WHERE forecast_id = ?",
             [forecast_units, now, forecast_id]
         )
+        self._invalidate_cost_cube_month(current["product_id"], current["year"], current["month"])
         conn.commit()
         return True
 
     def delete_forecast(self, forecast_id: int) -> bool:
         conn = self._get_connection()
+        current = self.get_forecast(forecast_id)
+        if current:
+            self._invalidate_cost_cube_month(current["product_id"], current["year"], current["month"])
         result = conn.execute("DELETE FROM forecasts WHERE forecast_id = ?", [forecast_id])
         conn.commit()
         return result.rowcount > 0
@@ -1274,6 +1805,7 @@ class CRUDOperations(DatabaseSchema):
             "INSERT INTO actuals (actual_id, product_id, process_id, year, month, actual_units, date_creation, date_last_update) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
             [actual_id, product_id, process_id, year, month, actual_units, now, now]
         )
+        self._invalidate_cost_cube_month(product_id, year, month)
         conn.commit()
         return self.get_actual(actual_id)
 
@@ -1353,11 +1885,15 @@ class CRUDOperations(DatabaseSchema):
             "UPDATE actuals SET actual_units = ?, date_last_update = ? WHERE actual_id = ?",
             [actual_units, now, actual_id]
         )
+        self._invalidate_cost_cube_month(current["product_id"], current["year"], current["month"])
         conn.commit()
         return True
 
     def delete_actual(self, actual_id: int) -> bool:
         conn = self._get_connection()
+        current = self.get_actual(actual_id)
+        if current:
+            self._invalidate_cost_cube_month(current["product_id"], current["year"], current["month"])
         result = conn.execute("DELETE FROM actuals WHERE actual_id = ?", [actual_id])
         conn.commit()
         return result.rowcount > 0
@@ -1448,6 +1984,7 @@ class CRUDOperations(DatabaseSchema):
             "UPDATE contracts SET contract_name = ?, status = ?, date_last_update = ? WHERE contract_id = ?",
             [contract_name, status, now, contract_id]
         )
+        self._invalidate_cost_cube("contract", contract_id)
         return True
 
     def delete_contract(self, contract_id: int) -> bool:
@@ -1458,6 +1995,8 @@ class CRUDOperations(DatabaseSchema):
         if not contract:
             return False
 
+        self._invalidate_cost_cube("contract", contract_id)
+
         # Delete all offers for this contract's provider and process
         # This removes orphaned offers when a contract is deleted
         conn.execute(
@@ -1482,6 +2021,7 @@ class CRUDOperations(DatabaseSchema):
             "INSERT INTO contract_tiers (contract_tier_id, contract_id, tier_number, threshold_units, is_selected, date_creation, date_last_update) VALUES (?, ?, ?, ?, ?, ?, ?)",
             [contract_tier_id, contract_id, tier_number, threshold_units, is_selected, now, now]
         )
+        self._invalidate_cost_cube("contract", contract_id)
         return self.get_contract_tier(contract_tier_id)
 
     def get_contract_tier(self, contract_tier_id: int) -> Optional[Dict[str, Any]]:
@@ -1521,6 +2061,50 @@ class CRUDOperations(DatabaseSchema):
             for row in results
         ]
 
+    def get_contract_tiers_for_contracts(self, contract_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Get tiers for many contracts in one query, keyed by contract_id"""
+        conn = self._get_connection()
+        results = conn.execute("""
+            SELECT contract_tier_id, contract_id, tier_number, threshold_units, is_selected, date_creation, date_last_update
+            FROM contract_tiers
+            WHERE contract_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+            ORDER BY contract_id, tier_number
+        """, [self._id_list(contract_ids)]).fetchall()
+
+        tiers_by_contract = {contract_id: [] for contract_id in contract_ids}
+        for row in results:
+            tiers_by_contract[row[1]].append({
+                "contract_tier_id": row[0],
+                "contract_id": row[1],
+                "tier_number": row[2],
+                "threshold_units": row[3],
+                "is_selected": row[4],
+                "date_creation": row[5],
+                "date_last_update": row[6]
+            })
+        return tiers_by_contract
+
+    def get_offer_prices_for_contracts(self, contract_ids: List[int]) -> Dict[int, Dict[int, Dict[int, float]]]:
+        """Get active offer prices for many contracts in one query.
+
+        Returns {contract_id: {item_id: {tier_number: price}}}, using the most
+        recent active offer like get_price_for_item_at_tier.
+        """
+        conn = self._get_connection()
+        results = conn.execute("""
+            SELECT c.contract_id, o.item_id, o.tier_number, arg_max(o.price_per_unit, o.date_creation)
+            FROM contracts c
+            JOIN offers o ON o.provider_id = c.provider_id AND o.process_id = c.process_id
+            WHERE c.contract_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+              AND o.status = 'active'
+            GROUP BY c.contract_id, o.item_id, o.tier_number
+        """, [self._id_list(contract_ids)]).fetchall()
+
+        prices = {contract_id: {} for contract_id in contract_ids}
+        for contract_id, item_id, tier_number, price in results:
+            prices[contract_id].setdefault(item_id, {})[tier_number] = float(price)
+        return prices
+
     def update_contract_tier(self, contract_tier_id: int, threshold_units: int = None, is_selected: bool = None) -> bool:
         conn = self._get_connection()
         now = datetime.now().isoformat()
@@ -1535,6 +2119,7 @@ class CRUDOperations(DatabaseSchema):
             "UPDATE contract_tiers SET threshold_units = ?, is_selected = ?, date_last_update = ? WHERE contract_tier_id = ?",
             [threshold_units, is_selected, now, contract_tier_id]
         )
+        self._invalidate_cost_cube("contract_tier", contract_tier_id)
         return True
 
     def delete_contract_tier(self, contract_tier_id: int) -> bool:
@@ -1549,6 +2134,8 @@ class CRUDOperations(DatabaseSchema):
         if not contract:
             return False
 
+        self._invalidate_cost_cube("contract_tier", contract_tier_id)
+
         # Delete all offers for this provider, process, and tier_number
         # This removes orphaned offers when a tier is deleted
         conn.execute(
@@ -1573,6 +2160,7 @@ class CRUDOperations(DatabaseSchema):
             "INSERT INTO contract_lookups (lookup_id, contract_id, source, method, lookback_months, date_creation, date_last_update) VALUES (?, ?, ?, ?, ?, ?, ?)",
             [lookup_id, contract_id, source, method, lookback_months, now, now]
         )
+        self._invalidate_cost_cube("contract", contract_id)
         return self.get_contract_lookup(contract_id)
 
     def get_contract_lookup(self, contract_id: int) -> Optional[Dict[str, Any]]:
@@ -1590,6 +2178,27 @@ class CRUDOperations(DatabaseSchema):
             }
         return None
 
+    def get_contract_lookups_for_contracts(self, contract_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+        """Get lookup strategies for many contracts in one query; contracts without one map to None"""
+        conn = self._get_connection()
+        results = conn.execute("""
+            SELECT * FROM contract_lookups
+            WHERE contract_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+        """, [self._id_list(contract_ids)]).fetchall()
+
+        lookups = {contract_id: None for contract_id in contract_ids}
+        for result in results:
+            lookups[result[1]] = {
+                "lookup_id": result[0],
+                "contract_id": result[1],
+                "source": result[2],
+                "method": result[3],
+                "lookback_months": result[4],
+                "date_creation": result[5],
+                "date_last_update": result[6]
+            }
+        return lookups
+
     def update_contract_lookup(self, contract_id: int, source: str = None, method: str = None, lookback_months: int = None) -> bool:
         conn = self._get_connection()
         now = datetime.now().isoformat()
@@ -1613,10 +2222,12 @@ class CRUDOperations(DatabaseSchema):
             "UPDATE contract_lookups SET source = ?, method = ?, lookback_months = ?, date_last_update = ? WHERE contract_id = ?",
             [source, method, lookback_months, now, contract_id]
         )
+        self._invalidate_cost_cube("contract", contract_id)
         return True
 
     def delete_contract_lookup(self, contract_id: int) -> bool:
         conn = self._get_connection()
+        self._invalidate_cost_cube("contract", contract_id)
         result = conn.execute("DELETE FROM contract_lookups WHERE contract_id = ?", [contract_id])
         return result.rowcount > 0
 
@@ -1669,21 +2280,70 @@ class CRUDOperations(DatabaseSchema):
         Calculate detailed pricing table for a product based on actuals or forecasts.
         Returns structure suitable for frontend rendering.
         """
-        conn = self._get_connection()
+        context = self._pricing_context([product_id], year, month, use_forecasts)
+        return self._product_pricing_table(product_id, context)
+
+    def _pricing_context(self, product_ids: List[int], year: int = None, month: int = None, use_forecasts: bool = False,
+                         through: tuple = None) -> Dict[str, Any]:
+        """
+        Load everything the pricing table needs for many products up front.
+
+        Contracts are shared between products, so tiers, lookups, offer prices,
+        monthly units and pooled contract volumes are fetched once per table
+        instead of once per row. With `through` (year, month), units and volumes
+        are loaded up to that month so the context can be reused for later
+        months by swapping its year and month.
+        """
         now = datetime.now()
-        
+
         # Default to current date if not provided
         current_year = year if year is not None else now.year
         current_month = month if month is not None else now.month
-        
-        # 2. Get Allocations
-        allocations = self.get_allocations_for_product(product_id)
-        
-        # 3. Get Multipliers
-        multipliers = self.get_price_multipliers_for_product(product_id)
-        
-        # 4. Get Product Structure (Contracts -> Items)
-        structure = self.get_product_contracts_with_selected_items(product_id)
+
+        structures = self.get_products_contracts_with_selected_items(product_ids)
+        contract_ids = sorted({
+            provider['contract_id']
+            for structure in structures.values()
+            for process in structure
+            for item in process['items']
+            for provider in item['providers']
+        })
+        lookups = self.get_contract_lookups_for_contracts(contract_ids)
+
+        # Units for the month itself plus every month a lookup strategy looks back over
+        max_lookback = max([lookup['lookback_months'] for lookup in lookups.values() if lookup] or [0])
+        first = current_year * 12 + current_month - 1 - max_lookback
+        sources = {'forecasts' if use_forecasts else 'actuals'}
+        sources |= {'forecasts' if lookup and lookup['source'] == 'forecasts' else 'actuals' for lookup in lookups.values()}
+        bounds = ((first // 12, first % 12 + 1), through or (current_year, current_month))
+        units = {source: self.get_monthly_units(source, product_ids, *bounds) for source in sources}
+        # Tiers are determined by the volume of every product on a contract
+        pooled = {source: self.get_pooled_contract_volumes(source, *bounds, contract_ids) for source in sources}
+
+        return {
+            "year": current_year,
+            "month": current_month,
+            "use_forecasts": use_forecasts,
+            "structures": structures,
+            "allocations": self.get_allocations_for_products(product_ids),
+            "multipliers": self.get_price_multipliers_for_products(product_ids),
+            "tiers": self.get_contract_tiers_for_contracts(contract_ids),
+            "lookups": lookups,
+            "prices": self.get_offer_prices_for_contracts(contract_ids),
+            "units": units,
+            "pooled": pooled
+        }
+
+    def _product_pricing_table(self, product_id: int, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Pricing table for one product from a context built by _pricing_context"""
+        current_year = context['year']
+        current_month = context['month']
+        use_forecasts = context['use_forecasts']
+        allocations = context['allocations'][product_id]
+        multipliers = context['multipliers'][product_id]
+        structure = context['structures'][product_id]
+        month_units = context['units']['forecasts' if use_forecasts else 'actuals']
+        month_volumes = context['pooled']['forecasts' if use_forecasts else 'actuals']
         
         processes_data = []
         total_units = 0
@@ -1691,16 +2351,9 @@ class CRUDOperations(DatabaseSchema):
         for process in structure:
             # Fetch process-specific units
             process_id = process['process_id']
-            units = 0
-            
-            if use_forecasts:
-                forecast = self.get_forecast_by_product_process_month(product_id, process_id, current_year, current_month)
-                if forecast:
-                    units = forecast[5]
-            else:
-                actual = self.get_actual_by_product_process_month(product_id, process_id, current_year, current_month)
-                if actual:
-                    units = actual[5]
+            month_key = (product_id, process_id, current_year, current_month)
+            has_data = month_key in month_units
+            units = month_units.get(month_key, 0)
             
             total_units += units
 
@@ -1814,60 +2467,36 @@ class CRUDOperations(DatabaseSchema):
                         continue
                     
                     # Find Tier
-                    tiers = self.get_contract_tiers_for_contract(contract_id)
                     # Sort by threshold ascending (e.g. 0, 1000, 5000)
-                    tiers.sort(key=lambda x: x['threshold_units'])
+                    tiers = sorted(context['tiers'][contract_id], key=lambda x: x['threshold_units'])
                     
                     active_tier_num = 1
                     calculated_tier_num = 1
                     effective_tier_num = 1
-                    effective_vol = alloc_val  # Default to raw volume
-                    strategy_label = "SUM 1mo"  # Default
-                    
+
+                    # Tiers follow the contract's volume pooled across all products
+                    pooled_vol = month_volumes.get((contract_id, current_year, current_month), 0)
+                    effective_vol = pooled_vol
+
                     # Get contract lookup strategy
-                    lookup = self.get_contract_lookup(contract_id)
+                    lookup = context['lookups'][contract_id]
                     method = lookup['method'] if lookup else 'SUM'
                     lookback = (lookup['lookback_months'] if lookup else 0) + 1
                     source = lookup['source'] if lookup else 'actuals'
                     strategy_label = f"{method} {lookback}mo"
-                    
-                    # Calculate effective volume using historical data
-                    alloc_pct = p_alloc['value'] if p_alloc and mode == 'percentage' else None
-                    if lookback > 1 and alloc_pct is not None:
-                        historical_vols = []
-                        for offset in range(lookback):
-                            hist_month = current_month - offset
-                            hist_year = current_year
-                            while hist_month <= 0:
-                                hist_month += 12
-                                hist_year -= 1
-                            
-                            # Fetch historical data based on source
-                            if source == 'forecasts':
-                                hist_data = self.get_forecast_by_product_process_month(
-                                    product_id, process_id, hist_year, hist_month
-                                )
-                            else:
-                                hist_data = self.get_actual_by_product_process_month(
-                                    product_id, process_id, hist_year, hist_month
-                                )
-                            
-                            if hist_data:
-                                hist_units = hist_data[5]
-                                hist_alloc = int(hist_units * (alloc_pct / 100.0))
-                                historical_vols.append(hist_alloc)
-                        
-                        if historical_vols:
-                            if method == 'AVG':
-                                effective_vol = int(sum(historical_vols) / len(historical_vols))
-                            else:  # SUM
-                                effective_vol = sum(historical_vols)
 
-                    # 1. Calculate Volume-Based Tier (from raw volume)
+                    # Effective volume over the lookup window, from the lookup's source
+                    if lookback > 1:
+                        hist_volumes = context['pooled']['forecasts' if source == 'forecasts' else 'actuals']
+                        window_vol = self._lookup_volume(hist_volumes, contract_id, lookup, current_year, current_month)
+                        if window_vol is not None:
+                            effective_vol = window_vol
+
+                    # 1. Calculate Volume-Based Tier (from the month's pooled volume)
                     if tiers:
                         found_tier = None
                         for t in tiers:
-                            if t['threshold_units'] > alloc_val:
+                            if t['threshold_units'] > pooled_vol:
                                 found_tier = t
                                 break
                         
@@ -1898,7 +2527,7 @@ class CRUDOperations(DatabaseSchema):
                         active_tier_num = effective_tier_num
 
                     # Get Price
-                    price = self.get_price_for_item_at_tier(provider_id, item_id, active_tier_num, process['process_id'])
+                    price = context['prices'][contract_id].get(item_id, {}).get(active_tier_num)
                     
                     if price is None:
                         price = 0.0
@@ -1916,12 +2545,15 @@ class CRUDOperations(DatabaseSchema):
                         mult_display = f"{multiplier} ({sign}{pct:.1f}%)"
                     
                     process_rows.append({
+                        "item_id": item_id,
                         "item_name": item['item_name'],
+                        "provider_id": provider_id,
                         "provider_name": provider['provider_name'],
                         "tier": active_tier_num,
                         "calculated_tier": calculated_tier_num,
                         "effective_tier": effective_tier_num,
                         "effective_volume": effective_vol,
+                        "pooled_volume": pooled_vol,
                         "strategy_label": strategy_label,
                         "price_per_unit": price,
                         "multiplier_display": mult_display,
@@ -1942,7 +2574,7 @@ class CRUDOperations(DatabaseSchema):
                         if item.get('providers'):
                             first_contract = item['providers'][0]
                             if 'contract_id' in first_contract:
-                                contract_lookup = self.get_contract_lookup(first_contract['contract_id'])
+                                contract_lookup = context['lookups'][first_contract['contract_id']]
                                 break
                     
                 processes_data.append({
@@ -1950,7 +2582,7 @@ class CRUDOperations(DatabaseSchema):
                     "process_name": process['process_name'],
                     "contract_lookup": contract_lookup,
                     "rows": process_rows,
-                    "has_data": bool(forecast) if use_forecasts else bool(actual)
+                    "has_data": has_data
                 })
                 
         return {
@@ -1962,17 +2594,512 @@ class CRUDOperations(DatabaseSchema):
         }
 
 
+    def get_portfolio_pricing_data(self, year: int = None, month: int = None, use_forecasts: bool = False, include_rows: bool = False) -> Dict[str, Any]:
+        """
+        Pricing for every active product in one pass, with totals per product, process and provider.
+
+        Totals are read from cost_cube; detailed rows, when requested, come from
+        pricing tables that share one _pricing_context across products.
+        """
+        now = datetime.now()
+        current_year = year if year is not None else now.year
+        current_month = month if month is not None else now.month
+        source = 'forecasts' if use_forecasts else 'actuals'
+
+        products = [p for p in self.get_all_products() if p[3] == 'active']
+        product_ids = [p[0] for p in products]
+        processes = self._product_processes(product_ids)
+        units = self.get_monthly_units(source, product_ids, (current_year, current_month), (current_year, current_month))
+        cells = self.get_cost_cube_totals(product_ids, (current_year, current_month), (current_year, current_month), source)
+
+        rows_by_process = {}
+        if include_rows:
+            context = self._pricing_context(product_ids, current_year, current_month, use_forecasts)
+            for product_id in product_ids:
+                for process in self._product_pricing_table(product_id, context)['processes']:
+                    rows_by_process[(product_id, process['process_id'])] = process['rows']
+
+        process_cells = {}
+        provider_totals = {}
+        for cell in cells:
+            totals = process_cells.setdefault((cell['product_id'], cell['process_id']), {"total_cost": 0.0, "allocated_units": 0})
+            totals['total_cost'] += cell['total_cost']
+            totals['allocated_units'] += cell['allocated_units']
+
+            totals = provider_totals.setdefault(cell['provider_id'], {
+                "provider_id": cell['provider_id'],
+                "provider_name": cell['provider_name'],
+                "total_cost": 0.0,
+                "allocated_units": 0
+            })
+            totals['total_cost'] += cell['total_cost']
+            totals['allocated_units'] += cell['allocated_units']
+
+        product_totals = []
+        process_totals = {}
+        for product in products:
+            product_id = product[0]
+            product_processes = []
+            for process in processes[product_id]:
+                if not process['priced']:
+                    continue
+                process_id = process['process_id']
+                totals = process_cells.get((product_id, process_id), {"total_cost": 0.0, "allocated_units": 0})
+                entry = {
+                    "process_id": process_id,
+                    "process_name": process['process_name'],
+                    "has_data": (product_id, process_id, current_year, current_month) in units,
+                    **totals
+                }
+                if include_rows:
+                    entry["rows"] = rows_by_process.get((product_id, process_id), [])
+                product_processes.append(entry)
+
+                overall = process_totals.setdefault(process_id, {
+                    "process_id": process_id,
+                    "process_name": process['process_name'],
+                    "total_cost": 0.0,
+                    "allocated_units": 0
+                })
+                overall['total_cost'] += totals['total_cost']
+                overall['allocated_units'] += totals['allocated_units']
+
+            product_totals.append({
+                "product_id": product_id,
+                "product_name": product[1],
+                "units": sum(units.get((product_id, p['process_id'], current_year, current_month), 0) for p in processes[product_id]),
+                "total_cost": sum(p['total_cost'] for p in product_processes),
+                "processes": product_processes
+            })
+
+        return {
+            "year": current_year,
+            "month": current_month,
+            "is_forecast": use_forecasts,
+            "total_cost": sum(p['total_cost'] for p in product_totals),
+            "products": product_totals,
+            "processes": sorted(process_totals.values(), key=lambda p: p['process_name']),
+            "providers": sorted(provider_totals.values(), key=lambda p: p['total_cost'], reverse=True)
+        }
+
+    def get_product_pricing_history(self, product_id: int, year: int, month: int, lookback: int) -> List[Dict[str, Any]]:
+        """
+        Monthly cost per process from actuals and from forecasts, oldest month first.
+
+        Processes without data in a month report None. Costs are read from cost_cube.
+        """
+        last = year * 12 + month - 1
+        first = last - lookback + 1
+        bounds = ((first // 12, first % 12 + 1), (year, month))
+        processes = self._product_processes([product_id])[product_id]
+        units = {source: self.get_monthly_units(source, [product_id], *bounds) for source in ('actuals', 'forecasts')}
+
+        costs = {}
+        for cell in self.get_cost_cube_totals([product_id], *bounds):
+            key = (cell['process_id'], cell['year'], cell['month'], cell['source'])
+            costs[key] = costs.get(key, 0.0) + cell['total_cost']
+
+        history = []
+        for period in range(first, last + 1):
+            y, m = period // 12, period % 12 + 1
+            entry = {"year": y, "month": m}
+            for source in ('actuals', 'forecasts'):
+                breakdown = {}
+                total = 0
+                for process in processes:
+                    if not process['priced']:
+                        continue
+                    # Use None if no data exists for this period
+                    has_data = (product_id, process['process_id'], y, m) in units[source]
+                    val = costs.get((process['process_id'], y, m, source), 0.0) if has_data else None
+                    breakdown[str(process['process_id'])] = val
+                    if val is not None:
+                        total += val
+                entry[f"total_cost_{source}"] = total
+                entry[f"breakdown_{source}"] = breakdown
+                entry[f"units_{source}"] = sum(units[source].get((product_id, p['process_id'], y, m), 0) for p in processes)
+            history.append(entry)
+        return history
+
+    # =====================================
+    # COST CUBE OPERATIONS
+    # =====================================
+
+    def _invalidate_cost_cube(self, entity: str, entity_id: int, first_period: int = None, last_period: int = None):
+        """Queue the cost_cube cells of every product that depends on an entity for recomputation"""
+        conn = self._get_connection()
+        queued = conn.execute(f"""
+            INSERT INTO cost_cube_dirty
+            SELECT DISTINCT product_id, $first_period::INTEGER, $last_period::INTEGER
+            FROM ({COST_CUBE_DEPENDENTS[entity]})
+            RETURNING product_id
+        """, {"entity_id": entity_id, "first_period": first_period, "last_period": last_period}).fetchall()
+        self._invalidated.update(row[0] for row in queued)
+
+    def _invalidate_cost_cube_month(self, product_id: int, year: int, month: int):
+        """A month's units feed that month and every later month a lookup strategy looks back from"""
+        conn = self._get_connection()
+        max_lookback = conn.execute("SELECT COALESCE(MAX(lookback_months), 0) FROM contract_lookups").fetchone()[0]
+        period = year * 12 + month - 1
+        self._invalidate_cost_cube("pool", product_id, period, period + max_lookback)
+
+    def update_cost_cube(self, full: bool = False, product_ids: List[int] = None) -> int:
+        """
+        Recompute queued cost_cube cells (or all cells with full=True); returns the number of cells written.
+
+        Cells exist for every product month that has actuals or forecasts; other
+        months cost nothing. They are computed by the pricing-table engine with
+        one shared context per source for all affected products and months.
+        With product_ids, only those products' queued cells are recomputed.
+        Writes recompute the cells they queue before returning; what is left
+        (a new database, a failed refresh) is worked down in the background
+        by refresh_cost_cube_forever, so reads never recompute.
+        """
+        with _cost_cube_lock, self._transaction() as conn:
+            if full:
+                conn.execute("DELETE FROM cost_cube")
+                conn.execute("INSERT INTO cost_cube_dirty SELECT product_id, NULL, NULL FROM products")
+            return self._recompute_cost_cube(product_ids)
+
+    def _refresh_invalidated_cost_cube(self):
+        """Recompute the cells a write queued before it returns, so reads right after it see them"""
+        if not self._invalidated:
+            return
+        product_ids, self._invalidated = sorted(self._invalidated), set()
+        try:
+            with crud_method("update_cost_cube"), _cost_cube_lock, self._transaction():
+                self._recompute_cost_cube(product_ids)
+        except duckdb.Error:
+            logger.exception("Refreshing cost_cube cells failed; they stay queued for the background refresh")
+
+    def _refresh_cost_cube_batch(self, batch: int = COST_CUBE_REFRESH_BATCH) -> int:
+        """Recompute all queued cells of the next few products; returns how many products were refreshed"""
+        with _cost_cube_lock:
+            product_ids = [row[0] for row in self._get_connection().execute(
+                "SELECT DISTINCT product_id FROM cost_cube_dirty ORDER BY product_id LIMIT ?", [batch]
+            ).fetchall()]
+            if product_ids:
+                with crud_method("update_cost_cube"), self._transaction():
+                    self._recompute_cost_cube(product_ids)
+        return len(product_ids)
+
+    def _take_cost_cube_scopes(self, product_ids: List[int] = None) -> List[tuple]:
+        """Dequeue the invalidations of some products (None = all) as one merged (product_id, first_period, last_period) each"""
+        conn = self._get_connection()
+        queued = conn.execute("""
+            DELETE FROM cost_cube_dirty
+            WHERE ? OR product_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+            RETURNING product_id, first_period, last_period
+        """, [product_ids is None, self._id_list(product_ids or [])]).fetchall()
+
+        scopes = {}
+        for product_id, first, last in queued:
+            if product_id in scopes:
+                was_first, was_last = scopes[product_id]
+                first = None if first is None or was_first is None else min(first, was_first)
+                last = None if last is None or was_last is None else max(last, was_last)
+            scopes[product_id] = (first, last)
+        return [(product_id, first, last) for product_id, (first, last) in sorted(scopes.items())]
+
+    def _recompute_cost_cube(self, product_ids: List[int] = None) -> int:
+        """Recompute the queued cells of some products (None = all), in the open transaction"""
+        conn = self._get_connection()
+        scopes = self._take_cost_cube_scopes(product_ids)
+        if not scopes:
+            return 0
+
+        scope_json = json.dumps([{"product_id": p, "first_period": f, "last_period": l} for p, f, l in scopes])
+        scope_type = '[{"product_id": "INTEGER", "first_period": "INTEGER", "last_period": "INTEGER"}]'
+        conn.execute(f"""
+            DELETE FROM cost_cube c
+            USING (SELECT unnest(from_json(?, '{scope_type}'), recursive := true)) d
+            WHERE c.product_id = d.product_id
+              AND c.year * 12 + c.month - 1 >= COALESCE(d.first_period, c.year * 12 + c.month - 1)
+              AND c.year * 12 + c.month - 1 <= COALESCE(d.last_period, c.year * 12 + c.month - 1)
+        """, [scope_json])
+
+        product_ids = [scope[0] for scope in scopes]
+        bounds = {p: (f, l) for p, f, l in scopes}
+        rows = []
+        for source in ('actuals', 'forecasts'):
+            cells = [
+                (product_id, period) for product_id, period in conn.execute(f"""
+                    SELECT DISTINCT product_id, year * 12 + month - 1 AS period
+                    FROM {source}
+                    WHERE product_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+                    ORDER BY product_id, period
+                """, [self._id_list(product_ids)]).fetchall()
+                if (bounds[product_id][0] is None or period >= bounds[product_id][0])
+                and (bounds[product_id][1] is None or period <= bounds[product_id][1])
+            ]
+            if not cells:
+                continue
+
+            first = min(period for _, period in cells)
+            last = max(period for _, period in cells)
+            context = self._pricing_context(
+                product_ids, first // 12, first % 12 + 1, source == 'forecasts', through=(last // 12, last % 12 + 1)
+            )
+            for product_id, period in cells:
+                year, month = period // 12, period % 12 + 1
+                multipliers = context['multipliers'][product_id]
+                table = self._product_pricing_table(product_id, {**context, "year": year, "month": month})
+                for process in table['processes']:
+                    for row in process['rows']:
+                        rows.append((
+                            product_id, process['process_id'], row['provider_id'], row['item_id'], year, month, source,
+                            row['allocated_units'], row['pooled_volume'], row['effective_volume'], row['calculated_tier'],
+                            row['effective_tier'], row['tier'], row['price_per_unit'],
+                            multipliers.get(row['item_id'], {'multiplier': 1.0})['multiplier'], row['total_cost']
+                        ))
+
+        self._insert_many("cost_cube", [
+            "product_id", "process_id", "provider_id", "item_id", "year", "month", "source",
+            "allocated_units", "pooled_volume", "effective_volume", "calculated_tier", "effective_tier", "active_tier",
+            "unit_price", "multiplier", "total_cost"
+        ], rows)
+        return len(rows)
+
+    def get_cost_cube_totals(self, product_ids: List[int], first: tuple, last: tuple, source: str = None) -> List[Dict[str, Any]]:
+        """Cost and allocated units per product, process, provider, month and source over a month range"""
+        conn = self._get_connection()
+        results = conn.execute("""
+            SELECT c.product_id, c.process_id, c.provider_id, p.company_name, c.year, c.month, c.source,
+                   SUM(c.allocated_units), SUM(c.total_cost)
+            FROM cost_cube c
+            JOIN providers p ON p.provider_id = c.provider_id
+            WHERE c.product_id IN (SELECT unnest(from_json(?, '["INTEGER"]')))
+              AND c.year * 12 + c.month BETWEEN ? AND ?
+              AND (? IS NULL OR c.source = ?)
+            GROUP BY ALL
+            ORDER BY c.product_id, c.process_id, c.provider_id, c.year, c.month, c.source
+        """, [self._id_list(product_ids), first[0] * 12 + first[1], last[0] * 12 + last[1], source, source]).fetchall()
+
+        return [
+            {
+                "product_id": row[0],
+                "process_id": row[1],
+                "provider_id": row[2],
+                "provider_name": row[3],
+                "year": row[4],
+                "month": row[5],
+                "source": row[6],
+                "allocated_units": int(row[7]),
+                "total_cost": float(row[8])
+            }
+            for row in results
+        ]
+
+    def get_cost_analytics(self, group_by: List[str], measures: List[str] = None, source: str = "actuals",
+                           start: tuple = None, end: tuple = None, provider_ids: List[int] = None,
+                           process_ids: List[int] = None, product_ids: List[int] = None,
+                           item_ids: List[int] = None) -> Dict[str, Any]:
+        """
+        Aggregate cost_cube by any mix of dimensions in one query.
+
+        Args:
+            group_by: Keys of COST_DIMENSIONS; each adds its id/name or label columns
+            measures: Keys of COST_MEASURES (defaults to total_cost and allocated_units)
+            source: 'actuals', 'forecasts' or None for both
+            start, end: Inclusive (year, month) bounds
+            *_ids: Restrict to these providers, processes, products or items
+
+        Returns columnar data: {"columns": [...], "data": {column: [values]}, "row_count": n}
+        """
+        measures = measures or ["total_cost", "allocated_units"]
+        unknown = [d for d in group_by if d not in COST_DIMENSIONS] + [m for m in measures if m not in COST_MEASURES]
+        if unknown:
+            raise ValueError(
+                f"Unknown dimension or measure: {', '.join(unknown)}. "
+                f"Dimensions: {', '.join(COST_DIMENSIONS)}; measures: {', '.join(COST_MEASURES)}"
+            )
+        if source not in (None, "actuals", "forecasts"):
+            raise ValueError("source must be 'actuals' or 'forecasts'")
+
+        dimensions = list(dict.fromkeys(group_by))
+        select = []
+        joins = []
+        for dimension in dimensions:
+            columns, join = COST_DIMENSIONS[dimension]
+            select.extend(f"{sql} AS {name}" for name, sql in columns.items())
+            if join:
+                joins.append(join)
+        select.extend(f"{COST_MEASURES[m]} AS {m}" for m in dict.fromkeys(measures))
+
+        where = []
+        params = []
+        if source:
+            where.append("c.source = ?")
+            params.append(source)
+        if start:
+            where.append("c.year * 12 + c.month >= ?")
+            params.append(start[0] * 12 + start[1])
+        if end:
+            where.append("c.year * 12 + c.month <= ?")
+            params.append(end[0] * 12 + end[1])
+        for column, ids in (("provider_id", provider_ids), ("process_id", process_ids),
+                            ("product_id", product_ids), ("item_id", item_ids)):
+            if ids is not None:
+                where.append(f"c.{column} IN (SELECT unnest(from_json(?, '[\"INTEGER\"]')))")
+                params.append(self._id_list(ids))
+
+        group_columns = [str(i + 1) for i in range(sum(len(COST_DIMENSIONS[d][0]) for d in dimensions))]
+        query = f"""
+            SELECT {', '.join(select)}
+            FROM cost_cube c
+            {' '.join(joins)}
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            {'GROUP BY ' + ', '.join(group_columns) if group_columns else ''}
+            {'ORDER BY ' + ', '.join(group_columns) if group_columns else ''}
+        """
+
+        conn = self._get_connection()
+        cursor = conn.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        rows = cursor.fetchall()
+        values = list(zip(*rows)) if rows else [() for _ in columns]
+        return {
+            "columns": columns,
+            "data": {column: list(column_values) for column, column_values in zip(columns, values)},
+            "row_count": len(rows)
+        }
+
+    def _product_processes(self, product_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Processes of each product in pricing-table order; `priced` when the table has rows for it"""
+        structures = self.get_products_contracts_with_selected_items(product_ids)
+        allocations = self.get_allocations_for_products(product_ids)
+
+        processes = {}
+        for product_id in product_ids:
+            product_allocations = allocations[product_id]
+            collective = 'mode' in product_allocations and 'providers' in product_allocations
+            processes[product_id] = []
+            for process in structures[product_id]:
+                priced = False
+                for item in process['items']:
+                    item_allocation = product_allocations if collective else product_allocations.get(item['item_id'], {})
+                    allocated = {p['provider_id'] for p in item_allocation.get('providers', []) if p['value'] > 0}
+                    if any(provider['provider_id'] in allocated for provider in item['providers']):
+                        priced = True
+                        break
+                processes[product_id].append({
+                    "process_id": process['process_id'],
+                    "process_name": process['process_name'],
+                    "priced": priced
+                })
+        return processes
+
+    # =====================================
+    # SEARCH OPERATIONS
     # =====================================
 
+    def get_search_entities(self) -> List[tuple]:
+        """(type, id, name, status) of every provider, product, process and item"""
+        conn = self._get_connection()
+        return conn.execute("""
+            SELECT 'provider', provider_id, company_name, status FROM providers
+            UNION ALL SELECT 'product', product_id, name, status FROM products
+            UNION ALL SELECT 'process', process_id, process_name, status FROM processes
+            UNION ALL SELECT 'item', item_id, item_name, status FROM items
+        """).fetchall()
+
+    # =====================================
+    # OPTIMIZATION JOB OPERATIONS
+    # =====================================
+
+    def get_write_generation(self) -> int:
+        """Token that changes after every write through this process; cheap enough to check per call"""
+        return _write_generation
+
+    def get_data_version(self, tables: tuple = DATA_TABLES) -> str:
+        """Fingerprint of all calculation inputs (or of `tables`); changes whenever any of their rows change"""
+        conn = self._get_connection()
+        parts = " UNION ALL ".join(
+            f"SELECT '{table}', COUNT(*), COALESCE(bit_xor(hash(t)), 0) FROM {table} t" for table in tables
+        )
+        rows = conn.execute(parts).fetchall()
+        return hashlib.sha256(json.dumps(sorted(rows)).encode()).hexdigest()
+
+    def _job_from_row(self, result) -> Dict[str, Any]:
+        return {
+            "job_id": result[0],
+            "kind": result[1],
+            "input_hash": result[2],
+            "data_version": result[3],
+            "status": result[4],
+            "progress": result[5],
+            "params": json.loads(result[6]),
+            "result": json.loads(result[7]) if result[7] is not None else None,
+            "error": result[8],
+            "date_creation": result[9],
+            "date_last_update": result[10]
+        }
+
+    def create_optimization_job(self, job_id: str, kind: str, input_hash: str, data_version: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        conn = self._get_connection()
+        now = datetime.now().isoformat()
+        conn.execute(
+            "INSERT INTO optimization_jobs (job_id, kind, input_hash, data_version, status, progress, params, date_creation, date_last_update) VALUES (?, ?, ?, ?, 'queued', 0, ?, ?, ?)",
+            [job_id, kind, input_hash, data_version, json.dumps(params), now, now]
+        )
+        return self.get_optimization_job(job_id)
+
+    def get_optimization_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._get_connection()
+        result = conn.execute("SELECT * FROM optimization_jobs WHERE job_id = ?", [job_id]).fetchone()
+        return self._job_from_row(result) if result else None
+
+    def get_completed_optimization_job(self, kind: str, input_hash: str, data_version: str) -> Optional[Dict[str, Any]]:
+        """Latest completed job for identical inputs on identical data"""
+        conn = self._get_connection()
+        result = conn.execute("""
+            SELECT * FROM optimization_jobs
+            WHERE kind = ? AND input_hash = ? AND data_version = ? AND status = 'completed'
+            ORDER BY date_last_update DESC
+            LIMIT 1
+        """, [kind, input_hash, data_version]).fetchone()
+        return self._job_from_row(result) if result else None
+
+    def update_optimization_job(self, job_id: str, status: str, progress: float = None, result: Any = None, error: str = None) -> bool:
+        conn = self._get_connection()
+        now = datetime.now().isoformat()
+        updated = conn.execute("""
+            UPDATE optimization_jobs
+            SET status = ?, progress = COALESCE(?, progress), result = ?, error = ?, date_last_update = ?
+            WHERE job_id = ?
+        """, [status, progress, json.dumps(result) if result is not None else None, error, now, job_id])
+        return updated.fetchone()[0] > 0
+
+    # =====================================
+
+
+def refresh_cost_cube_forever(crud: CRUDOperations, idle_seconds: float = 1.0):
+    """Thread target: work the cost_cube queue down a batch at a time, filling cells queued outside a write"""
+    while True:
+        try:
+            if crud._refresh_cost_cube_batch():
+                continue
+        except duckdb.Error:
+            logger.exception("Refreshing cost_cube cells failed, retrying")
+        time.sleep(idle_seconds)
+
 
 # Global CRUD instance
 _crud = None
 
 
 def get_crud():
-    """Get or create the global CRUD operations instance"""
+    """Get or create the global CRUD operations instance.
+
+    With PARETO_DB_MODE=replica reads come from the writer's snapshot and
+    writes are forwarded to the writer process (see db/writer.py).
+    """
     global _crud
     if _crud is None:
-        _crud = CRUDOperations()
-        _crud.initialize_all()
+        if os.environ.get("PARETO_DB_MODE") == "replica":
+            from db.writer import ReplicaCRUDOperations
+            _crud = ReplicaCRUDOperations()
+        else:
+            _crud = CRUDOperations()
+            _crud.initialize_all()
     return _crud
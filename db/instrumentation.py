@@ -0,0 +1,162 @@
+"""
+SQL Instrumentation - Per-request query counts, timings and N+1 detection
+
+Every connection handed out by `DatabaseSchema._get_connection` is an
+`InstrumentedConnection`. Inside a `query_scope()` (opened per request by the
+middleware in run_web.py) each statement is recorded with its duration under
+its normalized text (literals replaced by `?`, whitespace collapsed), so the
+request can report:
+
+- a `Server-Timing: db;dur=...` header and one JSON log line on the
+  `pareto.sql` logger,
+- N+1 suspects: a normalized statement executed more than
+  PARETO_N_PLUS_ONE_THRESHOLD times in one request,
+- budget violations: more statements than PARETO_QUERY_BUDGETS allows for the
+  endpoint (JSON object keyed by "METHOD /route/template", "*" for the
+  default). With PARETO_DEV=1 a violation fails the request, so tests
+  exercising the endpoint fail too.
+
+Statement latency and fetched rows are also recorded in the metrics registry
+(db/metrics.py), labelled with the outermost CRUD method running
+(`crud_method`), whether or not a scope is open.
+"""
+
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from db.metrics import DB_ROWS_RETURNED, DB_STATEMENT_SECONDS
+
+DEV_MODE = os.environ.get("PARETO_DEV") == "1"
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("PARETO_N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_BUDGETS: Dict[str, int] = json.loads(os.environ.get("PARETO_QUERY_BUDGETS", "{}"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(query: str) -> str:
+    """Statement text with literals replaced by ? and whitespace collapsed"""
+    query = _STRING_LITERAL.sub("?", query)
+    query = _NUMBER_LITERAL.sub("?", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_ms: float = 0.0
+    statements: Dict[str, List[float]] = field(default_factory=dict)  # normalized text -> [count, ms]
+
+    def record(self, query: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        entry = self.statements.setdefault(normalize_statement(query), [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed_ms
+
+    def n_plus_one(self, threshold: int = None) -> List[Dict[str, Any]]:
+        """Statements repeated more than the threshold, most repeated first"""
+        threshold = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        repeated = [
+            {"statement": text, "count": count, "ms": round(ms, 2)}
+            for text, (count, ms) in self.statements.items()
+            if count > threshold
+        ]
+        return sorted(repeated, key=lambda s: s["count"], reverse=True)
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_ms:.2f};desc="{self.count} queries"'
+
+
+def query_budget(endpoint: str) -> Optional[int]:
+    return QUERY_BUDGETS.get(endpoint, QUERY_BUDGETS.get("*"))
+
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+# Outermost CRUDOperations method on the stack, for metric labels
+current_crud_method: ContextVar[Optional[str]] = ContextVar("current_crud_method", default=None)
+
+
+@contextmanager
+def crud_method(name: str):
+    """Attribute the enclosed statements to a CRUD method unless an outer one already is"""
+    if current_crud_method.get() is not None:
+        yield
+        return
+    token = current_crud_method.set(name)
+    try:
+        yield
+    finally:
+        current_crud_method.reset(token)
+
+
+@contextmanager
+def query_scope():
+    """Record every statement executed in the enclosed scope; yields the QueryStats"""
+    stats = QueryStats()
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+class InstrumentedConnection:
+    """DuckDB connection wrapper that times execute() calls into the current query scope"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, query, parameters=None):
+        method = (current_crud_method.get() or "other",)
+        start = time.perf_counter()
+        try:
+            return InstrumentedResult(self._conn.execute(query, parameters), method)
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_STATEMENT_SECONDS.observe(elapsed, method)
+            stats = _query_stats.get()
+            if stats is not None:
+                stats.record(query, elapsed * 1000)
+
+    def cursor(self) -> "InstrumentedConnection":
+        return InstrumentedConnection(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class InstrumentedResult:
+    """Result of execute(): counts fetched rows, forwards everything else"""
+
+    def __init__(self, result, method: tuple):
+        self._result = result
+        self._method = method
+
+    def fetchall(self):
+        rows = self._result.fetchall()
+        DB_ROWS_RETURNED.inc(self._method, len(rows))
+        return rows
+
+    def fetchmany(self, size: int = 1):
+        rows = self._result.fetchmany(size)
+        DB_ROWS_RETURNED.inc(self._method, len(rows))
+        return rows
+
+    def fetchone(self):
+        row = self._result.fetchone()
+        if row is not None:
+            DB_ROWS_RETURNED.inc(self._method)
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
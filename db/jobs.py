@@ -0,0 +1,277 @@
+"""
+Optimization Jobs - Background execution of long-running solves
+
+Horizon plans, frontiers, sensitivity grids and cost-risk simulations can
+outlast an HTTP request, so they also run as jobs:
+
+- `JobManager.submit` keys a job by the hash of its canonical parameters and
+  the current data version (`CRUDOperations.get_data_version`), which is
+  fingerprinted again only once the CRUD write generation moved. A completed
+  job with the same key in `optimization_jobs` is returned immediately, and
+  an identical job still in flight is shared instead of started twice.
+- Jobs run on a thread pool (default) or a process pool
+  (PARETO_JOB_EXECUTOR=process), PARETO_JOB_WORKERS wide. Thread workers read
+  through their own cursor; process workers read a read-only snapshot of the
+  database (the writer's snapshot in single-writer mode).
+- Services report `progress(fraction, info)` with the best cost found so far.
+  Progress reports are also the cancellation points: once a job is cancelled
+  its next report raises `JobCancelled`. Queued jobs are dropped at once.
+- Status changes and results are persisted; live progress is kept in memory
+  and streamed to clients by the API over Server-Sent Events.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from db.crud import get_crud
+from db.optimization import OptimizationService
+from db.simulation import SimulationService
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOB_EXECUTOR = os.environ.get("PARETO_JOB_EXECUTOR", "thread")
+JOB_WORKERS = int(os.environ.get("PARETO_JOB_WORKERS", "2"))
+JOB_SNAPSHOT_PATH = os.environ.get("PARETO_JOB_SNAPSHOT_PATH", os.path.join(ROOT_DIR, "database.jobs.ddb"))
+
+JOB_KINDS = ("horizon", "frontier", "sensitivity", "risk")
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+# Finished jobs kept in memory; older ones are served from optimization_jobs
+MAX_FINISHED_JOBS = 100
+
+
+class JobCancelled(Exception):
+    """Raised from a progress report once the job has been cancelled"""
+
+
+def input_hash(kind: str, params: Dict[str, Any]) -> str:
+    """Hash of the canonical JSON form of a job's inputs"""
+    canonical = json.dumps({"kind": kind, "params": params}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def run_job(kind: str, params: Dict[str, Any], crud, progress: Callable) -> Dict[str, Any]:
+    """Run one job against the given CRUD operations"""
+    if kind == "horizon":
+        return OptimizationService(crud).optimize_horizon(**params, progress=progress)
+    if kind == "frontier":
+        return OptimizationService(crud).compute_frontier(**params, progress=progress)
+    if kind == "sensitivity":
+        return OptimizationService(crud).compute_sensitivity(**params, progress=progress)
+    if kind == "risk":
+        return SimulationService(crud).simulate_cost_risk(**params, progress=progress)
+    raise ValueError(f"kind must be one of {', '.join(JOB_KINDS)}")
+
+
+def _run_in_process(job_id: str, kind: str, params: Dict[str, Any], snapshot_path: str, updates, cancelled):
+    """Process pool entry point; reads a snapshot and reports progress through a queue"""
+    from db.writer import ReplicaCRUDOperations
+
+    def progress(fraction, info):
+        if cancelled.get(job_id):
+            raise JobCancelled()
+        updates.put((job_id, fraction, info))
+
+    progress(0.0, {})
+    return run_job(kind, params, ReplicaCRUDOperations(snapshot_path=snapshot_path), progress)
+
+
+@dataclass
+class JobState:
+    job_id: str
+    kind: str
+    input_hash: str
+    data_version: str
+    params: Dict[str, Any]
+    status: str = "queued"
+    progress: float = 0.0
+    info: Dict[str, Any] = field(default_factory=dict)
+    result: Any = None
+    error: Optional[str] = None
+    revision: int = 0
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    future: Any = None
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "input_hash": self.input_hash,
+            "data_version": self.data_version,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "info": self.info,
+            "params": self.params,
+            "result": self.result if include_result else None,
+            "error": self.error,
+            "revision": self.revision,
+            "cancel_requested": self.cancel_event.is_set(),
+            "cached": False
+        }
+
+
+class JobManager:
+    """Submits, tracks, persists and cancels optimization jobs"""
+
+    def __init__(self, executor: str = JOB_EXECUTOR, workers: int = JOB_WORKERS):
+        if executor not in ("thread", "process"):
+            raise ValueError("PARETO_JOB_EXECUTOR must be 'thread' or 'process'")
+        self.executor = executor
+        # Own cursor, shared by request threads and pool callbacks under the lock
+        self.crud = get_crud().for_thread()
+        self.lock = threading.RLock()
+        self.jobs: Dict[str, JobState] = {}
+        self._data_version = (None, None)  # (write generation, data version) last fingerprinted
+
+        if executor == "process":
+            context = multiprocessing.get_context("spawn")
+            self._mp_manager = context.Manager()
+            self._updates = self._mp_manager.Queue()
+            self._cancelled = self._mp_manager.dict()
+            self._snapshot_version = None
+            self.pool = ProcessPoolExecutor(workers, mp_context=context)
+            threading.Thread(target=self._drain_updates, daemon=True).start()
+        else:
+            self.pool = ThreadPoolExecutor(workers, thread_name_prefix="pareto-job")
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Start a job, or answer from a stored or in-flight job with identical inputs and data"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"kind must be one of {', '.join(JOB_KINDS)}")
+        key = input_hash(kind, params)
+
+        with self.lock:
+            version = self._current_data_version()
+            for job in self.jobs.values():
+                if (job.kind, job.input_hash, job.data_version) == (kind, key, version) and job.status not in FINAL_STATUSES:
+                    return job.to_dict()
+
+            stored = self.crud.get_completed_optimization_job(kind, key, version)
+            if stored:
+                return {**stored, "cached": True}
+
+            job = JobState(uuid.uuid4().hex, kind, key, version, params)
+            self.crud.create_optimization_job(job.job_id, kind, key, version, params)
+            self.jobs[job.job_id] = job
+            job.future = self._start(job)
+            job.future.add_done_callback(lambda future, job=job: self._finish(job, future))
+            return job.to_dict()
+
+    def _current_data_version(self) -> str:
+        """Data version, fingerprinted again only when a write has moved the write generation"""
+        generation = self.crud.get_write_generation()
+        if self._data_version[0] != generation:
+            self._data_version = (generation, self.crud.get_data_version())
+        return self._data_version[1]
+
+    def get(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        """Live state of a job, falling back to the stored record"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return job.to_dict(include_result)
+            stored = self.crud.get_optimization_job(job_id)
+        if stored and not include_result:
+            stored["result"] = None
+        return stored
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Drop a queued job or stop a running one at its next progress report"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINAL_STATUSES:
+                return self.get(job_id)
+            job.cancel_event.set()
+            if self.executor == "process":
+                self._cancelled[job_id] = True
+            job.revision += 1
+            job.future.cancel()
+            return job.to_dict()
+
+    def _start(self, job: JobState):
+        if self.executor == "process":
+            return self.pool.submit(
+                _run_in_process, job.job_id, job.kind, job.params,
+                self._snapshot_path(job.data_version), self._updates, self._cancelled
+            )
+        return self.pool.submit(self._run_in_thread, job)
+
+    def _run_in_thread(self, job: JobState) -> Dict[str, Any]:
+        def progress(fraction, info):
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            self._update(job, progress=fraction, info=info)
+
+        progress(0.0, {})
+        return run_job(job.kind, job.params, get_crud().for_thread(), progress)
+
+    def _snapshot_path(self, data_version: str) -> str:
+        """Snapshot read by process workers, republished when the data has changed"""
+        if hasattr(self.crud, "snapshot_path"):
+            return self.crud.snapshot_path  # single-writer mode: the writer keeps it current
+        if data_version != self._snapshot_version:
+            from db.writer import publish_snapshot
+            publish_snapshot(self.crud._get_connection(), JOB_SNAPSHOT_PATH)
+            self._snapshot_version = data_version
+        return JOB_SNAPSHOT_PATH
+
+    def _drain_updates(self):
+        while True:
+            try:
+                job_id, fraction, info = self._updates.get()
+            except (EOFError, OSError):
+                return  # the manager process has shut down
+            job = self.jobs.get(job_id)
+            if job is not None:
+                self._update(job, progress=fraction, info=info)
+
+    def _finish(self, job: JobState, future):
+        try:
+            result = future.result()
+        except (JobCancelled, CancelledError):
+            self._update(job, status="cancelled")
+        except Exception as e:
+            self._update(job, status="failed", error=f"{type(e).__name__}: {e}")
+        else:
+            self._update(job, status="completed", progress=1.0, result=result)
+
+        with self.lock:
+            finished = [j for j in self.jobs.values() if j.status in FINAL_STATUSES]
+            for stale in finished[:-MAX_FINISHED_JOBS]:
+                del self.jobs[stale.job_id]
+            if self.executor == "process":
+                self._cancelled.pop(job.job_id, None)
+
+    def _update(self, job: JobState, status: str = None, progress: float = None, info: Dict[str, Any] = None,
+                result: Any = None, error: str = None):
+        """Apply a state change; status changes are persisted"""
+        with self.lock:
+            if job.status in FINAL_STATUSES:
+                return
+            if status is None and job.status == "queued":
+                status = "running"
+            if progress is not None:
+                job.progress = progress
+            if info is not None:
+                job.info = info
+            job.result, job.error = result, error
+            job.revision += 1
+            if status is not None and status != job.status:
+                job.status = status
+                self.crud.update_optimization_job(job.job_id, job.status, job.progress, job.result, job.error)
+
+
+_job_manager = None
+
+
+def get_job_manager() -> JobManager:
+    """Get or create the global job manager"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
@@ -0,0 +1,171 @@
+"""
+Metrics - In-process registry rendered in the Prometheus text format
+
+Counters, gauges and histograms keep one shard per thread: a thread only
+ever writes its own shard, so recording takes no lock and loses no updates,
+and `/metrics` (run_web.py) sums the shards when it renders.
+
+Recorded by the API middleware: request counts, latency and payload size per
+route, requests in flight. Recorded by the DB layer: statement latency and
+rows returned per CRUD method (see db/instrumentation.py), read-memo hits and
+misses (db/crud.py) and the duration of calculation service hot paths.
+"""
+
+import functools
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            self._shards.append(shard)  # list.append is atomic
+        return shard
+
+    def _label_text(self, values: Tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        totals: Dict[Tuple, float] = {}
+        for shard in list(self._shards):
+            for values, value in list(shard.items()):
+                totals[values] = totals.get(values, 0.0) + value
+        return [f"{self.name}{self._label_text(values)} {_number(value)}" for values, value in sorted(totals.items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge built from per-thread deltas, so inc/dec may happen on different threads"""
+    kind = "gauge"
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def dec(self, labels: Tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, labels: Tuple = ()):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            entry = shard[labels] = [0] * len(self.buckets) + [0, 0.0]  # bucket counts, count, sum
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+                break
+        entry[-2] += 1
+        entry[-1] += value
+
+    def _samples(self) -> List[str]:
+        totals: Dict[Tuple, list] = {}
+        for shard in list(self._shards):
+            for values, entry in list(shard.items()):
+                total = totals.setdefault(values, [0] * len(entry))
+                for i, value in enumerate(entry):
+                    total[i] += value
+
+        lines = []
+        for values, entry in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._label_text(values, le)} {entry[-2]}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {entry[-2]}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {_number(entry[-1])}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "pareto_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status")))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "pareto_http_request_duration_seconds", "HTTP request latency", ("route", "method")))
+HTTP_RESPONSE_BYTES = REGISTRY.register(Histogram(
+    "pareto_http_response_size_bytes", "HTTP response payload size", ("route", "method"), SIZE_BUCKETS))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "pareto_http_requests_in_flight", "HTTP requests being served"))
+DB_STATEMENT_SECONDS = REGISTRY.register(Histogram(
+    "pareto_db_statement_duration_seconds", "DuckDB statement latency by CRUD method", ("method",)))
+DB_ROWS_RETURNED = REGISTRY.register(Counter(
+    "pareto_db_rows_returned_total", "Rows fetched from DuckDB by CRUD method", ("method",)))
+READ_MEMO_LOOKUPS = REGISTRY.register(Counter(
+    "pareto_read_memo_lookups_total", "Request-scoped CRUD read memo lookups", ("result",)))
+SERVICE_CALL_SECONDS = REGISTRY.register(Histogram(
+    "pareto_service_call_duration_seconds", "Duration of calculation service hot paths", ("method",)))
+
+
+def timed(histogram: Histogram = SERVICE_CALL_SECONDS):
+    """Decorator recording a function's duration, labelled with its qualified name"""
+    def decorator(func):
+        label = (func.__qualname__,)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, label)
+        return wrapper
+    return decorator
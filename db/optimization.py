@@ -0,0 +1,672 @@
+"""
+Optimization - Allocation search on top of the calculation service
+
+Horizon planning (optimize_horizon)
+-----------------------------------
+A contract's tier in month t is picked from its effective volume: the SUM or
+AVG of its allocated volume over months t-lookback..t (contract_lookups). An
+allocation made in one month therefore also moves the tier of the following
+months, which a single-period optimization cannot see.
+
+The optimizer plans one percentage split per (product, item, month) over a
+forecast horizon and minimizes the total cost of the whole horizon:
+
+- A lane is one product item with its process demand per month and the
+  contracts (one per provider) that can serve it.
+- Per contract and month the plan keeps the allocated volume, the effective
+  volume and the cost of that month's volume at every tier. Moving a share
+  of one lane-month from provider a to provider b only touches those two
+  contracts in months t..t+lookback, so a move is priced in O(lookback)
+  instead of re-pricing the horizon.
+- Local search applies the best improving share move per lane-month, sweep
+  after sweep, from the current allocations and from a consolidated start,
+  and keeps the cheaper result.
+
+Cost / concentration frontier (compute_frontier)
+------------------------------------------------
+Candidate allocations trade cost against concentration: for each pool of the
+k best-priced providers and each cap on a single provider's share, lanes are
+filled cheapest-first within the caps. All candidates are priced in one batch
+by AllocationCostModel and pruned with an incremental skyline, keeping the
+points no other candidate beats on total cost, maximum provider share and
+number of providers at once.
+
+Sensitivity (compute_sensitivity)
+---------------------------------
+For every (product, provider) cell, the cost change of shifting one
+percentage point of the product's volume to or from every alternative
+provider. Contract volumes and per-tier costs are computed once; each shift
+then only re-tiers the two contracts it touches, which captures tier
+crossings without a full cost call per pair.
+"""
+
+import time
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from db.crud import get_crud
+from db.calculation import AllocationCostModel, CalculationService, get_calculation_service
+
+EPSILON = 1e-9
+
+# Caps on a single provider's share of the volume tried by compute_frontier
+DEFAULT_SHARE_CAPS = [1.0, 0.8, 0.7, 0.6, 0.5, 0.4, 0.34, 0.25, 0.2, 0.15, 0.1]
+
+
+def _dominates(a: tuple, b: tuple) -> bool:
+    return all(x <= y for x, y in zip(a, b)) and a != b
+
+
+def skyline_insert(frontier: List[Dict[str, Any]], point: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Add point to a non-dominated set, dropping the points it dominates (objectives minimized)"""
+    if any(p['objectives'] == point['objectives'] or _dominates(p['objectives'], point['objectives']) for p in frontier):
+        return frontier
+    return [p for p in frontier if not _dominates(point['objectives'], p['objectives'])] + [point]
+
+
+def shift_month(year: int, month: int, offset: int) -> tuple:
+    """Return (year, month) offset months away"""
+    index = year * 12 + (month - 1) + offset
+    return index // 12, index % 12 + 1
+
+
+class HorizonPlan:
+    """
+    Allocation state over the horizon with incremental cost bookkeeping.
+
+    Args:
+        lanes: Dicts with 'demand' (units per month) and 'options'
+            (provider_id -> (contract index, price per tier incl. multiplier))
+        contracts: Dicts with 'thresholds', 'n_tiers', 'fixed_tier' (index or None),
+            'lookback', 'divisors' and 'history' (pre-horizon volume inside each month's window)
+        shares: Per lane, per month {provider_id: share of demand}
+    """
+
+    def __init__(self, lanes: List[Dict[str, Any]], contracts: List[Dict[str, Any]], shares: List[List[Dict[int, float]]]):
+        self.lanes = lanes
+        self.contracts = contracts
+        self.months = len(lanes[0]['demand']) if lanes else 0
+        self.shares = [[dict(month_shares) for month_shares in lane_shares] for lane_shares in shares]
+
+        T = self.months
+        self.volume = [[0.0] * T for _ in contracts]
+        self.priced = [[[0.0] * c['n_tiers'] for _ in range(T)] for c in contracts]
+        for lane, lane_shares in zip(lanes, self.shares):
+            for t, month_shares in enumerate(lane_shares):
+                for provider_id, share in month_shares.items():
+                    ci, prices = lane['options'][provider_id]
+                    units = share * lane['demand'][t]
+                    self.volume[ci][t] += units
+                    priced = self.priced[ci][t]
+                    for k, price in enumerate(prices):
+                        priced[k] += units * price
+
+        # Rolling windows evaluated once per contract with a prefix sum
+        self.effective = []
+        self.cost = []
+        for ci, c in enumerate(contracts):
+            prefix = [0.0]
+            for v in self.volume[ci]:
+                prefix.append(prefix[-1] + v)
+            effective = [
+                (c['history'][t] + prefix[t + 1] - prefix[max(0, t - c['lookback'])]) / c['divisors'][t]
+                for t in range(T)
+            ]
+            self.effective.append(effective)
+            self.cost.append([self.priced[ci][t][self.tier_index(ci, effective[t])] for t in range(T)])
+
+    def tier_index(self, ci: int, effective_volume: float) -> int:
+        c = self.contracts[ci]
+        if c['fixed_tier'] is not None:
+            return c['fixed_tier']
+        return min(bisect_right(c['thresholds'], effective_volume), c['n_tiers'] - 1)
+
+    def total_cost(self) -> float:
+        return sum(sum(costs) for costs in self.cost)
+
+    def monthly_costs(self) -> List[float]:
+        return [sum(costs[t] for costs in self.cost) for t in range(self.months)]
+
+    def _contract_delta(self, ci: int, t: int, units: float, prices: List[float], apply: bool = False) -> float:
+        """Cost change of adding units (negative to remove) to contract ci in month t"""
+        c = self.contracts[ci]
+        delta = 0.0
+        for s in range(t, min(self.months, t + c['lookback'] + 1)):
+            effective = self.effective[ci][s] + units / c['divisors'][s]
+            priced = self.priced[ci][s]
+            k = self.tier_index(ci, effective)
+            new_cost = priced[k] + units * prices[k] if s == t else priced[k]
+            delta += new_cost - self.cost[ci][s]
+            if apply:
+                self.effective[ci][s] = effective
+                self.cost[ci][s] = new_cost
+        if apply:
+            self.volume[ci][t] += units
+            priced = self.priced[ci][t]
+            for k, price in enumerate(prices):
+                priced[k] += units * price
+        return delta
+
+    def move_delta(self, li: int, t: int, source: int, target: int, share: float, apply: bool = False) -> float:
+        """Cost change of moving a share of lane li's month t demand from source to target provider"""
+        lane = self.lanes[li]
+        units = share * lane['demand'][t]
+        source_ci, source_prices = lane['options'][source]
+        target_ci, target_prices = lane['options'][target]
+        delta = self._contract_delta(source_ci, t, -units, source_prices, apply)
+        delta += self._contract_delta(target_ci, t, units, target_prices, apply)
+        if apply:
+            month_shares = self.shares[li][t]
+            month_shares[source] -= share
+            if month_shares[source] <= EPSILON:
+                del month_shares[source]
+            month_shares[target] = month_shares.get(target, 0.0) + share
+        return delta
+
+    def improve(self, share_step: float, max_sweeps: int, on_sweep: Optional[Callable[[int, float], None]] = None) -> Dict[str, int]:
+        """Best-improvement local search over (lane, month) share moves; on_sweep(sweeps, total cost) after each pass"""
+        sweeps = moves = 0
+        while sweeps < max_sweeps:
+            sweeps += 1
+            improved = False
+            for li, lane in enumerate(self.lanes):
+                if len(lane['options']) < 2:
+                    continue
+                for t in range(self.months):
+                    if lane['demand'][t] <= 0:
+                        continue
+                    best_delta, best_move = -EPSILON, None
+                    for source, held in list(self.shares[li][t].items()):
+                        for share in {held, min(held, share_step)}:
+                            for target in lane['options']:
+                                if target == source:
+                                    continue
+                                delta = self.move_delta(li, t, source, target, share)
+                                if delta < best_delta:
+                                    best_delta, best_move = delta, (source, target, share)
+                    if best_move:
+                        self.move_delta(li, t, *best_move, apply=True)
+                        moves += 1
+                        improved = True
+            if on_sweep:
+                on_sweep(sweeps, self.total_cost())
+            if not improved:
+                break
+        return {'sweeps': sweeps, 'moves': moves}
+
+
+class OptimizationService:
+    """Service for multi-month and multi-objective allocation optimization"""
+
+    def __init__(self, crud=None):
+        self.crud = crud or get_crud()
+        self.calc = CalculationService(crud) if crud else get_calculation_service()
+
+    def prepare_horizon(self, start_year: Optional[int], start_month: Optional[int], months: int,
+                        product_ids: Optional[List[int]] = None, use_manual_tiers: bool = False) -> tuple:
+        """
+        Collect the horizon inputs shared by planning and simulation.
+
+        Returns (horizon, lanes, contracts): the (year, month) list, lanes with
+        forecast 'demand', 'options' (provider_id -> (contract index, prices))
+        and 'baseline' shares, and contracts with tier breakpoints, lookback
+        strategy and the pre-horizon volume inside each month's window.
+        """
+        now = datetime.now()
+        start = (start_year or now.year, start_month or now.month)
+        horizon = [shift_month(start[0], start[1], t) for t in range(months)]
+        if product_ids is None:
+            product_ids = [p['product_id'] for p in self.calc.get_all_active_products()]
+
+        lanes, curves = self.calc.build_allocation_lanes(product_ids)
+        contract_ids = list(dict.fromkeys(contract_id for lane in lanes for contract_id, _ in lane['options'].values()))
+        lookups = self.crud.get_contract_lookups_for_contracts(contract_ids)
+
+        max_lookback = max([lookup['lookback_months'] for lookup in lookups.values() if lookup] or [0])
+        history_start = shift_month(start[0], start[1], -max_lookback)
+        forecasts = self.crud.get_monthly_units('forecasts', product_ids, history_start, horizon[-1])
+        actuals = self.crud.get_monthly_units('actuals', product_ids, history_start, shift_month(start[0], start[1], -1)) if max_lookback else {}
+
+        # Contracts: tier breakpoints and lookback strategy
+        contracts = []
+        contract_index = {}
+        for contract_id in contract_ids:
+            curve = curves[contract_id]
+            lookup = lookups[contract_id] or {'source': 'actuals', 'method': 'SUM', 'lookback_months': 0}
+            contract_index[contract_id] = len(contracts)
+            contracts.append({
+                'contract_id': contract_id,
+                'curve': curve,
+                'thresholds': curve.thresholds,
+                'n_tiers': len(curve.tier_numbers),
+                'fixed_tier': curve.tier_index(0, use_manual_tiers=True) if use_manual_tiers and curve.selected_tier is not None else None,
+                'lookback': lookup['lookback_months'],
+                'method': lookup['method'],
+                'source': lookup['source'],
+                'history_volume': {},  # pre-horizon month offset -> allocated volume
+            })
+
+        # Lanes: demand over the horizon and price per tier for every serving contract
+        plan_lanes = []
+        for lane in lanes:
+            options = {
+                provider_id: (contract_index[contract_id], prices)
+                for provider_id, (contract_id, prices) in lane['options'].items()
+            }
+            shares = lane['current_shares']
+            demand = [float(forecasts.get((lane['product_id'], lane['process_id'], y, m), 0)) for y, m in horizon]
+            plan_lanes.append({**lane, 'options': options, 'demand': demand, 'baseline': shares})
+
+            # Pre-horizon volume inside the lookback windows, split by current allocations
+            for provider_id, share in shares.items():
+                c = contracts[options[provider_id][0]]
+                source_units = forecasts if c['source'] == 'forecasts' else actuals
+                for offset in range(-c['lookback'], 0):
+                    y, m = shift_month(start[0], start[1], offset)
+                    units = source_units.get((lane['product_id'], lane['process_id'], y, m))
+                    if units is not None:
+                        c['history_volume'][offset] = c['history_volume'].get(offset, 0.0) + units * share
+
+        for c in contracts:
+            c['history'], c['divisors'] = [], []
+            for t in range(months):
+                window = range(t - c['lookback'], 0)
+                c['history'].append(sum(c['history_volume'].get(offset, 0.0) for offset in window))
+                if c['method'] == 'AVG':
+                    # Like the pricing view, AVG only counts months that have data
+                    c['divisors'].append(sum(1 for offset in window if offset in c['history_volume']) + t - max(0, t - c['lookback']) + 1)
+                else:
+                    c['divisors'].append(1)
+
+        return horizon, plan_lanes, contracts
+
+    def optimize_horizon(self, start_year: Optional[int] = None, start_month: Optional[int] = None, months: int = 12,
+                         product_ids: Optional[List[int]] = None, use_manual_tiers: bool = False,
+                         share_step: float = 0.1, max_sweeps: int = 20, progress: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Plan monthly allocations that minimize total cost over a forecast horizon.
+
+        Demand comes from forecasts. Tiers follow each contract's lookup
+        strategy; months before the horizon contribute their actuals or
+        forecasts (per the strategy's source) split by the current allocations.
+        Items without a current allocation start on their cheapest provider.
+
+        Args:
+            start_year, start_month: First planned month (defaults to the current month)
+            months: Horizon length
+            product_ids: Products to plan (defaults to all active products)
+            use_manual_tiers: Keep manually selected tiers fixed instead of volume-based ones
+            share_step: Smallest share moved between providers in one step
+            max_sweeps: Upper bound on local search passes
+            progress: Optional callback(fraction, info) reporting the best cost so far
+        """
+        started = time.perf_counter()
+        horizon, plan_lanes, contracts = self.prepare_horizon(start_year, start_month, months, product_ids, use_manual_tiers)
+
+        baseline = [[dict(lane['baseline']) for _ in horizon] for lane in plan_lanes]
+        # Consolidated start: every lane on the provider with the best achievable price
+        consolidated = [[{min(lane['options'], key=lambda pid: min(lane['options'][pid][1])): sum(lane['baseline'].values())} for _ in horizon] for lane in plan_lanes]
+
+        baseline_plan = HorizonPlan(plan_lanes, contracts, baseline)
+        best, stats = None, {'sweeps': 0, 'moves': 0}
+        starts = (('current', baseline), ('consolidated', consolidated))
+        for index, (name, start_shares) in enumerate(starts):
+            plan = HorizonPlan(plan_lanes, contracts, start_shares)
+
+            def on_sweep(sweeps, cost, index=index, name=name):
+                best_cost = min(cost, best.total_cost()) if best else cost
+                progress((index + sweeps / max_sweeps) / len(starts), {
+                    'start': name,
+                    'sweeps': sweeps,
+                    'baseline_cost': round(baseline_plan.total_cost(), 2),
+                    'best_cost': round(best_cost, 2)
+                })
+
+            run = plan.improve(share_step, max_sweeps, on_sweep if progress else None)
+            stats = {key: stats[key] + run[key] for key in stats}
+            if best is None or plan.total_cost() < best.total_cost() - EPSILON:
+                best = plan
+        # Rebuild from the final shares so reported costs carry no incremental rounding
+        best = HorizonPlan(plan_lanes, contracts, best.shares) if plan_lanes else baseline_plan
+
+        return self._format_horizon_result(horizon, plan_lanes, contracts, baseline_plan, best, stats, started)
+
+    def _format_horizon_result(self, horizon, lanes, contracts, baseline_plan: HorizonPlan, plan: HorizonPlan,
+                               stats: Dict[str, int], started: float) -> Dict[str, Any]:
+        labels = [f"{y}-{m:02d}" for y, m in horizon]
+        provider_names = {p['provider_id']: p['provider_name'] for lane in lanes for p in lane['providers']}
+
+        # Per month in the nested product structure accepted by calculate_cost_with_allocations
+        allocations = {label: {} for label in labels}
+        for li, lane in enumerate(lanes):
+            for t, label in enumerate(labels):
+                product = allocations[label].setdefault(lane['product_id'], {'product_name': lane['product_name'], 'items': {}})
+                product['items'][lane['item_id']] = {
+                    'mode': 'percentage',
+                    'allocations': [
+                        {'provider_id': provider_id, 'provider_name': provider_names[provider_id], 'value': round(share * 100, 2)}
+                        for provider_id, share in sorted(plan.shares[li][t].items()) if share > EPSILON
+                    ]
+                }
+
+        contracts_out = []
+        for ci, c in enumerate(contracts):
+            if not any(plan.volume[ci]) and not any(baseline_plan.volume[ci]):
+                continue
+            curve = c['curve']
+            contracts_out.append({
+                'contract_id': c['contract_id'],
+                'strategy_label': f"{c['method']} {c['lookback'] + 1}mo",
+                'source': c['source'],
+                'months': [
+                    {
+                        'month': label,
+                        'volume': round(plan.volume[ci][t], 2),
+                        'effective_volume': round(plan.effective[ci][t], 2),
+                        'tier': curve.tier_numbers[plan.tier_index(ci, plan.effective[ci][t])],
+                        'baseline_tier': curve.tier_numbers[baseline_plan.tier_index(ci, baseline_plan.effective[ci][t])],
+                        'cost': round(plan.cost[ci][t], 2)
+                    }
+                    for t, label in enumerate(labels)
+                ]
+            })
+
+        baseline_total = baseline_plan.total_cost()
+        optimized_total = plan.total_cost()
+        savings = baseline_total - optimized_total
+        return {
+            'horizon': labels,
+            'baseline': {'total_cost': round(baseline_total, 2), 'monthly_costs': [round(c, 2) for c in baseline_plan.monthly_costs()]},
+            'optimized': {'total_cost': round(optimized_total, 2), 'monthly_costs': [round(c, 2) for c in plan.monthly_costs()]},
+            'savings': {
+                'amount': round(savings, 2),
+                'percent': round(savings / baseline_total * 100, 2) if baseline_total > 0 else 0
+            },
+            'allocations': allocations,
+            'contracts': contracts_out,
+            'stats': {
+                'lanes': len(lanes),
+                'contracts': len(contracts),
+                **stats,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+        }
+
+    def _solo_unit_price(self, model: AllocationCostModel, provider_id: int) -> float:
+        """Blended price a provider reaches when given every lane it can serve"""
+        shares = [{provider_id: sum(lane['current_shares'].values())} if provider_id in lane['options'] else {} for lane in model.lanes]
+        result = model.evaluate(shares)
+        volume = result['provider_volumes'].get(provider_id, 0.0)
+        return result['total_cost'] / volume if volume > 0 else float('inf')
+
+    def _capped_allocation(self, model: AllocationCostModel, pool: List[int], cap: float) -> List[Dict[int, float]]:
+        """
+        Fill lanes cheapest-first from a provider pool without exceeding cap x total volume per provider.
+
+        Prices are read at the tier each contract is expected to reach: first
+        from the volume it could win under the cap, then from the volumes of
+        the first pass. Lanes no pool provider serves go to their cheapest option.
+        """
+        capacity = cap * model.total_volume
+        coverable = {}
+        for lane, volume in zip(model.lanes, model.volumes):
+            for provider_id, (contract_id, _) in lane['options'].items():
+                if provider_id in pool:
+                    coverable[contract_id] = coverable.get(contract_id, 0.0) + volume
+        expected_volumes = {contract_id: min(capacity, volume) for contract_id, volume in coverable.items()}
+        order = sorted(range(len(model.lanes)), key=lambda i: -model.volumes[i])
+
+        shares = []
+        for _ in range(2):
+            tiers = {
+                contract_id: model.curves[contract_id].tier_index(expected_volumes.get(contract_id, 0.0), model.use_manual_tiers)
+                for contract_id in coverable
+            }
+            remaining = {provider_id: capacity for provider_id in pool}
+            shares = [{} for _ in model.lanes]
+            for i in order:
+                lane, volume = model.lanes[i], model.volumes[i]
+                left = sum(lane['current_shares'].values())
+                options = sorted(
+                    (pid for pid in pool if pid in lane['options']),
+                    key=lambda pid: lane['options'][pid][1][tiers[lane['options'][pid][0]]]
+                )
+                if not options:
+                    shares[i] = {min(lane['options'], key=lambda pid: lane['options'][pid][1][0]): left}
+                    continue
+                for provider_id in options:
+                    take = min(left, remaining[provider_id] / volume)
+                    if take <= EPSILON:
+                        continue
+                    shares[i][provider_id] = take
+                    remaining[provider_id] -= take * volume
+                    left -= take
+                    if left <= EPSILON:
+                        break
+                if left > EPSILON:
+                    # Caps exhausted by rounding or infeasible pool: overflow to the cheapest option
+                    shares[i][options[0]] = shares[i].get(options[0], 0.0) + left
+            expected_volumes = model.contract_volumes(shares)
+        return shares
+
+    def _frontier_point(self, model: AllocationCostModel, label: str, shares, result: Dict[str, Any]) -> Dict[str, Any]:
+        volume = sum(result['provider_volumes'].values())
+        used = {pid: v for pid, v in result['provider_volumes'].items() if v > EPSILON}
+        max_share = max(used.values()) / volume if volume > 0 else 0.0
+        total_cost = round(result['total_cost'], 2)
+        return {
+            'label': label,
+            'objectives': (total_cost, round(max_share, 4), len(used)),
+            'total_cost': total_cost,
+            'max_provider_share': round(max_share * 100, 2),
+            'provider_count': len(used),
+            'providers': [
+                {
+                    'provider_id': pid,
+                    'share': round(v / volume * 100, 2),
+                    'cost': round(result['provider_costs'][pid], 2)
+                }
+                for pid, v in sorted(used.items(), key=lambda x: -x[1])
+            ],
+            'shares': shares
+        }
+
+    def compute_frontier(self, product_quantities: Dict[Any, int], use_manual_tiers: bool = False,
+                         max_providers: Optional[int] = None, share_caps: Optional[List[float]] = None,
+                         progress: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Non-dominated allocations over total cost, maximum single-provider share and provider count.
+
+        Args:
+            product_quantities: Dict of product_id -> quantity
+            use_manual_tiers: Use manually selected tiers instead of volume-based ones
+            max_providers: Largest provider pool to consider (defaults to all)
+            share_caps: Caps on one provider's share of volume, as fractions
+            progress: Optional callback(fraction, info) reporting the frontier so far
+        """
+        started = time.perf_counter()
+        model = self.calc.build_cost_model(product_quantities, use_manual_tiers)
+        provider_names = {p['provider_id']: p['provider_name'] for lane in model.lanes for p in lane['providers']}
+        ranking = sorted({pid for lane in model.lanes for pid in lane['options']}, key=lambda pid: self._solo_unit_price(model, pid))
+        max_providers = min(max_providers or len(ranking), len(ranking))
+
+        frontier = []
+        current = None
+        candidate_count = 0
+
+        def add_batch(batch):
+            # Price one batch and fold it into the skyline
+            nonlocal frontier, current, candidate_count
+            for (label, shares), result in zip(batch, model.evaluate_batch([shares for _, shares in batch])):
+                point = self._frontier_point(model, label, shares, result)
+                current = current or point
+                frontier = skyline_insert(frontier, point)
+            candidate_count += len(batch)
+
+        add_batch([('Current allocation', model.current_shares())])
+        for k in range(1, max_providers + 1):
+            batch = []
+            for cap in sorted(set(share_caps or DEFAULT_SHARE_CAPS), reverse=True):
+                if cap * k < 1 - EPSILON:
+                    continue  # the pool cannot absorb the volume under this cap
+                label = f"{k} best-priced provider{'s' if k > 1 else ''}" + (f", max {cap:.0%} each" if cap < 1 else "")
+                batch.append((label, self._capped_allocation(model, ranking[:k], cap)))
+            add_batch(batch)
+            if progress:
+                progress(k / max_providers, {
+                    'candidates': candidate_count,
+                    'frontier_size': len(frontier),
+                    'best_cost': min(p['total_cost'] for p in frontier)
+                })
+
+        frontier.sort(key=lambda p: p['objectives'])
+        for point in [current] + frontier:
+            for provider in point['providers']:
+                provider['provider_name'] = provider_names.get(provider['provider_id'], 'Unknown')
+        for point in frontier:
+            point['allocations'] = model.to_allocations(point['shares'])
+            point['is_current'] = point is current
+
+        def public(point):
+            return {k: v for k, v in point.items() if k not in ('objectives', 'shares')}
+
+        return {
+            'objectives': ['total_cost', 'max_provider_share', 'provider_count'],
+            'current': public(current) if current else None,
+            'frontier': [public(point) for point in frontier],
+            'stats': {
+                'lanes': len(model.lanes),
+                'providers': len(ranking),
+                'candidates': candidate_count,
+                'frontier_size': len(frontier),
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+        }
+
+    def compute_sensitivity(self, product_quantities: Dict[Any, int], use_manual_tiers: bool = False,
+                            step: float = 1.0, progress: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Cost delta of shifting step percentage points between every pair of providers per product.
+
+        A shift moves step% of each item's volume (or what the source holds,
+        if less) on every item both providers can serve.
+
+        Args:
+            product_quantities: Dict of product_id -> quantity
+            use_manual_tiers: Use manually selected tiers instead of volume-based ones
+            step: Percentage points to shift
+            progress: Optional callback(fraction, info) after each product
+        """
+        started = time.perf_counter()
+        model = self.calc.build_cost_model(product_quantities, use_manual_tiers)
+        shares = model.current_shares()
+        state = model.contract_state(shares)
+        base = model.evaluate(shares)
+        provider_names = {p['provider_id']: p['provider_name'] for lane in model.lanes for p in lane['providers']}
+        fraction = step / 100.0
+
+        lanes_by_product = {}
+        for li, lane in enumerate(model.lanes):
+            lanes_by_product.setdefault(lane['product_id'], []).append(li)
+
+        products = []
+        best_moves = []
+        evaluated = 0
+        for done, (product_id, lane_indexes) in enumerate(lanes_by_product.items(), 1):
+            product_volume = sum(model.volumes[li] for li in lane_indexes)
+            providers = sorted({pid for li in lane_indexes for pid in model.lanes[li]['options']})
+            held = {pid: sum(model.volumes[li] * shares[li].get(pid, 0.0) for li in lane_indexes) for pid in providers}
+
+            # deltas[(source, target)] = (cost delta, units moved, tier crossings)
+            deltas = {}
+            for source in providers:
+                if held[source] <= EPSILON:
+                    continue
+                for target in providers:
+                    if target == source:
+                        continue
+                    changes = {}
+                    moved = 0.0
+                    for li in lane_indexes:
+                        lane = model.lanes[li]
+                        share = min(shares[li].get(source, 0.0), fraction)
+                        if share <= EPSILON or target not in lane['options']:
+                            continue
+                        units = model.volumes[li] * share
+                        moved += units
+                        for provider_id, sign in ((source, -1), (target, 1)):
+                            contract_id, prices = lane['options'][provider_id]
+                            volume_change, priced_change = changes.get(contract_id, (0.0, [0.0] * len(prices)))
+                            changes[contract_id] = (
+                                volume_change + sign * units,
+                                [p + sign * units * price for p, price in zip(priced_change, prices)]
+                            )
+                    if moved <= EPSILON:
+                        continue
+                    delta, crossings = model.shift_delta(state, changes)
+                    deltas[(source, target)] = (delta, moved, crossings)
+                    evaluated += 1
+
+            def move(provider_id, delta, moved, crossings):
+                return {
+                    'provider_id': provider_id,
+                    'provider_name': provider_names.get(provider_id, 'Unknown'),
+                    'delta': round(delta, 2),
+                    'delta_per_unit': round(delta / moved, 4),
+                    'units_moved': round(moved, 2),
+                    'tier_crossings': crossings
+                }
+
+            cells = []
+            for pid in providers:
+                cells.append({
+                    'provider_id': pid,
+                    'provider_name': provider_names.get(pid, 'Unknown'),
+                    'share': round(held[pid] / product_volume * 100, 2) if product_volume > 0 else 0.0,
+                    # -step%: pid gives volume to each alternative
+                    'decrease': sorted((move(t, *deltas[(s, t)]) for (s, t) in deltas if s == pid), key=lambda m: m['delta']),
+                    # +step%: pid takes volume from each alternative
+                    'increase': sorted((move(s, *deltas[(s, t)]) for (s, t) in deltas if t == pid), key=lambda m: m['delta'])
+                })
+            products.append({
+                'product_id': product_id,
+                'product_name': model.lanes[lane_indexes[0]]['product_name'],
+                'cells': cells
+            })
+            for (s, t), (delta, moved, crossings) in deltas.items():
+                best_moves.append({
+                    'product_id': product_id,
+                    'from_provider_id': s,
+                    'to_provider_id': t,
+                    'delta': round(delta, 2),
+                    'tier_crossings': crossings
+                })
+            if progress:
+                progress(done / len(lanes_by_product), {
+                    'products_done': done,
+                    'best_delta': min((m['delta'] for m in best_moves), default=0.0)
+                })
+
+        best_moves.sort(key=lambda m: m['delta'])
+        return {
+            'step': step,
+            'total_cost': round(base['total_cost'], 2),
+            'products': products,
+            'best_moves': best_moves[:20],
+            'stats': {
+                'shifts_evaluated': evaluated,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+        }
+
+
+# Global optimization service instance
+_optimization_service = None
+
+def get_optimization_service():
+    """Get or create the global optimization service instance"""
+    global _optimization_service
+    if _optimization_service is None:
+        _optimization_service = OptimizationService()
+    return _optimization_service
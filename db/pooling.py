@@ -0,0 +1,82 @@
+"""
+Volume Pooling - Contract volumes across all products
+
+Tiers are negotiated per contract, so the tier a contract reaches in a month
+depends on the volume every product sends to it, not on a single product's
+share. `CRUDOperations.get_pooled_contract_volumes` computes those monthly
+volumes for all contracts in one grouped query (units split by the saved
+allocations, as in the pricing table); this service applies each contract's
+lookup strategy on top so that the pricing view, the pricing history (via
+cost_cube) and the calculation service determine tiers from the same volumes.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from db.crud import get_crud
+
+
+class VolumePoolingService:
+    """Service for contract volumes pooled across products"""
+
+    def __init__(self, crud=None):
+        self.crud = crud or get_crud()
+
+    def monthly_volumes(self, first: tuple, last: tuple, use_forecasts: bool = False,
+                        contract_ids: Optional[List[int]] = None) -> Dict[tuple, int]:
+        """Pooled volume per (contract_id, year, month) over an inclusive (year, month) range"""
+        source = 'forecasts' if use_forecasts else 'actuals'
+        return self.crud.get_pooled_contract_volumes(source, first, last, contract_ids)
+
+    def tier_volumes(self, year: int, month: int, use_forecasts: bool = False,
+                     contract_ids: Optional[List[int]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Volumes that determine each contract's tier in a month.
+
+        'volume' is the month's pooled volume; 'effective_volume' applies the
+        contract lookup (SUM or AVG over its lookback window, from its source)
+        and falls back to 'volume' when the window has no data.
+
+        Returns {contract_id: {contract_id, volume, effective_volume, strategy_label}}
+        """
+        if contract_ids is None:
+            contract_ids = [c['contract_id'] for c in self.crud.get_all_contracts()]
+        lookups = self.crud.get_contract_lookups_for_contracts(contract_ids)
+
+        period = year * 12 + month - 1
+        max_lookback = max([lookup['lookback_months'] for lookup in lookups.values() if lookup] or [0])
+        first = period - max_lookback
+        bounds = ((first // 12, first % 12 + 1), (year, month))
+        sources = {'forecasts' if use_forecasts else 'actuals'}
+        sources |= {'forecasts' if lookup and lookup['source'] == 'forecasts' else 'actuals' for lookup in lookups.values()}
+        volumes = {source: self.crud.get_pooled_contract_volumes(source, *bounds, contract_ids) for source in sources}
+        month_volumes = volumes['forecasts' if use_forecasts else 'actuals']
+
+        result = {}
+        for contract_id in sorted(contract_ids):
+            lookup = lookups.get(contract_id)
+            volume = month_volumes.get((contract_id, year, month), 0)
+            effective_volume = volume
+            lookback = (lookup['lookback_months'] if lookup else 0) + 1
+            if lookback > 1:
+                history = volumes['forecasts' if lookup['source'] == 'forecasts' else 'actuals']
+                window_volume = self.crud._lookup_volume(history, contract_id, lookup, year, month)
+                if window_volume is not None:
+                    effective_volume = window_volume
+            result[contract_id] = {
+                "contract_id": contract_id,
+                "volume": volume,
+                "effective_volume": effective_volume,
+                "strategy_label": f"{lookup['method'] if lookup else 'SUM'} {lookback}mo"
+            }
+        return result
+
+
+# Global volume pooling service instance
+_volume_pooling_service = None
+
+def get_volume_pooling_service():
+    """Get or create the global volume pooling service instance"""
+    global _volume_pooling_service
+    if _volume_pooling_service is None:
+        _volume_pooling_service = VolumePoolingService()
+    return _volume_pooling_service
@@ -6,10 +6,13 @@ Tables are created if they don't exist.
 """
 
 import duckdb
+import fcntl
 import os
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from dataclasses import dataclass
+from db.instrumentation import InstrumentedConnection
 
 
 @dataclass
@@ -179,6 +182,46 @@ class ProductItemPricing:
     date_last_update: str
 
 
+@dataclass
+class OptimizationJob:
+    job_id: str
+    kind: str  # 'horizon', 'frontier', 'sensitivity' or 'risk'
+    input_hash: str
+    data_version: str
+    status: str  # 'queued', 'running', 'completed', 'failed' or 'cancelled'
+    progress: float
+    params: str  # JSON string with the job parameters
+    result: Optional[str]  # JSON string with the job result
+    error: Optional[str]
+    date_creation: str
+    date_last_update: str
+
+
+@dataclass
+class CostCubeCell:
+    product_id: int
+    process_id: int
+    provider_id: int
+    item_id: int
+    year: int
+    month: int
+    source: str  # 'actuals' or 'forecasts'
+    allocated_units: int
+    pooled_volume: int  # contract volume across all products that month
+    effective_volume: int
+    calculated_tier: int
+    effective_tier: int
+    active_tier: int
+    unit_price: float
+    multiplier: float
+    total_cost: float
+
+
+# Bump whenever a table, column, sequence or migration is added below.
+# Processes that find this version recorded skip the DDL bootstrap entirely.
+SCHEMA_VERSION = 4
+
+
 class DatabaseSchema:
     """Handles all database schema creation and migrations"""
 
@@ -188,12 +231,58 @@ class DatabaseSchema:
 
     def _get_connection(self):
         if self.conn is None:
-            self.conn = duckdb.connect(self.db_path, read_only=False)
+            self.conn = InstrumentedConnection(duckdb.connect(self.db_path, read_only=False))
         return self.conn
 
     def initialize_all(self):
-        """Initialize all database tables and sequences"""
+        """Initialize all database tables and sequences.
+
+        Fast path is a single version check. Otherwise migrations run under an
+        exclusive file lock, re-checking the version once the lock is held so
+        workers that start together apply them exactly once.
+        """
+        if self._schema_is_current():
+            return
+
+        with self._schema_lock():
+            if self._schema_is_current():
+                return
+            self._apply_migrations()
+            self._record_schema_version()
+
+    def _schema_is_current(self) -> bool:
         conn = self._get_connection()
+        try:
+            result = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+        except duckdb.CatalogException:
+            return False
+        return result[0] is not None and result[0] >= SCHEMA_VERSION
+
+    @contextmanager
+    def _schema_lock(self):
+        """Exclusive inter-process lock held while migrations are applied"""
+        with open(f"{self.db_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _record_schema_version(self):
+        conn = self._get_connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                date_applied VARCHAR NOT NULL
+            )
+        """)
+        conn.execute(
+            "INSERT OR IGNORE INTO schema_version (version, date_applied) VALUES (?, ?)",
+            [SCHEMA_VERSION, datetime.now().isoformat()]
+        )
+
+    def _apply_migrations(self):
+        """Create all tables and sequences and run column migrations"""
         self._create_sequences()
         self._create_providers_table()
         self._create_items_table()
@@ -212,6 +301,8 @@ class DatabaseSchema:
         self._create_contract_lookups_table()
         self._create_forecasts_table()
         self._create_actuals_table()
+        self._create_optimization_jobs_table()
+        self._create_cost_cube_tables()
 
     def _create_sequences(self):
         """Create database sequences for auto-incrementing IDs"""
@@ -530,6 +621,67 @@ class DatabaseSchema:
             )
         """)
 
+    def _create_optimization_jobs_table(self):
+        """Create optimization_jobs table if it doesn't exist"""
+        conn = self._get_connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS optimization_jobs (
+                job_id VARCHAR PRIMARY KEY,
+                kind VARCHAR NOT NULL,
+                input_hash VARCHAR NOT NULL,
+                data_version VARCHAR NOT NULL,
+                status VARCHAR NOT NULL,
+                progress DOUBLE DEFAULT 0,
+                params VARCHAR NOT NULL,
+                result VARCHAR,
+                error VARCHAR,
+                date_creation VARCHAR NOT NULL,
+                date_last_update VARCHAR NOT NULL
+            )
+        """)
+
+    def _create_cost_cube_tables(self):
+        """Create cost_cube and its pending-invalidation table if they don't exist"""
+        conn = self._get_connection()
+        create_cube = """
+            CREATE TABLE IF NOT EXISTS cost_cube (
+                product_id INTEGER NOT NULL,
+                process_id INTEGER NOT NULL,
+                provider_id INTEGER NOT NULL,
+                item_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                source VARCHAR NOT NULL,
+                allocated_units INTEGER NOT NULL,
+                pooled_volume INTEGER NOT NULL,
+                effective_volume INTEGER NOT NULL,
+                calculated_tier INTEGER NOT NULL,
+                effective_tier INTEGER NOT NULL,
+                active_tier INTEGER NOT NULL,
+                unit_price DOUBLE NOT NULL,
+                multiplier DOUBLE NOT NULL,
+                total_cost DOUBLE NOT NULL,
+                PRIMARY KEY (product_id, process_id, provider_id, item_id, year, month, source)
+            )
+        """
+        conn.execute(create_cube)
+        # Cubes from before schema version 4 lack pooled_volume; the cells are derived data, so rebuild
+        columns = [col[1] for col in conn.execute("PRAGMA table_info(cost_cube)").fetchall()]
+        if 'pooled_volume' not in columns:
+            conn.execute("DROP TABLE cost_cube")
+            conn.execute(create_cube)
+        # Product month ranges (periods are year * 12 + month - 1, NULL = unbounded) awaiting recomputation
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cost_cube_dirty (
+                product_id INTEGER NOT NULL,
+                first_period INTEGER,
+                last_period INTEGER
+            )
+        """)
+        # A new cube starts out fully pending
+        if conn.execute("SELECT COUNT(*) FROM cost_cube").fetchone()[0] == 0:
+            conn.execute("INSERT INTO cost_cube_dirty SELECT product_id, NULL, NULL FROM products")
+
     def close(self):
         if self.conn:
             self.conn.close()
\ No newline at end of file
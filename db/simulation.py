@@ -0,0 +1,261 @@
+"""
+Cost-Risk Simulation - Monte Carlo cost distributions over forecast uncertainty
+
+Forecasts are point values, but tier cliffs make cost strongly nonlinear in
+volume: the cost of the forecast is not the expected cost. The simulation
+samples volume paths around the forecasts and prices every path with the
+current allocations and each contract's lookup strategy, then reports
+quantiles (e.g. P50/P90) per provider and month.
+
+All paths are evaluated in one batch inside an in-memory DuckDB database:
+
+- units: one row per (path, product/process demand, month). Draws come from
+  a hash of (seed, path, demand, month), so runs are reproducible and safe
+  under DuckDB's parallel execution.
+- Error models: 'lognormal' (relative error sigma with mean 1, optionally
+  correlated across the months of a path) or 'bootstrap' (actual/forecast
+  ratios from history, resampled per month).
+- Per path, contract and month the allocated volume and the cost at every
+  tier are aggregated in one pass; the lookback window comes from a running
+  sum, the tier is picked per row and costs are summed per provider.
+"""
+
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import duckdb
+
+from db.crud import get_crud
+from db.optimization import HorizonPlan, OptimizationService, get_optimization_service
+
+ERROR_MODELS = ("lognormal", "bootstrap")
+DEFAULT_QUANTILES = [0.5, 0.9]
+
+# Hash -> uniform (0, 1) from the top 53 bits -> standard normal (Box-Muller, second
+# uniform from re-hashing; two hashes of neighbouring keys are not independent enough)
+SQL_MACROS = """
+    CREATE MACRO uniform(h) AS ((h >> 11)::DOUBLE + 0.5) / 9007199254740992.0;
+    CREATE MACRO std_normal(h) AS sqrt(-2 * ln(uniform(h))) * cos(2 * pi() * uniform(hash(h)));
+"""
+
+
+def _create_table(conn, name: str, columns: Dict[str, str], rows: List[tuple]):
+    """Create a table and fill it from one JSON parameter (DuckDB binds long parameter lists slowly)"""
+    conn.execute(f"CREATE TABLE {name} ({', '.join(f'{c} {t}' for c, t in columns.items())})")
+    if rows:
+        conn.execute(
+            f"INSERT INTO {name} SELECT * FROM (SELECT unnest(json_transform(?, ?), recursive := true))",
+            [json.dumps([dict(zip(columns, row)) for row in rows]), json.dumps([columns])]
+        )
+
+
+def quantile_label(q: float) -> str:
+    return f"P{q * 100:g}"
+
+
+class SimulationService:
+    """Service for Monte Carlo cost-risk simulation"""
+
+    def __init__(self, crud=None):
+        self.crud = crud or get_crud()
+        self.optimizer = OptimizationService(crud) if crud else get_optimization_service()
+
+    def _residual_ratios(self, product_ids: List[int]) -> List[float]:
+        """actual / forecast for every historical month that has both"""
+        return [
+            actual / forecast
+            for _, _, _, _, forecast, actual in self.crud.get_forecast_actual_pairs(product_ids)
+            if forecast > 0
+        ]
+
+    def simulate_cost_risk(self, start_year: Optional[int] = None, start_month: Optional[int] = None, months: int = 12,
+                           product_ids: Optional[List[int]] = None, paths: int = 1000, error_model: str = "lognormal",
+                           sigma: float = 0.15, correlation: float = 0.0, quantiles: Optional[List[float]] = None,
+                           seed: int = 0, use_manual_tiers: bool = False, progress: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Simulate the cost distribution of the current allocations over a forecast horizon.
+
+        Args:
+            start_year, start_month: First simulated month (defaults to the current month)
+            months: Horizon length
+            product_ids: Products to simulate (defaults to all active products)
+            paths: Number of sampled volume paths
+            error_model: 'lognormal' or 'bootstrap'
+            sigma: Relative forecast error for 'lognormal'
+            correlation: Share of the lognormal error common to all months of a path (0..1)
+            quantiles: Quantiles to report, as fractions (default P50 and P90)
+            seed: Seed for reproducible draws
+            use_manual_tiers: Keep manually selected tiers fixed instead of volume-based ones
+            progress: Optional callback(fraction, info) between stages
+        """
+        if error_model not in ERROR_MODELS:
+            raise ValueError(f"error_model must be one of {', '.join(ERROR_MODELS)}")
+        started = time.perf_counter()
+        quantiles = sorted(set(quantiles or DEFAULT_QUANTILES))
+
+        horizon, lanes, contracts = self.optimizer.prepare_horizon(start_year, start_month, months, product_ids, use_manual_tiers)
+        labels = [f"{y}-{m:02d}" for y, m in horizon]
+        provider_names = {p['provider_id']: p['provider_name'] for lane in lanes for p in lane['providers']}
+        contract_providers = {
+            ci: provider_id for lane in lanes for provider_id, (ci, _) in lane['options'].items()
+        }
+
+        # Demand per (product, process); coefficients turn its units into contract volume and cost per tier
+        max_tiers = max([c['n_tiers'] for c in contracts] or [1])
+        demand_ids = {}
+        coefficients = {}
+        for lane in lanes:
+            demand_id = demand_ids.setdefault((lane['product_id'], lane['process_id']), len(demand_ids))
+            for provider_id, share in lane['baseline'].items():
+                ci, prices = lane['options'][provider_id]
+                row = coefficients.setdefault((demand_id, ci), [0.0] * (max_tiers + 1))
+                row[0] += share
+                for k in range(max_tiers):
+                    row[k + 1] += share * prices[min(k, len(prices) - 1)]
+
+        demand_rows = {}
+        for lane in lanes:
+            demand_id = demand_ids[(lane['product_id'], lane['process_id'])]
+            for t, units in enumerate(lane['demand']):
+                demand_rows[(demand_id, t)] = units
+
+        tier_columns = [f"s{k}" for k in range(max_tiers)]
+        if progress:
+            progress(0.1, {'stage': 'sampling', 'lanes': len(lanes), 'contracts': len(contracts)})
+        conn = duckdb.connect()
+        try:
+            conn.execute(SQL_MACROS)
+            _create_table(conn, "demand", {"demand_id": "INTEGER", "t": "INTEGER", "forecast": "DOUBLE"},
+                          [(d, t, units) for (d, t), units in demand_rows.items()])
+            _create_table(conn, "coef", {"demand_id": "INTEGER", "ci": "INTEGER", "volume": "DOUBLE", **{c: "DOUBLE" for c in tier_columns}},
+                          [(d, ci, *row) for (d, ci), row in coefficients.items()])
+            _create_table(conn, "contracts", {"ci": "INTEGER", "provider_id": "INTEGER", "lookback": "INTEGER",
+                                              "thresholds": "DOUBLE[]", "n_tiers": "INTEGER", "fixed_tier": "INTEGER"},
+                          [(ci, contract_providers.get(ci), c['lookback'], c['thresholds'], c['n_tiers'], c['fixed_tier'])
+                           for ci, c in enumerate(contracts)])
+            _create_table(conn, "history", {"ci": "INTEGER", "t": "INTEGER", "history": "DOUBLE", "divisor": "DOUBLE"},
+                          [(ci, t, c['history'][t], c['divisors'][t]) for ci, c in enumerate(contracts) for t in range(months)])
+
+            if error_model == "bootstrap":
+                ratios = self._residual_ratios(list({lane['product_id'] for lane in lanes}))
+                if not ratios:
+                    raise ValueError("bootstrap needs months with both forecasts and actuals")
+                _create_table(conn, "residuals", {"idx": "BIGINT", "ratio": "DOUBLE"}, list(enumerate(ratios)))
+                units_sql = f"""
+                    SELECT p.path, d.demand_id, d.t, d.forecast * r.ratio AS units
+                    FROM range({int(paths)}) p(path) CROSS JOIN demand d
+                    JOIN residuals r ON r.idx = hash({int(seed)}, p.path, d.demand_id, d.t, 2) % {len(ratios)}
+                """
+            else:
+                s, rho = float(sigma), min(max(float(correlation), 0.0), 1.0)
+                error_terms = []
+                if rho > 0:
+                    error_terms.append(f"{rho ** 0.5} * std_normal(hash({int(seed)}, p.path, d.demand_id, -1))")
+                if rho < 1:
+                    error_terms.append(f"{(1 - rho) ** 0.5} * std_normal(hash({int(seed)}, p.path, d.demand_id, d.t))")
+                units_sql = f"""
+                    SELECT p.path, d.demand_id, d.t, d.forecast * exp({s} * ({' + '.join(error_terms)}) - {s * s / 2}) AS units
+                    FROM range({int(paths)}) p(path) CROSS JOIN demand d
+                """
+
+            tier_sums = ", ".join(f"SUM(u.units * c.{col}) AS {col}" for col in tier_columns)
+            tier_case = " ".join(f"WHEN {k} THEN e.{col}" for k, col in enumerate(tier_columns))
+            conn.execute(f"""
+                CREATE TABLE provider_costs AS
+                WITH contract_months AS (
+                    SELECT u.path, u.t, c.ci, SUM(u.units * c.volume) AS volume, {tier_sums}
+                    FROM ({units_sql}) u
+                    JOIN coef c ON c.demand_id = u.demand_id
+                    GROUP BY u.path, u.t, c.ci
+                ),
+                running AS (
+                    SELECT *, SUM(volume) OVER (PARTITION BY path, ci ORDER BY t) AS cumulative
+                    FROM contract_months
+                ),
+                effective AS (
+                    SELECT a.*, (h.history + a.cumulative - coalesce(b.cumulative, 0)) / h.divisor AS effective_volume
+                    FROM running a
+                    JOIN contracts k ON k.ci = a.ci
+                    JOIN history h ON h.ci = a.ci AND h.t = a.t
+                    LEFT JOIN running b ON b.path = a.path AND b.ci = a.ci AND b.t = a.t - k.lookback - 1
+                )
+                SELECT e.path, e.t, k.provider_id,
+                       SUM(CASE coalesce(k.fixed_tier, least(k.n_tiers - 1, len(list_filter(k.thresholds, x -> x <= e.effective_volume))))
+                           {tier_case} END) AS cost
+                FROM effective e
+                JOIN contracts k ON k.ci = e.ci
+                GROUP BY e.path, e.t, k.provider_id
+            """)
+
+            if progress:
+                progress(0.9, {'stage': 'quantiles'})
+            quantile_list = f"[{', '.join(str(float(q)) for q in quantiles)}]"
+
+            def distribution(sql: str) -> List[tuple]:
+                return conn.execute(f"SELECT * EXCLUDE (value), avg(value), quantile_cont(value, {quantile_list}) FROM ({sql}) GROUP BY ALL ORDER BY ALL").fetchall()
+
+            by_provider_month = distribution("SELECT provider_id, t, cost AS value FROM provider_costs")
+            by_provider = distribution("SELECT provider_id, SUM(cost) AS value FROM provider_costs GROUP BY path, provider_id")
+            by_month = distribution("SELECT t, SUM(cost) AS value FROM provider_costs GROUP BY path, t")
+            total = distribution("SELECT SUM(cost) AS value FROM provider_costs GROUP BY path")
+        finally:
+            conn.close()
+
+        # Cost of the point forecast, to show how far the distribution sits from it
+        plan = HorizonPlan(lanes, contracts, [[dict(lane['baseline']) for _ in horizon] for lane in lanes])
+        monthly_forecast_costs = plan.monthly_costs()
+        forecast_costs = {}
+        for ci, costs in enumerate(plan.cost):
+            provider_id = contract_providers.get(ci)
+            for t, cost in enumerate(costs):
+                forecast_costs[(provider_id, t)] = forecast_costs.get((provider_id, t), 0.0) + cost
+
+        def stats(row, forecast_cost: float) -> Dict[str, Any]:
+            mean, values = row[-2], row[-1]
+            return {
+                'forecast_cost': round(forecast_cost, 2),
+                'mean': round(mean, 2),
+                **{quantile_label(q): round(v, 2) for q, v in zip(quantiles, values)}
+            }
+
+        provider_monthly = {}
+        for row in by_provider_month:
+            provider_monthly.setdefault(row[0], []).append({'month': labels[row[1]], **stats(row, forecast_costs.get((row[0], row[1]), 0.0))})
+
+        return {
+            'horizon': labels,
+            'paths': paths,
+            'error_model': error_model,
+            'sigma': sigma if error_model == 'lognormal' else None,
+            'correlation': correlation if error_model == 'lognormal' else None,
+            'seed': seed,
+            'quantiles': [quantile_label(q) for q in quantiles],
+            'total': stats(total[0], plan.total_cost()) if total else None,
+            'monthly': [{'month': labels[row[0]], **stats(row, monthly_forecast_costs[row[0]])} for row in by_month],
+            'providers': [
+                {
+                    'provider_id': row[0],
+                    'provider_name': provider_names.get(row[0], 'Unknown'),
+                    'total': stats(row, sum(cost for (pid, _), cost in forecast_costs.items() if pid == row[0])),
+                    'monthly': provider_monthly.get(row[0], [])
+                }
+                for row in by_provider
+            ],
+            'stats': {
+                'lanes': len(lanes),
+                'contracts': len(contracts),
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+        }
+
+
+# Global simulation service instance
+_simulation_service = None
+
+def get_simulation_service():
+    """Get or create the global simulation service instance"""
+    global _simulation_service
+    if _simulation_service is None:
+        _simulation_service = SimulationService()
+    return _simulation_service
@@ -0,0 +1,256 @@
+"""
+Single-Writer Mode - One process owns the read-write DuckDB connection
+
+DuckDB allows a single read-write process per file, so running
+`uvicorn --workers N` needs a split:
+
+- The writer process (`python -m db.writer`) owns `database.ddb`, applies
+  every CRUD mutation sent to it over a local socket, and publishes a
+  consistent snapshot copy (`database.snapshot.ddb`). Publishing copies on
+  its own cursor, outside the write lock, and covers every write applied
+  before it started: writes arriving during a copy share the next one, so a
+  burst of writes costs two copies rather than one each. Job bookkeeping
+  writes do not wait for a snapshot; they ride along with the next one, at
+  most PARETO_PUBLISH_DEBOUNCE seconds later. The cost_cube cells a write
+  queues are recomputed as part of it (see CRUDOperations), so its snapshot
+  carries them; cells still queued otherwise are recomputed a few products
+  at a time between client writes and ride along with the next snapshot.
+- Each API worker uses `ReplicaCRUDOperations`: reads run locally against the
+  latest snapshot, writes are forwarded to the writer, which replies once a
+  snapshot containing the write is published, so workers always see their
+  own writes. Every thread reads through its own cursor; a new snapshot is
+  opened alongside the old one, and threads move to it on their next read.
+
+Enable it in the workers with PARETO_DB_MODE=replica (see run_web.py). The
+socket is authenticated with PARETO_WRITER_AUTHKEY, which run_web.py
+generates for each run; a standalone writer and its workers must share one.
+"""
+
+import logging
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import duckdb
+from fastapi import HTTPException
+
+from db.crud import BOOKKEEPING_WRITES, CRUDOperations, WRITE_METHOD_PREFIXES, clear_read_memo
+from db.instrumentation import InstrumentedConnection
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_PATH = os.environ.get("PARETO_SNAPSHOT_PATH", os.path.join(ROOT_DIR, "database.snapshot.ddb"))
+WRITER_ADDRESS = os.environ.get("PARETO_WRITER_ADDRESS", os.path.join(ROOT_DIR, "database.writer.sock"))
+# Seconds a publish waits for company when no client is waiting for it
+PUBLISH_DEBOUNCE = float(os.environ.get("PARETO_PUBLISH_DEBOUNCE", "1.0"))
+
+logger = logging.getLogger("pareto.writer")
+
+
+def writer_authkey() -> bytes:
+    """Shared secret of the writer socket; there is deliberately no default"""
+    key = os.environ.get("PARETO_WRITER_AUTHKEY")
+    if not key:
+        raise RuntimeError("PARETO_WRITER_AUTHKEY must be set for the writer and its workers (run_web.py generates one)")
+    return key.encode()
+
+
+def publish_snapshot(conn, snapshot_path: str):
+    """Copy the connection's database to a temp file and atomically swap it into place"""
+    tmp_path = f"{snapshot_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    database = conn.execute("SELECT current_database()").fetchone()[0]
+    conn.execute(f"ATTACH '{tmp_path}' AS snapshot")
+    conn.execute(f"COPY FROM DATABASE \"{database}\" TO snapshot")
+    conn.execute("DETACH snapshot")
+    os.replace(tmp_path, snapshot_path)
+
+
+class WriterServer:
+    """Applies forwarded CRUD calls on the single read-write connection"""
+
+    def __init__(self, snapshot_path: str = SNAPSHOT_PATH, address: str = WRITER_ADDRESS):
+        self.snapshot_path = snapshot_path
+        self.address = address
+        self.crud = CRUDOperations()
+        self.crud.initialize_all()
+        # One DuckDB connection, so calls from all workers are serialized
+        self.lock = threading.Lock()
+        # Snapshots are copied through a second cursor while writes go on
+        self._publish_conn = self.crud._get_connection().cursor()
+        self._state = threading.Condition()
+        self._applied = 0  # writes applied so far
+        self._published = 0  # writes contained in the current snapshot
+        self._waiting = 0  # clients waiting for a snapshot with their write
+        self._queued = 0  # client writes waiting for the lock; cost_cube refreshes give way to them
+
+    def publish_snapshot(self):
+        publish_snapshot(self._publish_conn, self.snapshot_path)
+
+    def apply(self, method: str, args: tuple, kwargs: dict):
+        """Run one CRUD write and wait for a snapshot containing it; returns a picklable reply"""
+        with self._state:
+            self._queued += 1
+        with self.lock:
+            with self._state:
+                self._queued -= 1
+            try:
+                result = getattr(self.crud, method)(*args, **kwargs)
+            except HTTPException as e:
+                return ("http_error", e.status_code, e.detail)
+            except Exception as e:
+                return ("error", type(e).__name__, str(e))
+            with self._state:
+                self._applied += 1
+                applied = self._applied
+                self._state.notify_all()
+
+        if method in BOOKKEEPING_WRITES:
+            return ("ok", result)
+        with self._state:
+            self._waiting += 1
+            self._state.notify_all()
+            self._state.wait_for(lambda: self._published >= applied)
+            self._waiting -= 1
+        return ("ok", result)
+
+    def _publish_loop(self):
+        """Publish whenever writes are waiting; each snapshot covers every write applied before it started"""
+        while True:
+            with self._state:
+                self._state.wait_for(lambda: self._applied > self._published)
+                self._state.wait_for(lambda: self._waiting, timeout=PUBLISH_DEBOUNCE)
+                applied = self._applied
+            try:
+                self.publish_snapshot()
+            except Exception:
+                logger.exception("Publishing the snapshot failed, retrying")
+                time.sleep(1)
+                continue
+            with self._state:
+                self._published = applied
+                self._state.notify_all()
+
+    def _refresh_loop(self):
+        """Recompute cost_cube cells left queued (not by a write) a batch at a time whenever no client write is waiting"""
+        while True:
+            with self._state:
+                self._state.wait_for(lambda: not self._queued)
+            try:
+                with self.lock:
+                    refreshed = self.crud._refresh_cost_cube_batch()
+            except duckdb.Error:
+                logger.exception("Refreshing cost_cube cells failed, retrying")
+                refreshed = 0
+            if not refreshed:
+                time.sleep(1)
+                continue
+            with self._state:
+                self._applied += 1
+                self._state.notify_all()
+
+    def _serve_client(self, conn):
+        with conn:
+            while True:
+                try:
+                    method, args, kwargs = conn.recv()
+                except EOFError:
+                    return
+                conn.send(self.apply(method, args, kwargs))
+
+    def serve_forever(self, ready=None):
+        self.publish_snapshot()
+        threading.Thread(target=self._publish_loop, daemon=True).start()
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        with Listener(self.address, family="AF_UNIX", authkey=writer_authkey()) as listener:
+            logger.info("Pareto writer listening on %s", self.address)
+            if ready is not None:
+                ready.set()
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+
+class ReplicaCRUDOperations(CRUDOperations):
+    """CRUD operations that read from the snapshot and forward writes to the writer"""
+
+    def __init__(self, snapshot_path: str = SNAPSHOT_PATH, address: str = WRITER_ADDRESS):
+        super().__init__()
+        self.snapshot_path = snapshot_path
+        self.address = address
+        self._snapshot = None  # (version, connection) of the newest snapshot opened
+        self._snapshot_lock = threading.Lock()
+        self._thread = threading.local()
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _snapshot_version(self) -> tuple:
+        """Identifies the published snapshot file; inodes alone are reused once an old snapshot is closed"""
+        stat = os.stat(self.snapshot_path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _get_connection(self):
+        # One cursor per thread, moved to a newer snapshot on the thread's next
+        # read; an older snapshot stays open while other threads still read it
+        version = self._snapshot_version()
+        thread = self._thread
+        if getattr(thread, "version", None) != version:
+            cursor = self._open_snapshot(version).cursor()
+            cursor.execute("USE snapshot")
+            thread.conn, thread.version = InstrumentedConnection(cursor), version
+        return thread.conn
+
+    def _open_snapshot(self, version: tuple):
+        with self._snapshot_lock:
+            if self._snapshot is None or self._snapshot[0] != version:
+                # Attached to a fresh in-memory instance: duckdb.connect(path) would hand
+                # back the cached instance of the replaced file while it is still open
+                conn = duckdb.connect()
+                conn.execute(f"ATTACH '{self.snapshot_path}' AS snapshot (READ_ONLY)")
+                self._snapshot = (version, conn)
+            return self._snapshot[1]
+
+    def initialize_all(self):
+        """Schema is owned by the writer process"""
+        pass
+
+    def get_write_generation(self) -> tuple:
+        """Writes happen in the writer; each one publishes a new snapshot file"""
+        return self._snapshot_version()
+
+    def for_thread(self) -> "ReplicaCRUDOperations":
+        return ReplicaCRUDOperations(self.snapshot_path, self.address)
+
+    def _forward(self, method: str, *args, **kwargs):
+        with self._client_lock:
+            if self._client is None:
+                self._client = Client(self.address, family="AF_UNIX", authkey=writer_authkey())
+            self._client.send((method, args, kwargs))
+            reply = self._client.recv()
+        if method not in BOOKKEEPING_WRITES:
+            clear_read_memo()
+
+        if reply[0] == "http_error":
+            raise HTTPException(status_code=reply[1], detail=reply[2])
+        if reply[0] == "error":
+            raise RuntimeError(f"Writer failed on {method}: {reply[1]}: {reply[2]}")
+        return reply[1]
+
+    def __getattribute__(self, name):
+        if name.startswith(WRITE_METHOD_PREFIXES) and callable(getattr(CRUDOperations, name, None)):
+            forward = object.__getattribute__(self, "_forward")
+            return lambda *args, **kwargs: forward(name, *args, **kwargs)
+        return object.__getattribute__(self, name)
+
+
+def run_writer(ready=None):
+    """Process entry point for the writer"""
+    WriterServer().serve_forever(ready)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_writer()
@@ -678,11 +678,16 @@ class TableRenderer {
     // Group contracts by provider and fetch their tiers
     const providerContracts = {};
     const contractTiers = {};
+    const contractCurves = {};
 
-    // Fetch tiers for each contract
+    // Fetch tiers and cost curve for each contract
     for (const contract of contracts) {
-      const response = await fetch(`/api/contract-tiers/${contract.contract_id}`);
-      contractTiers[contract.contract_id] = await response.json();
+      const [tiersResponse, curveResponse] = await Promise.all([
+        fetch(`/api/contract-tiers/${contract.contract_id}`),
+        fetch(`/api/contracts/${contract.contract_id}/cost-curve`)
+      ]);
+      contractTiers[contract.contract_id] = await tiersResponse.json();
+      contractCurves[contract.contract_id] = curveResponse.ok ? await curveResponse.json() : { breakpoints: [] };
     }
 
     // Group by provider
@@ -742,8 +747,11 @@ class TableRenderer {
       // Get all tiers sorted by tier_number
       const allTiers = [];
       provider.contracts.forEach(contract => {
+        const breakpoints = contractCurves[contract.contract_id]?.breakpoints || [];
         contract.tiers.forEach(tier => {
+          const breakpoint = breakpoints.find(b => b.tier_number === tier.tier_number);
           allTiers.push({
+            breakpoint: breakpoint,
             tier_number: tier.tier_number,
             threshold_units: tier.threshold_units,
             contract_name: contract.contract_name,
@@ -770,11 +778,15 @@ class TableRenderer {
 
       allTiers.forEach((tier, index) => {
         const isSelected = tier.is_selected;
+        const bp = tier.breakpoint;
+        const tierTitle = bp
+          ? `Units ${bp.lower_bound.toLocaleString()} - ${bp.upper_bound === null ? '∞' : bp.upper_bound.toLocaleString()}, blended price $${bp.unit_price.toFixed(4)}/unit. Click to select this tier`
+          : 'Click to select this tier';
         html += `
           <div
             class="rounded-md border border-border ${isSelected ? 'bg-green-100 border-green-300' : 'bg-card hover:bg-accent'} p-3 cursor-pointer transition-colors"
             onclick="window.tableRenderer.selectTier(${tier.contract_tier_id}, ${tier.tier_number}, '${provider.provider_name}', ${provider.provider_id}, ${tier.threshold_units})"
-            title="Click to select this tier"
+            title="${tierTitle}"
           >
             <div class="text-sm font-medium text-foreground">
               <span class="text-blue-600 font-semibold">T${tier.tier_number}:</span>
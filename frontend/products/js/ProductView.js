@@ -375,8 +375,8 @@ class ProductView {
                                         <span class="font-medium text-slate-600">${row.allocation}</span>
                                     </div>
                                     <div class="flex justify-between items-baseline text-xs">
-                                        <span class="text-slate-400 font-normal">Raw Vol</span>
-                                        <span class="text-slate-600">${row.allocated_units.toLocaleString()} <span class="text-slate-400 text-[10px]">→ T${row.calculated_tier}</span></span>
+                                        <span class="text-slate-400 font-normal">Pooled Vol</span>
+                                        <span class="text-slate-600">${row.pooled_volume.toLocaleString()} <span class="text-slate-400 text-[10px]">→ T${row.calculated_tier}</span></span>
                                     </div>
                                     <div class="flex justify-between items-baseline text-xs">
                                         <span class="text-slate-400 font-normal">Eff. Vol</span>
@@ -1,18 +1,47 @@
 import os
+import importlib
+import json
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import os
 
+from api.static_assets import NegotiatedGZipMiddleware
+from api.profiling import SamplingProfiler, profile_request_format, save_profile
 from api.urls import api_router, setup_static_files
+from db.crud import get_crud, refresh_cost_cube_forever
+from db.instrumentation import DEV_MODE, query_budget, query_scope
+from db.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, HTTP_REQUESTS, HTTP_RESPONSE_BYTES, REGISTRY
+
+sql_logger = logging.getLogger("pareto.sql")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks."""
+    # The agent stack is loaded lazily on the first chat request. Set
+    # PARETO_AGENT_WARMUP=1 to import it in a background thread at startup instead.
+    if os.environ.get("PARETO_AGENT_WARMUP") == "1":
+        threading.Thread(target=importlib.import_module, args=("ai.pareto_agent",), daemon=True).start()
+    # Queued cost_cube cells are recomputed in the background; with PARETO_DB_MODE=replica the writer does it
+    if os.environ.get("PARETO_DB_MODE") != "replica":
+        threading.Thread(target=refresh_cost_cube_forever, args=(get_crud().for_thread(),), daemon=True).start()
+    yield
+
 
 # Create FastAPI application
 app = FastAPI(
     title="Pareto",
     description="Efficient point for productivity and optimization",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -24,6 +53,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress API responses above 1 KB (precompressed static assets pass through untouched)
+app.add_middleware(NegotiatedGZipMiddleware, minimum_size=1000, compresslevel=6)
+
+# Count and time the SQL each request runs (see db/instrumentation.py)
+@app.middleware("http")
+async def instrument_queries(request: Request, call_next):
+    with query_scope() as stats:
+        response = await call_next(request)
+
+    route = request.scope.get("route")
+    endpoint = f"{request.method} {route.path if route else request.url.path}"
+    suspects = stats.n_plus_one()
+    budget = query_budget(endpoint)
+    over_budget = budget is not None and stats.count > budget
+
+    record = {
+        "endpoint": endpoint,
+        "status": response.status_code,
+        "queries": stats.count,
+        "db_ms": round(stats.total_ms, 2),
+        "n_plus_one": suspects,
+        "budget": budget
+    }
+    sql_logger.log(logging.WARNING if suspects or over_budget else logging.INFO, json.dumps(record))
+
+    if over_budget and DEV_MODE:
+        return JSONResponse(
+            status_code=500,
+            content={"detail": f"Query budget exceeded for {endpoint}: {stats.count} > {budget}", **record}
+        )
+    response.headers["Server-Timing"] = stats.server_timing()
+    return response
+
+
+# Sample a profile of requests carrying the profiling token (see api/profiling.py)
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    profile_format = profile_request_format(request.headers, request.query_params)
+    if profile_format is None:
+        return await call_next(request)
+
+    with SamplingProfiler(threading.get_ident()) as profiler:
+        response = await call_next(request)
+        # Streamed bodies are produced while iterating, keep that inside the profile too
+        async for _ in response.body_iterator:
+            pass
+
+    file_name, content = save_profile(profiler, f"{request.method} {request.url.path}", profile_format)
+    return Response(
+        content,
+        media_type="application/json" if profile_format == "speedscope" else "text/plain",
+        headers={"X-Profile-File": file_name, "X-Profiled-Status": str(response.status_code)}
+    )
+
+
+# Request metrics for /metrics, labelled by route template to keep cardinality bounded
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        HTTP_IN_FLIGHT.dec()
+
+    route = request.scope.get("route")
+    labels = (route.path if route else "unmatched", request.method)
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, labels)
+    HTTP_REQUESTS.inc(labels + (str(response.status_code),))
+    if "content-length" in response.headers:
+        HTTP_RESPONSE_BYTES.observe(int(response.headers["content-length"]), labels)
+    return response
+
+
 # Include API routers
 app.include_router(api_router)
 
@@ -37,6 +140,12 @@ async def root():
     return {"message": "Welcome to Pareto API", "version": "1.0.0"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -45,10 +154,32 @@ async def health_check():
 
 # Development server
 if __name__ == "__main__":
-    uvicorn.run(
-        "run_web:app",
-        host="0.0.0.0",
-        port=5002,
-        reload=True,  # Enable auto-reload for development
-        log_level="info"
-    )
\ No newline at end of file
+    workers = int(os.environ.get("PARETO_WORKERS", "1"))
+    if workers > 1:
+        # Single-writer / multi-reader: one writer process owns database.ddb,
+        # the API workers read its snapshots and forward writes to it
+        import multiprocessing
+        import secrets
+        from db.writer import run_writer
+
+        # Authenticates workers to the writer; inherited by both through the environment
+        os.environ.setdefault("PARETO_WRITER_AUTHKEY", secrets.token_hex(32))
+        ready = multiprocessing.Event()
+        multiprocessing.Process(target=run_writer, args=(ready,), daemon=True).start()
+        ready.wait()
+        os.environ["PARETO_DB_MODE"] = "replica"
+        uvicorn.run(
+            "run_web:app",
+            host="0.0.0.0",
+            port=5002,
+            workers=workers,
+            log_level="info"
+        )
+    else:
+        uvicorn.run(
+            "run_web:app",
+            host="0.0.0.0",
+            port=5002,
+            reload=True,  # Enable auto-reload for development
+            log_level="info"
+        )